@@ -1,20 +1,84 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.responses import HTMLResponse
 from uvicorn import run as app_run
 
+import hmac
+import os
 from typing import Optional
 
 # Importing constants and pipeline modules from the project
-from src.constants import APP_HOST, APP_PORT
-from src.pipelines.predict_pipeline import AdData, AdDataClassifier
-from src.pipelines.train_pipeline import TrainPipeline
+from src.constants import ADMIN_TOKEN_ENV_KEY, APP_HOST, APP_PORT
+from src.entities.config_entity import AdPredictorConfig
+from src.entities.model_cache import get_model_cache
+from src.exceptions import BatchTooLargeError, InferenceOverloadedError, InvalidRecordError
+from src.logging import logging
+from src.pipelines.inference_executor import InferenceExecutor
+from src.pipelines.micro_batcher import MicroBatcher
+from src.pipelines.predict_pipeline import AdBatchData, AdDataClassifier, validate_record
+from src.pipelines.training_jobs import TrainingJobManager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Loads the production model once at startup (unless a pre-fork parent, see serve.py, already did)
+    and keeps it fresh in the background, so prediction requests never go to S3. Also starts the
+    inference thread pool and the micro-batcher that groups concurrent single-row predictions.
+    """
+    inference_executor.start()
+    await micro_batcher.start()
+    model_cache = None
+    try:
+        model_cache = get_model_cache(prediction_config)
+        if not model_cache.get_status()["loaded"]:
+            await run_in_threadpool(model_cache.load)
+    except Exception as e:
+        # No model published yet (or S3 unreachable): the first prediction loads it lazily
+        logging.warning(f"Could not preload the production model: {e}")
+    if model_cache is not None:
+        model_cache.start_background_refresh()
+    yield
+    await micro_batcher.stop()
+    inference_executor.stop()
+    if model_cache is not None:
+        model_cache.stop_background_refresh()
+
+
+# Scores on a bounded thread pool, off the event loop, and sheds load with 503 once it is full
+prediction_config = AdPredictorConfig()
+inference_executor = InferenceExecutor(max_workers=prediction_config.inference_max_workers,
+                                       max_pending=prediction_config.inference_max_pending,
+                                       threads_per_worker=prediction_config.inference_threads_per_worker)
+
+# Groups concurrent form predictions into one model call
+micro_batcher = MicroBatcher(score_batch=AdDataClassifier(prediction_config).predict_records,
+                             max_batch_size=prediction_config.micro_batch_max_size,
+                             max_wait_ms=prediction_config.micro_batch_max_wait_ms,
+                             executor=inference_executor,
+                             max_queue_size=prediction_config.micro_batch_max_queue_size)
+
+
+def overloaded_response(error: InferenceOverloadedError) -> JSONResponse:
+    """
+    503 telling the client when to retry, for requests shed because the inference queue is full.
+    """
+    return JSONResponse({"status": False, "error": f"{error}"}, status_code=503,
+                        headers={"Retry-After": str(error.retry_after_seconds)})
+
+
+# Runs training in a separate process so prediction requests are not blocked while a model trains
+training_jobs = TrainingJobManager()
+
 
 # Initialize FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Mount the 'static' directory for serving static files (like CSS)
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -41,20 +105,12 @@ class DataForm:
     """
     def __init__(self, request: Request):
         self.request: Request = request
-        self.age: Optional[int] = None
-        self.gender_Male: Optional[int] = None
-        self.gender_Non_Binary: Optional[int] = None
-        self.device_type_Mobile: Optional[int] = None
-        self.device_type_Tablet: Optional[int] = None
-        self.ad_position_Side: Optional[int] = None
-        self.ad_position_Top: Optional[int] = None
-        self.browsing_history_Entertainment: Optional[int] = None
-        self.browsing_history_News: Optional[int] = None
-        self.browsing_history_Shopping: Optional[int] = None
-        self.browsing_history_Social_Media: Optional[int] = None
-        self.time_of_day_Evening: Optional[int] = None
-        self.time_of_day_Morning: Optional[int] = None
-        self.time_of_day_Night: Optional[int] = None
+        self.age: Optional[str] = None
+        self.gender: Optional[str] = None
+        self.device_type: Optional[str] = None
+        self.ad_position: Optional[str] = None
+        self.browsing_history: Optional[str] = None
+        self.time_of_day: Optional[str] = None
 
     async def get_user_data(self):
         """
@@ -63,19 +119,24 @@ class DataForm:
         """
         form = await self.request.form()
         self.age = form.get("age")
-        self.gender_Male = form.get("gender_Male")
-        self.gender_Non_Binary = form.get("gender_Non-Binary")
-        self.device_type_Mobile = form.get("device_type_Mobile")
-        self.device_type_Tablet = form.get("device_type_Tablet")
-        self.ad_position_Side = form.get("ad_position_Side")
-        self.ad_position_Top = form.get("ad_position_Top")
-        self.browsing_history_Entertainment = form.get("browsing_history_Entertainment")
-        self.browsing_history_News = form.get("browsing_history_News")
-        self.browsing_history_Shopping = form.get("browsing_history_Shopping")
-        self.browsing_history_Social_Media = form.get("browsing_history_Social-Media")
-        self.time_of_day_Evening = form.get("time_of_day_Evening")
-        self.time_of_day_Morning = form.get("time_of_day_Morning")
-        self.time_of_day_Night = form.get("time_of_day_Night")
+        self.gender = form.get("gender")
+        self.device_type = form.get("device_type")
+        self.ad_position = form.get("ad_position")
+        self.browsing_history = form.get("browsing_history")
+        self.time_of_day = form.get("time_of_day")
+
+    def get_ad_record(self) -> dict:
+        """
+        Returns the raw form fields as one record for the fast-path encoder.
+        """
+        return {
+            "age": self.age,
+            "gender": self.gender,
+            "device_type": self.device_type,
+            "ad_position": self.ad_position,
+            "browsing_history": self.browsing_history,
+            "time_of_day": self.time_of_day,
+        }
 
 
 # Route to render the main page with the form
@@ -89,18 +150,32 @@ async def index(request: Request):
 
 
 # Route to trigger the model training process
-@app.get("/train")
-async def trainRouteClient():
+@app.api_route("/train", methods=["GET", "POST"])
+async def trainRouteClient(request: Request):
     """
-    Endpoint to initiate the model training pipeline.
+    Endpoint to start the model training pipeline as a background job.
+    Returns the job id at once (202), or the running job with 409 if training is already in progress.
     """
     try:
-        train_pipeline = TrainPipeline()
-        train_pipeline.run_pipeline()
-        return Response("Training successful!!!")
+        # Starting the job spawns a process; keep that off the event loop
+        job, created = await run_in_threadpool(training_jobs.submit)
+        job["status_url"] = str(request.url_for("trainStatusRouteClient", job_id=job["job_id"]))
+        return JSONResponse(job, status_code=202 if created else 409)
 
     except Exception as e:
-        return Response(f"Error Occurred! {e}")
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=500)
+
+
+# Route to follow a training job
+@app.get("/train/{job_id}")
+async def trainStatusRouteClient(job_id: str):
+    """
+    Endpoint returning the state of a training job with the progress and timings of each pipeline stage.
+    """
+    job = training_jobs.get_status(job_id)
+    if job is None:
+        return JSONResponse({"status": False, "error": f"Unknown training job {job_id}"}, status_code=404)
+    return JSONResponse(job)
 
 
 # Route to handle form submission and make predictions
@@ -113,46 +188,116 @@ async def predictRouteClient(request: Request):
         form = DataForm(request)
         await form.get_user_data()
         
-        # Prepare data based on form input
-        ad_data = AdData(
-            age=form.age,
-            gender_Male=form.gender_Male,
-            gender_Non_Binary=form.gender_Non_Binary,
-            device_type_Mobile=form.device_type_Mobile,
-            device_type_Tablet=form.device_type_Tablet,
-            ad_position_Side=form.ad_position_Side,
-            ad_position_Top=form.ad_position_Top,
-            browsing_history_Entertainment=form.browsing_history_Entertainment,
-            browsing_history_News=form.browsing_history_News,
-            browsing_history_Shopping=form.browsing_history_Shopping,
-            browsing_history_Social_Media=form.browsing_history_Social_Media,
-            time_of_day_Evening=form.time_of_day_Evening,
-            time_of_day_Morning=form.time_of_day_Morning,
-            time_of_day_Night=form.time_of_day_Night
-        )
-
-        # Convert form data into a DataFrame for the model
-        ad_df = ad_data.get_ad_input_data_frame()
-
-        # Initialize the prediction pipeline
-        model_predictor = AdDataClassifier()
-
-        # Make a prediction and retrieve the result
-        value = model_predictor.predict(dataframe=ad_df)[0]
+        # Make a prediction; concurrent requests are scored together by the micro-batcher, so the record is
+        # validated (and its numbers converted) first and a bad one gets its own 400
+        record = validate_record(form.get_ad_record())
+        get_model_cache(prediction_config).check_records([record])
+        result = await micro_batcher.submit(record)
 
         # Interpret the prediction result as 'Response-Yes' or 'Response-No'
-        status = "User Will Click Ad" if value == 1 else "User Will Not Click Ad"
+        status = "User Will Click Ad" if result.prediction == 1 else "User Will Not Click Ad"
 
-        # Render the same HTML page with the prediction result
+        # Render the same HTML page with the prediction result and the model version that produced it
         return templates.TemplateResponse(
             "addata.html",
             {"request": request, "context": status},
+            headers={"X-Model-Version": result.model_version},
         )
-        
+
+    except InferenceOverloadedError as e:
+        return overloaded_response(e)
+    except InvalidRecordError as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=400)
     except Exception as e:
         return {"status": False, "error": f"{e}"}
 
 
+# Route to score many feature records in one vectorized pass
+@app.post("/predict/batch")
+async def predictBatchRouteClient(request: Request):
+    """
+    Endpoint to receive a batch of feature records as JSON or JSON Lines and return
+    a prediction and click probability for each record, in input order.
+    Bad records get 400, more than batch_max_records records 413, and failures on the server side 500.
+    """
+    try:
+        body = await request.body()
+        batch_data = AdBatchData.from_request_body(body, content_type=request.headers.get("content-type", ""),
+                                                   max_records=prediction_config.batch_max_records)
+        get_model_cache(prediction_config).check_records(batch_data.records)
+
+        model_predictor = AdDataClassifier(prediction_config)
+        predictions, probabilities, model_version = await inference_executor.run(model_predictor.predict_records,
+                                                                                 batch_data.records)
+
+        return JSONResponse({
+            "count": len(predictions),
+            "model_version": model_version,
+            "predictions": predictions.tolist(),
+            "probabilities": probabilities.tolist(),
+        }, headers={"X-Model-Version": model_version})
+
+    except InferenceOverloadedError as e:
+        return overloaded_response(e)
+    except BatchTooLargeError as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=413)
+    except InvalidRecordError as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=400)
+    except Exception as e:
+        logging.error(f"Batch prediction failed: {e}")
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=500)
+
+
+# Route exposing micro-batcher queue depth and batch size statistics
+@app.get("/metrics/batcher")
+async def batcherMetricsRouteClient():
+    """
+    Endpoint returning the current micro-batcher and inference executor metrics.
+    """
+    return JSONResponse({**micro_batcher.get_metrics(), "executor": inference_executor.get_metrics()})
+
+
+def is_admin_request(request: Request) -> bool:
+    """
+    Admin routes require the X-Admin-Token header when the ADMIN_TOKEN environment variable is set.
+    """
+    admin_token = os.getenv(ADMIN_TOKEN_ENV_KEY)
+    if not admin_token:
+        return True
+    return hmac.compare_digest(request.headers.get("x-admin-token", ""), admin_token)
+
+
+# Route reporting the model version this worker serves
+@app.get("/admin/model")
+async def modelStatusRouteClient(request: Request):
+    """
+    Endpoint returning the version, promotion time and warm-up time of the model served by this worker.
+    """
+    if not is_admin_request(request):
+        return JSONResponse({"status": False, "error": "Invalid admin token"}, status_code=403)
+    return JSONResponse(get_model_cache(prediction_config).get_status())
+
+
+# Route to load a newly promoted model without restarting the server
+@app.post("/admin/model/reload")
+async def modelReloadRouteClient(request: Request, force: bool = False):
+    """
+    Endpoint that checks the model registry and, if the production version changed (or with force=true),
+    loads and warms up the new model off the request path, then swaps it in. Only this worker reloads at
+    once; the other workers pick the version up on their next background refresh.
+    """
+    if not is_admin_request(request):
+        return JSONResponse({"status": False, "error": "Invalid admin token"}, status_code=403)
+    model_cache = get_model_cache(prediction_config)
+    try:
+        reloaded = await run_in_threadpool(model_cache.refresh, force)
+        return JSONResponse({"status": True, "reloaded": reloaded, **model_cache.get_status()})
+
+    except Exception as e:
+        # The previous model, if any, keeps serving
+        return JSONResponse({"status": False, "error": f"{e}", **model_cache.get_status()}, status_code=500)
+
+
 # Main entry point to start the FastAPI server
 if __name__ == "__main__":
-    app_run(app, host=APP_HOST, port=APP_PORT)
\ No newline at end of file
+    app_run(app, host=APP_HOST, port=APP_PORT, log_config=None)
\ No newline at end of file
@@ -0,0 +1,51 @@
+#Benchmark: write time, read time and disk size of the ingestion artifacts as CSV, Parquet and Arrow IPC (feather)
+#Usage: python benchmarks/bench_feature_store.py [--rows 10000000] [--repeats 3]
+
+import argparse
+import os
+import tempfile
+import time
+
+from common import load_dataset
+
+from src.constants import SCHEMA_FILE_PATH
+from src.utils.helpers import read_data, read_yaml_file, write_data
+
+FORMATS = ("csv", "parquet", "feather")
+
+
+def timed(function, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2], result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    schema_config = read_yaml_file(SCHEMA_FILE_PATH)
+    df = load_dataset(args.rows)
+    # Same typing as ingestion: categorical columns become dictionary-encoded for the columnar formats
+    for column in schema_config["categorical_columns"]:
+        df[column] = df[column].astype("category")
+    print(f"rows: {len(df)}, in-memory: {df.memory_usage(deep=True).sum() / 2 ** 20:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{'format':<8} {'write s':>9} {'read s':>9} {'disk MB':>9} {'dtypes kept':>12}")
+        for data_format in FORMATS:
+            file_path = os.path.join(tmp_dir, f"data.{data_format}")
+            write_seconds, _ = timed(lambda: write_data(df, file_path), args.repeats)
+            read_seconds, read_df = timed(lambda: read_data(file_path), args.repeats)
+            dtypes_kept = read_df.dtypes.astype(str).to_dict() == df.dtypes.astype(str).to_dict()
+            print(f"{data_format:<8} {write_seconds:>9.2f} {read_seconds:>9.2f} "
+                  f"{os.path.getsize(file_path) / 2 ** 20:>9.1f} {str(dtypes_kept):>12}")
+            del read_df
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#Benchmark: cold-start import time of the serving app and of the training pipeline, with the slowest
+#modules from python -X importtime
+#Usage: python benchmarks/bench_import_time.py [--repeats 5] [--top 15]
+
+import argparse
+import re
+import subprocess
+import sys
+
+from common import ROOT_DIR
+
+from src.constants import SERVING_IMPORT_TIME_BUDGET_SECONDS
+
+ENTRY_POINTS = {
+    "serving (app)": "import app",
+    "training (TrainPipeline)": "from src.pipelines.train_pipeline import TrainPipeline",
+}
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def import_times(statement: str) -> list:
+    # (cumulative microseconds, self microseconds, depth, module) for every module the statement imports
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], check=True,
+                            capture_output=True, text=True, cwd=ROOT_DIR).stderr
+    return [(int(cumulative), int(own), (len(indent) - 1) // 2, module)
+            for own, cumulative, indent, module in IMPORT_TIME_LINE.findall(stderr)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    for name, statement in ENTRY_POINTS.items():
+        runs = [import_times(statement) for _ in range(args.repeats)]
+        totals = sorted(sum(cumulative for cumulative, _, depth, _ in run if depth == 0) for run in runs)
+        fastest = min(runs, key=lambda run: sum(cumulative for cumulative, _, depth, _ in run if depth == 0))
+        print(f"{name}: median {totals[len(totals) // 2] / 1e6:.3f}s, {len(fastest)} modules "
+              f"(serving budget {SERVING_IMPORT_TIME_BUDGET_SECONDS}s)")
+        top_level = sorted((entry for entry in fastest if entry[2] <= 1), reverse=True)[:args.top]
+        for cumulative, _, depth, module in top_level:
+            print(f"  {cumulative / 1000:>8.1f} ms  {'  ' * depth}{module}")
+
+if __name__ == "__main__":
+    main()
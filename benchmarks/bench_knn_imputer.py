@@ -0,0 +1,65 @@
+#Benchmark: KNN imputation time of sklearn's KNNImputer vs IndexedKNNImputer as rows grow, and the
+#difference between the two on the bundled dataset
+#Usage: python benchmarks/bench_knn_imputer.py [--rows 10000 50000 200000 1000000 5000000] [--max-exact-rows 50000]
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.impute import KNNImputer
+
+from common import load_dataset
+
+from src.constants import IMPUTE_KNN_N_NEIGHBOURS, SCHEMA_FILE_PATH, TARGET_COLUMN
+from src.utils.helpers import read_yaml_file
+from src.utils.knn_imputer import IndexedKNNImputer
+from src.utils.transformation_utils import drop_columns
+
+
+def encoded_matrix(n_rows: int) -> np.ndarray:
+    # Same coding as fill_na_and_knn_impute: categories become integer codes, missing ones -1
+    df = drop_columns(load_dataset(n_rows).drop(columns=[TARGET_COLUMN]), read_yaml_file(SCHEMA_FILE_PATH))
+    for column in df.select_dtypes(include=["object", "category"]).columns:
+        df[column] = df[column].astype(object).astype("category").cat.codes
+    return df.to_numpy(dtype=np.float64)
+
+
+def time_imputer(imputer, X: np.ndarray):
+    start = time.perf_counter()
+    imputed = imputer.fit(X).transform(X)
+    return time.perf_counter() - start, imputed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 50_000, 200_000, 1_000_000, 5_000_000])
+    parser.add_argument("--max-exact-rows", type=int, default=50_000,
+                        help="KNNImputer is O(n^2) and is skipped above this size")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    # Tolerance on the original 10k rows; KNNImputer against itself on shuffled rows shows the part
+    # that is only tie-breaking among equidistant donors
+    X = encoded_matrix(None)
+    missing = np.isnan(X)
+    exact = KNNImputer(n_neighbors=IMPUTE_KNN_N_NEIGHBOURS).fit_transform(X)
+    indexed = IndexedKNNImputer(n_neighbors=IMPUTE_KNN_N_NEIGHBOURS, n_jobs=args.n_jobs).fit(X).transform(X)
+    permutation = np.random.default_rng(0).permutation(len(X))
+    shuffled = KNNImputer(n_neighbors=IMPUTE_KNN_N_NEIGHBOURS).fit_transform(X[permutation])[np.argsort(permutation)]
+    print(f"imputed cells: {missing.sum()}")
+    print(f"indexed vs KNNImputer:                MAE {np.abs(indexed - exact)[missing].mean():.3f}, "
+          f"identical {np.mean(np.isclose(indexed, exact)[missing]):.1%}")
+    print(f"KNNImputer vs itself on shuffled rows: MAE {np.abs(shuffled - exact)[missing].mean():.3f}, "
+          f"identical {np.mean(np.isclose(shuffled, exact)[missing]):.1%}")
+
+    print(f"\n{'rows':>10} {'KNNImputer s':>13} {'indexed s':>10}")
+    for n_rows in args.rows:
+        X = encoded_matrix(n_rows)
+        exact_seconds = (f"{time_imputer(KNNImputer(n_neighbors=IMPUTE_KNN_N_NEIGHBOURS), X)[0]:>13.2f}"
+                         if n_rows <= args.max_exact_rows else f"{'skipped':>13}")
+        indexed_seconds, _ = time_imputer(IndexedKNNImputer(n_neighbors=IMPUTE_KNN_N_NEIGHBOURS,
+                                                            n_jobs=args.n_jobs), X)
+        print(f"{n_rows:>10} {exact_seconds} {indexed_seconds:>10.2f}")
+
+if __name__ == "__main__":
+    main()
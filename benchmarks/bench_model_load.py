@@ -0,0 +1,77 @@
+#Benchmark: cold-start load time and resident memory of the pickled MyModel vs the native booster
+#Usage: python benchmarks/bench_model_load.py [--repeats 5]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT_DIR, train_reference_model
+
+from src.constants import SCHEMA_FILE_PATH
+from src.utils.feature_encoder import FeatureEncoder
+from src.utils.helpers import read_yaml_file, save_object
+
+# Each load runs in a fresh interpreter; imports and the load itself are timed separately
+LOAD_SNIPPETS = {
+    "pickle": ("from src.utils.helpers import load_object",
+               "model = load_object({model_path!r})"),
+    "native": ("from src.entities.native_estimator import NativeModel",
+               "model = NativeModel.from_files({native_path!r}, {spec_path!r})"),
+}
+
+CHILD_TEMPLATE = """
+import resource, time, json, sys
+import psutil
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{imports}
+imported = time.perf_counter()
+rss_before = psutil.Process().memory_info().rss
+{load}
+loaded = time.perf_counter()
+rss_after = psutil.Process().memory_info().rss
+print(json.dumps({{"import_seconds": imported - start, "load_seconds": loaded - imported,
+                  "load_rss_mb": (rss_after - rss_before) / 2 ** 20, "rss_mb": rss_after / 2 ** 20,
+                  "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def measure(imports: str, load: str) -> dict:
+    output = subprocess.run([sys.executable, "-c", CHILD_TEMPLATE.format(root=ROOT_DIR, imports=imports, load=load)],
+                            check=True, capture_output=True, text=True, cwd=ROOT_DIR).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    my_model, _ = train_reference_model()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {
+            "model_path": os.path.join(tmp_dir, "model.pkl"),
+            "native_path": os.path.join(tmp_dir, "model.ubj"),
+            "spec_path": os.path.join(tmp_dir, "model_spec.json"),
+        }
+        save_object(paths["model_path"], my_model)
+        my_model.trained_model_object.get_booster().save_model(paths["native_path"])
+        encoder = FeatureEncoder.from_preprocessor(my_model.preprocessing_object, read_yaml_file(SCHEMA_FILE_PATH))
+        with open(paths["spec_path"], "w") as spec_file:
+            json.dump({"classes": my_model.trained_model_object.classes_.tolist(), "best_iteration": None,
+                       "encoder": encoder.to_dict()}, spec_file)
+
+        print(f"{'format':<8} {'file KB':>9} {'import s':>9} {'load ms':>9} {'load RSS MB':>12} {'RSS MB':>8} {'max RSS MB':>11}")
+        for model_format, (imports, load) in LOAD_SNIPPETS.items():
+            runs = sorted((measure(imports, load.format(**paths)) for _ in range(args.repeats)),
+                          key=lambda run: run["load_seconds"])
+            median = runs[len(runs) // 2]
+            file_path = paths["model_path"] if model_format == "pickle" else paths["native_path"]
+            print(f"{model_format:<8} {os.path.getsize(file_path) / 1024:>9.1f} {median['import_seconds']:>9.3f} "
+                  f"{median['load_seconds'] * 1000:>9.1f} {median['load_rss_mb']:>12.1f} {median['rss_mb']:>8.1f} {median['max_rss_mb']:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#Benchmark: build time and size of the prediction table, and per-request latency of table lookups vs live scoring
+#Usage: python benchmarks/bench_prediction_table.py [--batch-sizes 1 16 256] [--repeats 2000]
+
+import argparse
+import time
+
+import numpy as np
+
+from common import load_dataset, train_reference_model
+
+from src.constants import AD_INPUT_FEATURE_COLUMNS, PREDICTION_TABLE_NUMERIC_RANGES, SCHEMA_FILE_PATH
+from src.entities.model_cache import CachedModel
+from src.utils.feature_encoder import FeatureEncoder
+from src.utils.helpers import read_yaml_file
+from src.utils.prediction_table import PredictionTable
+
+
+def median_ms(score, batches) -> float:
+    timings = []
+    for batch in batches:
+        start = time.perf_counter()
+        score(batch)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 256])
+    parser.add_argument("--repeats", type=int, default=2000)
+    args = parser.parse_args()
+
+    my_model, _ = train_reference_model()
+    encoder = FeatureEncoder.from_preprocessor(my_model.preprocessing_object, read_yaml_file(SCHEMA_FILE_PATH))
+    live = CachedModel(model=my_model, encoder=encoder, version="live", last_modified="", loaded_at=0.0)
+    table = PredictionTable.build(encoder, my_model.predict_encoded, numeric_ranges=PREDICTION_TABLE_NUMERIC_RANGES)
+    max_difference = table.verify(live.predict_live, n_samples=5000)
+    with_table = CachedModel(model=my_model, encoder=encoder, version="table", last_modified="", loaded_at=0.0,
+                             prediction_table=table)
+    print(f"table: {table.n_entries} entries, {table.nbytes / 1024:.0f}KB, built in {table.build_seconds:.2f}s, "
+          f"largest difference to the live model {max_difference:.1e}")
+
+    # Requests drawn from the dataset, with missing ages filled so that every record is covered by the table
+    records = load_dataset()[AD_INPUT_FEATURE_COLUMNS].fillna({"age": 40}).to_dict(orient="records")
+    records = [{field: (None if isinstance(value, float) and np.isnan(value) else value) for field, value in record.items()}
+               for record in records]
+    rng = np.random.default_rng(0)
+    print(f"{'batch':>6} {'live ms':>9} {'table ms':>9} {'speed-up':>9}")
+    for batch_size in args.batch_sizes:
+        batches = [[records[i] for i in rng.integers(0, len(records), batch_size)]
+                   for _ in range(max(args.repeats // batch_size, 20))]
+        live_ms = median_ms(live.predict_records, batches)
+        table_ms = median_ms(with_table.predict_records, batches)
+        print(f"{batch_size:>6} {live_ms:>9.3f} {table_ms:>9.3f} {live_ms / table_ms:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#Benchmark: batch-prediction throughput and per-worker memory of serve.py as the number of workers grows.
+#USS is the memory a worker does not share; it stays flat when the model pages are shared copy-on-write
+#Usage: python benchmarks/bench_prefork.py [--workers 1 2 4] [--seconds 10] [--clients 8] [--batch-rows 500]
+#Needs httpx (pip install httpx)
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+import psutil
+
+from common import ROOT_DIR, load_dataset, train_reference_model
+
+from src.constants import AD_INPUT_FEATURE_COLUMNS
+from src.utils.helpers import save_object
+
+# serve.py in a fresh interpreter, with the model registry replaced by the local reference model
+SERVER_TEMPLATE = """
+import os, sys
+sys.path.insert(0, {root!r})
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+from src.entities.model_cache import ModelCache
+from src.utils.helpers import load_object
+
+class LocalEstimator:
+    def get_model_metadata(self):
+        return {{"version": "benchmark", "last_modified": ""}}
+    def load_model(self, version=None):
+        return load_object({model_path!r})
+
+ModelCache._create_estimator = lambda self: LocalEstimator()
+ModelCache.start_background_refresh = lambda self: None
+import serve
+serve.main(["--workers", "{workers}", "--host", "127.0.0.1", "--port", "{port}"])
+"""
+
+
+async def measure_throughput(port: int, batch: list, clients: int, seconds: float) -> float:
+    completed = 0
+
+    async def client_loop(client, deadline):
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            response = await client.post("/predict/batch", json=batch)
+            completed += response.status_code == 200
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60,
+                                 limits=httpx.Limits(max_connections=clients)) as client:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(client_loop(client, deadline) for _ in range(clients)))
+    return completed / seconds
+
+
+def wait_for_workers(port: int, process: subprocess.Popen, n_workers: int) -> psutil.Process:
+    parent = psutil.Process(process.pid)
+    for _ in range(600):
+        if process.poll() is not None:
+            raise RuntimeError("The server exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics/batcher", timeout=1)
+            if len(parent.children()) == n_workers:
+                return parent
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("The server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--batch-rows", type=int, default=500)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    my_model, _ = train_reference_model()
+    df = load_dataset()[AD_INPUT_FEATURE_COLUMNS].astype(object)
+    records = df.where(df.notna(), None).to_dict(orient="records")
+    batch = [records[i] for i in np.random.default_rng(0).integers(0, len(records), args.batch_rows)]
+
+    print(f"cores: {os.cpu_count()}")
+    print(f"{'workers':>7} {'req/s':>8} {'rows/s':>9} {'parent RSS MB':>14} {'worker RSS MB':>14} {'worker USS MB':>14}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = os.path.join(tmp_dir, "model.pkl")
+        save_object(model_path, my_model)
+        for n_workers in args.workers:
+            server = subprocess.Popen([sys.executable, "-c", SERVER_TEMPLATE.format(
+                root=ROOT_DIR, model_path=model_path, workers=n_workers, port=args.port)], cwd=ROOT_DIR,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                parent = wait_for_workers(args.port, server, n_workers)
+                requests_per_second = asyncio.run(measure_throughput(args.port, batch, args.clients, args.seconds))
+                workers = [child.memory_full_info() for child in parent.children()]
+                parent_rss = parent.memory_info().rss / 2 ** 20
+            finally:
+                server.terminate()
+                server.wait()
+            worker_rss = np.mean([memory.rss for memory in workers]) / 2 ** 20
+            worker_uss = np.mean([memory.uss for memory in workers]) / 2 ** 20
+            print(f"{n_workers:>7} {requests_per_second:>8.1f} {requests_per_second * args.batch_rows:>9.0f} "
+                  f"{parent_rss:>14.1f} {worker_rss:>14.1f} {worker_uss:>14.1f}")
+
+if __name__ == "__main__":
+    main()
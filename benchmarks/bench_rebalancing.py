@@ -0,0 +1,63 @@
+#Benchmark: wall-clock time of each class rebalancing strategy and the test F1 of the model trained on its output,
+#against the SMOTEENN baseline, as rows grow
+#Usage: python benchmarks/bench_rebalancing.py [--rows 10000 100000 1000000] [--max-smoteenn-rows 100000]
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.metrics import f1_score
+from sklearn.model_selection import train_test_split
+from xgboost import XGBClassifier
+
+from common import load_dataset
+
+from src.components.data_transformation import DataTransformation
+from src.constants import MODEL_HYPERPARAMETERS_FILE_PATH, SPLIT_RANDOM_STATE, TARGET_COLUMN
+from src.entities.config_entity import DataTransformationConfig
+from src.utils.helpers import read_yaml_file
+from src.utils.rebalancing import REBALANCE_STRATEGIES, rebalance
+
+
+def transformed_split(n_rows: int):
+    # Same preprocessing as the pipeline, fitted on the train split only
+    df = load_dataset(n_rows)
+    train_df, test_df = train_test_split(df, test_size=0.2, stratify=df[TARGET_COLUMN], random_state=SPLIT_RANDOM_STATE)
+    preprocessor = DataTransformation(data_ingestion_artifact=None, data_transformation_config=DataTransformationConfig(),
+                                      data_validation_artifact=None).get_data_transformer_object()
+    x_train = preprocessor.fit_transform(train_df.drop(columns=[TARGET_COLUMN]))
+    x_test = preprocessor.transform(test_df.drop(columns=[TARGET_COLUMN]))
+    return (np.asarray(x_train, dtype=np.float32), train_df[TARGET_COLUMN].to_numpy(),
+            np.asarray(x_test, dtype=np.float32), test_df[TARGET_COLUMN].to_numpy())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--strategies", nargs="+", default=list(REBALANCE_STRATEGIES), choices=REBALANCE_STRATEGIES)
+    parser.add_argument("--max-smoteenn-rows", type=int, default=100_000,
+                        help="SMOTEENN's nearest-neighbour cleaning grows super-linearly and is skipped above this size")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    hyperparameters = read_yaml_file(MODEL_HYPERPARAMETERS_FILE_PATH)["hyperparameters"]
+    print(f"{'rows':>10} {'strategy':<17} {'rebalance s':>12} {'train rows':>11} {'train s':>8} {'test F1':>8}")
+    for n_rows in args.rows:
+        x_train, y_train, x_test, y_test = transformed_split(n_rows)
+        for strategy in args.strategies:
+            if strategy == "smoteenn" and n_rows > args.max_smoteenn_rows:
+                print(f"{n_rows:>10} {strategy:<17} {'skipped':>12}")
+                continue
+            start = time.perf_counter()
+            features, labels, scale_pos_weight = rebalance(x_train, y_train, strategy, n_jobs=args.n_jobs,
+                                                           random_state=SPLIT_RANDOM_STATE)
+            rebalance_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            model = XGBClassifier(**hyperparameters, scale_pos_weight=scale_pos_weight).fit(features, labels)
+            train_seconds = time.perf_counter() - start
+            f1 = f1_score(y_test, model.predict(x_test))
+            print(f"{n_rows:>10} {strategy:<17} {rebalance_seconds:>12.2f} {len(labels):>11} {train_seconds:>8.2f} {f1:>8.4f}")
+
+if __name__ == "__main__":
+    main()
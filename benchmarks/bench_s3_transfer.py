@@ -0,0 +1,92 @@
+#Benchmark: S3 upload/download throughput of boto3's defaults (get()["Body"].read(), upload_file) vs
+#S3TransferManager for 100 MB - 1 GB artifacts
+#Usage: python benchmarks/bench_s3_transfer.py [--sizes-mb 100 512 1024] [--endpoint-url http://localhost:9000]
+#  --endpoint-url points at a local S3 stand-in (MinIO, or `moto_server -p 9000`); without it the benchmark
+#  runs against moto's in-process mock, which has no network and so mostly measures client-side overhead
+
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+
+import boto3
+import numpy as np
+
+import common  # noqa: F401  (puts the repository root on sys.path)
+
+from src.cloud.s3_transfer import S3TransferManager
+from src.entities.config_entity import S3TransferConfig
+
+BUCKET = "transfer-benchmark"
+
+
+@contextlib.contextmanager
+def s3_client(endpoint_url: str):
+    if endpoint_url:
+        yield boto3.client("s3", endpoint_url=endpoint_url, region_name="us-east-1",
+                           aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID", "minioadmin"),
+                           aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY", "minioadmin"))
+        return
+    from moto import mock_aws
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        yield boto3.client("s3", region_name="us-east-1")
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[100, 512, 1024])
+    parser.add_argument("--endpoint-url", default=None)
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument("--chunk-size-mb", type=int, default=None)
+    args = parser.parse_args()
+
+    transfer_config = S3TransferConfig()
+    if args.max_concurrency:
+        transfer_config.max_concurrency = args.max_concurrency
+    if args.chunk_size_mb:
+        transfer_config.multipart_chunk_size = args.chunk_size_mb * 1024 * 1024
+
+    with s3_client(args.endpoint_url) as client, tempfile.TemporaryDirectory() as tmp_dir:
+        with contextlib.suppress(client.exceptions.BucketAlreadyOwnedByYou):
+            client.create_bucket(Bucket=BUCKET)
+        transfer = S3TransferManager(client, transfer_config)
+
+        print(f"{'MB':>6} {'operation':<28} {'seconds':>8} {'MB/s':>8}")
+        for size_mb in args.sizes_mb:
+            payload = np.random.default_rng(0).integers(0, 256, size=size_mb * 1024 * 1024, dtype=np.uint8).tobytes()
+            file_path = os.path.join(tmp_dir, "artifact.bin")
+            with open(file_path, "wb") as file:
+                file.write(payload)
+
+            def read_default():
+                assert len(client.get_object(Bucket=BUCKET, Key="default.bin")["Body"].read()) == len(payload)
+
+            def read_ranged():
+                assert len(transfer.download_bytes(BUCKET, "transfer.bin")) == len(payload)
+
+            results = [
+                ("upload_file (boto3 default)", timed(lambda: client.upload_file(file_path, BUCKET, "default.bin"))),
+                ("upload_file (transfer)", timed(lambda: transfer.upload_file(file_path, BUCKET, "transfer.bin"))),
+                ("upload_fileobj from buffer", timed(lambda: transfer.upload_fileobj(payload, BUCKET, "buffer.bin"))),
+                ("get().read() (boto3 default)", timed(read_default)),
+                ("ranged parallel GET", timed(read_ranged)),
+                ("download_file (transfer)", timed(lambda: transfer.download_file(BUCKET, "transfer.bin",
+                                                                                   file_path + ".download"))),
+            ]
+            for operation, seconds in results:
+                print(f"{size_mb:>6} {operation:<28} {seconds:>8.2f} {size_mb / seconds:>8.1f}")
+            for key in ("default.bin", "transfer.bin", "buffer.bin"):
+                client.delete_object(Bucket=BUCKET, Key=key)
+            del payload
+
+if __name__ == "__main__":
+    main()
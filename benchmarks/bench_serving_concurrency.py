@@ -0,0 +1,130 @@
+#Benchmark: p50/p99 latency of single-row form predictions while concurrent clients post large batches,
+#with scoring on the event loop vs on the bounded inference executor
+#Usage: python benchmarks/bench_serving_concurrency.py [--seconds 10] [--form-clients 16] [--batch-clients 2] [--batch-rows 2000]
+#Needs httpx (pip install httpx)
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from common import ROOT_DIR, load_dataset, train_reference_model
+
+from src.constants import AD_INPUT_FEATURE_COLUMNS
+from src.utils.helpers import save_object
+
+# The server runs in a fresh interpreter with the reference model preloaded into the model cache
+SERVER_TEMPLATE = """
+import os, sys
+sys.path.insert(0, {root!r})
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+import uvicorn
+import app
+from src.entities.model_cache import CachedModel, get_model_cache
+from src.utils.feature_encoder import FeatureEncoder
+from src.utils.helpers import load_object, read_yaml_file
+from src.constants import SCHEMA_FILE_PATH
+
+model = load_object({model_path!r})
+model.limit_threads(app.prediction_config.inference_threads_per_worker)
+encoder = FeatureEncoder.from_preprocessor(model.preprocessing_object, read_yaml_file(SCHEMA_FILE_PATH))
+model_cache = get_model_cache(app.prediction_config)
+model_cache._current = CachedModel(model=model, encoder=encoder, version="benchmark", last_modified="", loaded_at=0.0)
+model_cache.load = lambda: model_cache._current
+model_cache.start_background_refresh = lambda: None
+
+if {mode!r} == "event_loop":
+    # Scoring inline in the request handlers, as before the executor
+    async def run_inline(func, *args):
+        return func(*args)
+    app.inference_executor.run = run_inline
+    app.micro_batcher.executor = None
+
+uvicorn.run(app.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+
+async def client_loop(client: httpx.AsyncClient, send, deadline: float, latencies: list, statuses: dict) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await send(client)
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            await asyncio.sleep(0.05)
+
+
+async def run_load(port: int, args, records: list) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    rng = np.random.default_rng(0)
+    batch = [records[i] for i in rng.integers(0, len(records), args.batch_rows)]
+    form = {key: "" if value is None else str(value) for key, value in records[0].items()}
+
+    async def send_form(client):
+        return await client.post("/", data=form)
+
+    async def send_batch(client):
+        return await client.post("/predict/batch", json=batch)
+
+    results = {"form": ([], {}), "batch": ([], {})}
+    limits = httpx.Limits(max_connections=args.form_clients + args.batch_clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            *(client_loop(client, send_form, deadline, *results["form"]) for _ in range(args.form_clients)),
+            *(client_loop(client, send_batch, deadline, *results["batch"]) for _ in range(args.batch_clients)))
+    return results
+
+
+def wait_for_server(port: int, process: subprocess.Popen) -> None:
+    for _ in range(300):
+        if process.poll() is not None:
+            raise RuntimeError("The server exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics/batcher", timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError("The server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--form-clients", type=int, default=16)
+    parser.add_argument("--batch-clients", type=int, default=2)
+    parser.add_argument("--batch-rows", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    my_model, _ = train_reference_model()
+    df = load_dataset()[AD_INPUT_FEATURE_COLUMNS].astype(object)
+    records = df.where(df.notna(), None).to_dict(orient="records")
+
+    print(f"{'mode':<11} {'request':<6} {'count':>6} {'p50 ms':>8} {'p99 ms':>8} {'503s':>5}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = os.path.join(tmp_dir, "model.pkl")
+        save_object(model_path, my_model)
+        for mode in ("event_loop", "executor"):
+            server = subprocess.Popen([sys.executable, "-c", SERVER_TEMPLATE.format(
+                root=ROOT_DIR, model_path=model_path, mode=mode, port=args.port)], cwd=ROOT_DIR,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_for_server(args.port, server)
+                results = asyncio.run(run_load(args.port, args, records))
+            finally:
+                server.terminate()
+                server.wait()
+            for request, (latencies, statuses) in results.items():
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if latencies else (float("nan"),) * 2
+                print(f"{mode:<11} {request:<6} {len(latencies):>6} {p50:>8.1f} {p99:>8.1f} {statuses.get(503, 0):>5}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#Benchmark: peak training memory with the combined float64 array, memory-mapped float32 features and uint8 labels,
+#and external-memory training over shards of the mapped files
+#Usage: python benchmarks/bench_training_memory.py [--rows 2000000] [--features 16] [--n-estimators 20] [--shard-rows 200000]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from common import ROOT_DIR
+
+# Each mode trains and runs the accuracy check in a fresh interpreter; the peak is measured from after the
+# imports (Linux only). Mapped pages of the data files count towards the peak once they are read.
+CHILD_TEMPLATE = """
+import json, sys, time
+import numpy as np
+sys.path.insert(0, {root!r})
+from xgboost import XGBClassifier
+from sklearn.metrics import accuracy_score
+from src.components.model_trainer import ModelTrainer
+from src.entities.artifact_entity import DataTransformationArtifact
+from src.entities.config_entity import ModelTrainerConfig
+
+def status_mb(field):
+    with open("/proc/self/status") as status_file:
+        return next(int(line.split()[1]) for line in status_file if line.startswith(field)) / 1024
+
+# Resets the peak RSS (VmHWM) so the peak of the imports is not counted
+with open("/proc/self/clear_refs", "w") as clear_refs:
+    clear_refs.write("5")
+baseline_mb = status_mb("VmRSS:")
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "accuracy": float(accuracy), "peak_mb": status_mb("VmHWM:") - baseline_mb}}))
+"""
+
+# Previous layout: one float64 array with the label as last column, read fully and sliced
+LEGACY_BODY = """
+train_arr = np.load({combined_path!r})
+model = XGBClassifier(n_estimators={n_estimators}, max_depth=6)
+model.fit(train_arr[:, :-1], train_arr[:, -1])
+accuracy = accuracy_score(train_arr[:, -1], model.predict(train_arr[:, :-1]))
+"""
+
+MMAP_BODY = """
+artifact = DataTransformationArtifact(transformed_object_file_path="", transformed_train_file_path={features_path!r},
+                                      transformed_test_file_path="", transformed_train_label_file_path={labels_path!r},
+                                      transformed_test_label_file_path="")
+trainer = ModelTrainer(artifact, ModelTrainerConfig())
+x_train = np.load({features_path!r}, mmap_mode="r")
+y_train = np.load({labels_path!r}, mmap_mode="r")
+model = XGBClassifier(n_estimators={n_estimators}, max_depth=6)
+model.fit(x_train, y_train)
+accuracy = accuracy_score(y_train, trainer.predict_in_chunks(model, x_train))
+"""
+
+EXTERNAL_BODY = """
+import os, tempfile
+artifact = DataTransformationArtifact(transformed_object_file_path="", transformed_train_file_path={features_path!r},
+                                      transformed_test_file_path="", transformed_train_label_file_path={labels_path!r},
+                                      transformed_test_label_file_path="")
+trainer = ModelTrainer(artifact, ModelTrainerConfig(training_mode="external_memory", shard_rows={shard_rows},
+                                                    external_memory_cache_dir=os.path.join(tempfile.mkdtemp(), "cache")))
+trainer.model_hyperparameters["hyperparameters"] = {{"n_estimators": {n_estimators}, "max_depth": 6}}
+model = trainer.train_external_memory()
+x_train = np.load({features_path!r}, mmap_mode="r")
+y_train = np.load({labels_path!r}, mmap_mode="r")
+accuracy = accuracy_score(y_train, trainer.predict_in_chunks(model, x_train))
+"""
+
+
+def measure(body: str) -> dict:
+    output = subprocess.run([sys.executable, "-c", CHILD_TEMPLATE.format(root=ROOT_DIR, body=body)],
+                            check=True, capture_output=True, text=True, cwd=ROOT_DIR).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--features", type=int, default=16)
+    parser.add_argument("--n-estimators", type=int, default=20)
+    parser.add_argument("--shard-rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(args.rows, args.features)).astype(np.float32)
+    labels = (features[:, 0] + rng.normal(scale=0.5, size=args.rows) > 0).astype(np.uint8)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {"combined_path": os.path.join(tmp_dir, "train.npy"),
+                 "features_path": os.path.join(tmp_dir, "train_features.npy"),
+                 "labels_path": os.path.join(tmp_dir, "train_labels.npy")}
+        np.save(paths["combined_path"], np.c_[features.astype(np.float64), labels])
+        np.save(paths["features_path"], features)
+        np.save(paths["labels_path"], labels)
+        del features, labels
+
+        data_mb = os.path.getsize(paths["features_path"]) / 2 ** 20
+        print(f"{args.rows} rows x {args.features} features, float32 features file {data_mb:.1f} MB")
+        print(f"{'mode':<8} {'file MB':>9} {'seconds':>9} {'peak MB':>9} {'peak / data':>12} {'accuracy':>9}")
+        for mode, body, file_keys in (("legacy", LEGACY_BODY, ["combined_path"]),
+                                      ("mmap", MMAP_BODY, ["features_path", "labels_path"]),
+                                      ("external", EXTERNAL_BODY, ["features_path", "labels_path"])):
+            result = measure(body.format(n_estimators=args.n_estimators, shard_rows=args.shard_rows, **paths))
+            file_mb = sum(os.path.getsize(paths[key]) for key in file_keys) / 2 ** 20
+            print(f"{mode:<8} {file_mb:>9.1f} {result['seconds']:>9.2f} {result['peak_mb']:>9.1f} "
+                  f"{result['peak_mb'] / data_mb:>12.2f} {result['accuracy']:>9.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#Shared helpers for the benchmark scripts
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+import pandas as pd
+
+from src.constants import TARGET_COLUMN, SCHEMA_FILE_PATH, MODEL_HYPERPARAMETERS_FILE_PATH
+from src.utils.helpers import read_yaml_file
+
+DATASET_PATH = os.path.join(ROOT_DIR, "dataset", "ad_click_dataset.csv")
+
+
+def load_dataset(n_rows: int = None) -> pd.DataFrame:
+    """
+    Returns the bundled click dataset, repeated (with fresh ids) up to n_rows if given
+    """
+    df = pd.read_csv(DATASET_PATH)
+    if n_rows is None or n_rows == len(df):
+        return df
+    repeats = -(-n_rows // len(df))
+    scaled_df = pd.concat([df] * repeats, ignore_index=True).iloc[:n_rows].copy()
+    scaled_df["id"] = range(len(scaled_df))
+    scaled_df["full_name"] = "User" + scaled_df["id"].astype(str)
+    return scaled_df
+
+
+def train_reference_model():
+    """
+    Trains a MyModel on the bundled dataset with the hyperparameters in configs/model.yaml
+    """
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler, MinMaxScaler
+    from xgboost import XGBClassifier
+
+    from src.entities.estimator_config import MyModel
+    from src.utils.transformation_utils import drop_columns, encode_categorical_features, fill_na_and_knn_impute
+
+    schema_config = read_yaml_file(SCHEMA_FILE_PATH)
+    df = load_dataset()
+    target = df.pop(TARGET_COLUMN)
+    encoded_df = encode_categorical_features(fill_na_and_knn_impute(drop_columns(df, schema_config)))
+
+    preprocessor = Pipeline(steps=[("Preprocessor", ColumnTransformer(
+        transformers=[("StandardScaler", StandardScaler(), schema_config["num_features"]),
+                      ("MinMaxScaler", MinMaxScaler(), schema_config["mm_columns"])],
+        remainder="passthrough"))])
+    model = XGBClassifier(**read_yaml_file(MODEL_HYPERPARAMETERS_FILE_PATH)["hyperparameters"])
+    model.fit(preprocessor.fit_transform(encoded_df), target)
+    return MyModel(preprocessing_object=preprocessor, trained_model_object=model), encoded_df
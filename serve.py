@@ -0,0 +1,143 @@
+#Production entry point: loads and warms the production model once, then forks worker processes that
+#share it copy-on-write and serve the FastAPI app on one listening socket
+#Usage: python serve.py [--workers N] [--host 0.0.0.0] [--port 5000]
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+from src.constants import APP_HOST, APP_PORT
+from src.logging import logging, stop_log_listener
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-fork server for the ad click prediction app")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default=APP_HOST)
+    parser.add_argument("--port", type=int, default=APP_PORT)
+    return parser.parse_args(argv)
+
+
+def get_threads_per_worker(n_workers: int, inference_max_workers: int) -> int:
+    """
+    Native threads per inference thread, so that workers x inference threads x native threads fits the cores
+    """
+    return max(1, (os.cpu_count() or 1) // (n_workers * inference_max_workers))
+
+
+def preload_model(web_app) -> None:
+    """
+    Loads and warms the production model in the parent, single-threaded: the GNU OpenMP runtime XGBoost
+    uses is not fork-safe once it has started its thread pool
+    """
+    from threadpoolctl import threadpool_limits
+    from src.entities.model_cache import get_model_cache
+
+    config = web_app.prediction_config
+    threads_per_worker = config.inference_threads_per_worker
+    config.inference_threads_per_worker = 1
+    try:
+        with threadpool_limits(limits=1):
+            get_model_cache(config).load()
+    except Exception:
+        # No model published yet (or S3 unreachable): every worker loads it on first use
+        logging.warning("Could not preload the production model before forking", exc_info=True)
+    finally:
+        config.inference_threads_per_worker = threads_per_worker
+
+
+def run_worker(web_app, listen_socket: socket.socket) -> None:
+    """
+    Serves the app in a forked child until it is told to stop
+    """
+    import uvicorn
+    from src.entities.model_cache import get_model_cache
+
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signal_number, signal.SIG_DFL)
+    config = web_app.prediction_config
+    model_cache = get_model_cache(config)
+    model_cache.after_fork()
+    status = model_cache.get_status()
+    if status["loaded"]:
+        model_cache.get_model().limit_threads(config.inference_threads_per_worker)
+    logging.info(f"Worker {os.getpid()} serving model version {status.get('version')} "
+                 f"with {config.inference_threads_per_worker} threads per inference thread")
+    # log_config=None sends uvicorn's logs (access log included) through the project's queued handlers
+    server = uvicorn.Server(uvicorn.Config(web_app.app, lifespan="on", log_level="info", log_config=None))
+    server.run(sockets=[listen_socket])
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    import app as web_app
+
+    # Every worker gets its share of the cores for XGBoost and BLAS
+    threads_per_worker = get_threads_per_worker(args.workers, web_app.prediction_config.inference_max_workers)
+    web_app.prediction_config.inference_threads_per_worker = threads_per_worker
+    web_app.inference_executor.threads_per_worker = threads_per_worker
+
+    preload_model(web_app)
+    # Move everything loaded so far out of the collector's reach, so that collections in the workers do not
+    # write to (and so copy) the pages holding the model
+    gc.collect()
+    gc.freeze()
+
+    listen_socket = socket.create_server((args.host, args.port), backlog=2048)
+    workers: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                run_worker(web_app, listen_socket)
+            except BaseException:
+                logging.exception(f"Worker {os.getpid()} failed")
+                exit_code = 1
+            finally:
+                # os._exit skips atexit: write the queued log records first
+                stop_log_listener()
+                os._exit(exit_code)
+        workers[pid] = slot
+
+    def stop(signal_number, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(args.workers):
+        spawn(slot)
+    logging.info(f"Serving on {args.host}:{args.port} with {args.workers} workers "
+                 f"({threads_per_worker} threads per inference thread)")
+
+    # Workers that die are replaced by a fresh fork of this warmed-up parent
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = workers.pop(pid, None)
+        if slot is not None and not stopping:
+            logging.warning(f"Worker {pid} exited with status {status}, starting a new one")
+            time.sleep(1)
+            spawn(slot)
+    listen_socket.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,21 @@
 import boto3
 from src.cloud.aws_handler import S3Client
-from io import StringIO
-from typing import Union,List
+from src.cloud.s3_metadata_cache import S3MetadataCache
+from src.cloud.s3_transfer import S3TransferManager
+from src.constants import S3_LIST_PAGE_SIZE
+from src.entities.config_entity import S3TransferConfig
+from io import BytesIO, StringIO
+from typing import TYPE_CHECKING, BinaryIO, Iterator, Optional, Union
 import os,sys
 from src.logging import logging
-from mypy_boto3_s3.service_resource import Bucket
 from src.exceptions import MyException
 from botocore.exceptions import ClientError
 from pandas import DataFrame,read_csv
 import pickle
 
+if TYPE_CHECKING:
+    from mypy_boto3_s3.service_resource import Bucket
+
 
 class SimpleStorageService:
     """
@@ -17,53 +23,122 @@ class SimpleStorageService:
     data uploads, and data retrieval in S3 buckets.
     """
 
-    def __init__(self):
+    # Shared by every instance, so the estimators, evaluator and model cache of a process reuse lookups
+    metadata_cache = S3MetadataCache()
+
+    def __init__(self, transfer_config: S3TransferConfig = None):
         """
         Initializes the SimpleStorageService instance with S3 resource and client
         from the S3Client class.
+
+        Args:
+            transfer_config (S3TransferConfig): Multipart part size, threshold and concurrency of transfers.
         """
         s3_client = S3Client()
         self.s3_resource = s3_client.s3_resource
         self.s3_client = s3_client.s3_client
+        self.transfer = S3TransferManager(self.s3_client, transfer_config)
 
     def s3_key_path_available(self, bucket_name, s3_key) -> bool:
         """
         Checks if a specified S3 key path (file path) is available in the specified bucket.
+        A file key is checked with one (cached) HEAD request, a folder path ending in "/" with a
+        one-key listing, whatever the number of keys under it.
 
         Args:
             bucket_name (str): Name of the S3 bucket.
-            s3_key (str): Key path of the file to check.
+            s3_key (str): Exact key of the file, or folder path ending in "/".
 
         Returns:
             bool: True if the file exists, False otherwise.
         """
         try:
-            bucket = self.get_bucket(bucket_name)
-            file_objects = [file_object for file_object in bucket.objects.filter(Prefix=s3_key)]
-            return len(file_objects) > 0
+            if s3_key.endswith("/"):
+                response = self.s3_client.list_objects_v2(Bucket=bucket_name, Prefix=s3_key, MaxKeys=1)
+                return response.get("KeyCount", 0) > 0
+            return self.head_object(s3_key, bucket_name) is not None
         except Exception as e:
             raise MyException(e, sys)
 
-    @staticmethod
-    def read_object(object_name: str, decode: bool = True, make_readable: bool = False) -> Union[StringIO, str]:
+    def head_object(self, s3_key: str, bucket_name: str, max_age: float = None) -> Optional[dict]:
+        """
+        Returns the metadata of a single S3 object from the metadata cache, refreshed with a HEAD
+        request when it is older than max_age.
+
+        Args:
+            s3_key (str): Exact key of the object in the bucket.
+            bucket_name (str): Name of the S3 bucket.
+            max_age (float): Oldest cached entry to accept in seconds; defaults to the cache TTL, 0 always fetches.
+
+        Returns:
+            Optional[dict]: The object's ETag, LastModified and ContentLength, or None if it does not exist.
+        """
+        def fetch() -> Optional[dict]:
+            try:
+                response = self.s3_client.head_object(Bucket=bucket_name, Key=s3_key)
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                    return None
+                raise
+            return {
+                "etag": response["ETag"],
+                "last_modified": response["LastModified"],
+                "content_length": response["ContentLength"],
+            }
+
+        try:
+            return self.metadata_cache.get(bucket_name, s3_key, fetch, max_age=max_age)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def iter_objects(self, bucket_name: str, prefix: str = "", page_size: int = S3_LIST_PAGE_SIZE) -> Iterator[dict]:
+        """
+        Lazily lists the objects under a prefix, one page of keys per request, as they are consumed.
+        The metadata of every listed object is put in the metadata cache.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket.
+            prefix (str): Key prefix to list.
+            page_size (int): Number of keys fetched per request.
+
+        Returns:
+            Iterator[dict]: The key, ETag, LastModified and ContentLength of each object.
+        """
+        try:
+            paginator = self.s3_client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, PaginationConfig={"PageSize": page_size}):
+                for item in page.get("Contents", []):
+                    metadata = {
+                        "etag": item["ETag"],
+                        "last_modified": item["LastModified"],
+                        "content_length": item["Size"],
+                    }
+                    self.metadata_cache.put(bucket_name, item["Key"], metadata)
+                    yield {"key": item["Key"], **metadata}
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def read_object(self, object_name: object, decode: bool = True, make_readable: bool = False) -> Union[StringIO, str, bytearray]:
         """
         Reads the specified S3 object with optional decoding and formatting.
+        The content is downloaded with parallel ranged GETs into a single preallocated buffer,
+        sized from the cached metadata of the object.
 
         Args:
-            object_name (str): The S3 object name.
+            object_name (object): The S3 object summary.
             decode (bool): Whether to decode the object content as a string.
             make_readable (bool): Whether to convert content to StringIO for DataFrame usage.
 
         Returns:
-            Union[StringIO, str]: The content of the object, as a StringIO or decoded string.
+            Union[StringIO, str, bytearray]: The content of the object, as a StringIO, decoded string or raw bytes.
         """
         # logging.info("Entered the read_object method of SimpleStorageService class")
         try:
+            metadata = self.head_object(object_name.key, object_name.bucket_name) or {}
+            download = lambda: self.transfer.download_bytes(object_name.bucket_name, object_name.key,
+                                                            metadata.get("content_length"), metadata.get("etag"))
             # Read and decode the object content if decode=True
-            func = (
-                lambda: object_name.get()["Body"].read().decode()
-                if decode else object_name.get()["Body"].read()
-            )
+            func = lambda: download().decode() if decode else download()
             # Convert to StringIO if make_readable=True
             conv_func = lambda: StringIO(func()) if make_readable else func()
             # logging.info("Exited the read_object method of SimpleStorageService class")
@@ -71,7 +146,7 @@ class SimpleStorageService:
         except Exception as e:
             raise MyException(e, sys) from e
 
-    def get_bucket(self, bucket_name: str) -> Bucket:
+    def get_bucket(self, bucket_name: str) -> "Bucket":
         """
         Retrieves the S3 bucket object based on the provided bucket name.
 
@@ -89,25 +164,45 @@ class SimpleStorageService:
         except Exception as e:
             raise MyException(e, sys) from e
 
-    def get_file_object(self, filename: str, bucket_name: str) -> Union[List[object], object]:
+    def get_file_object(self, filename: str, bucket_name: str) -> object:
         """
-        Retrieves the file object(s) from the specified bucket based on the filename.
+        Retrieves the file object for the exact key from the specified bucket, after checking
+        that it exists with a (cached) HEAD request.
 
         Args:
-            filename (str): The name of the file to retrieve.
+            filename (str): The exact key of the file to retrieve.
             bucket_name (str): The name of the S3 bucket.
 
         Returns:
-            Union[List[object], object]: The S3 file object or list of file objects.
+            object: The S3 file object.
         """
         logging.info("Entered the get_file_object method of SimpleStorageService class")
         try:
-            bucket = self.get_bucket(bucket_name)
-            file_objects = [file_object for file_object in bucket.objects.filter(Prefix=filename)]
-            func = lambda x: x[0] if len(x) == 1 else x
-            file_objs = func(file_objects)
+            if self.head_object(filename, bucket_name) is None:
+                raise FileNotFoundError(f"s3://{bucket_name}/{filename} does not exist")
+            file_obj = self.s3_resource.Object(bucket_name, filename)
             logging.info("Exited the get_file_object method of SimpleStorageService class")
-            return file_objs
+            return file_obj
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def get_object_metadata(self, s3_key: str, bucket_name: str, max_age: float = None) -> dict:
+        """
+        Fetches the metadata of a single S3 object with a HEAD request, without downloading its body.
+
+        Args:
+            s3_key (str): Exact key of the object in the bucket.
+            bucket_name (str): Name of the S3 bucket.
+            max_age (float): Oldest cached metadata to accept in seconds; 0 always sends the request.
+
+        Returns:
+            dict: The object's ETag, LastModified timestamp and ContentLength.
+        """
+        try:
+            metadata = self.head_object(s3_key, bucket_name, max_age=max_age)
+            if metadata is None:
+                raise FileNotFoundError(f"s3://{bucket_name}/{s3_key} does not exist")
+            return metadata
         except Exception as e:
             raise MyException(e, sys) from e
 
@@ -150,11 +245,13 @@ class SimpleStorageService:
             if e.response["Error"]["Code"] == "404":
                 folder_obj = folder_name + "/"
                 self.s3_client.put_object(Bucket=bucket_name, Key=folder_obj)
+                self.metadata_cache.invalidate(bucket_name, folder_obj)
             logging.info("Exited the create_folder method of SimpleStorageService class")
 
     def upload_file(self, from_filename: str, to_filename: str, bucket_name: str, remove: bool = True):
         """
         Uploads a local file to the specified S3 bucket with an optional file deletion.
+        Large files are sent as a parallel multipart upload that resumes where an interrupted one stopped.
 
         Args:
             from_filename (str): Path of the local file.
@@ -165,7 +262,8 @@ class SimpleStorageService:
         logging.info("Entered the upload_file method of SimpleStorageService class")
         try:
             logging.info(f"Uploading {from_filename} to {to_filename} in {bucket_name}")
-            self.s3_resource.meta.client.upload_file(from_filename, bucket_name, to_filename)
+            self.transfer.upload_file(from_filename, bucket_name, to_filename)
+            self.metadata_cache.invalidate(bucket_name, to_filename)
             logging.info(f"Uploaded {from_filename} to {to_filename} in {bucket_name}")
 
             # Delete the local file if remove is True
@@ -176,21 +274,56 @@ class SimpleStorageService:
         except Exception as e:
             raise MyException(e, sys) from e
 
+    def upload_fileobj(self, fileobj: Union[bytes, bytearray, memoryview, BinaryIO], to_filename: str, bucket_name: str) -> None:
+        """
+        Uploads an in-memory buffer or binary stream to the specified S3 bucket without a temporary file.
+
+        Args:
+            fileobj (Union[bytes, bytearray, memoryview, BinaryIO]): Content, or a file object opened in binary mode.
+            to_filename (str): Target file path in the bucket.
+            bucket_name (str): Name of the S3 bucket.
+        """
+        try:
+            logging.info(f"Uploading buffer to {to_filename} in {bucket_name}")
+            self.transfer.upload_fileobj(fileobj, bucket_name, to_filename)
+            self.metadata_cache.invalidate(bucket_name, to_filename)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def download_file(self, s3_key: str, bucket_name: str, file_path: str) -> str:
+        """
+        Downloads an object to a local file, resuming an interrupted download of the same object.
+
+        Args:
+            s3_key (str): Exact key of the object in the bucket.
+            bucket_name (str): Name of the S3 bucket.
+            file_path (str): Local destination path.
+
+        Returns:
+            str: The local file path.
+        """
+        try:
+            logging.info(f"Downloading {s3_key} from {bucket_name} to {file_path}")
+            return self.transfer.download_file(bucket_name, s3_key, file_path)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
     def upload_df_as_csv(self, data_frame: DataFrame, local_filename: str, bucket_filename: str, bucket_name: str) -> None:
         """
         Uploads a DataFrame as a CSV file to the specified S3 bucket.
+        The CSV is serialised in memory and streamed; nothing is written to local_filename any more.
 
         Args:
             data_frame (DataFrame): DataFrame to be uploaded.
-            local_filename (str): Temporary local filename for the DataFrame.
+            local_filename (str): Unused, kept for existing callers.
             bucket_filename (str): Target filename in the bucket.
             bucket_name (str): Name of the S3 bucket.
         """
         logging.info("Entered the upload_df_as_csv method of SimpleStorageService class")
         try:
-            # Save DataFrame to CSV locally and then upload it
-            data_frame.to_csv(local_filename, index=None, header=True)
-            self.upload_file(local_filename, bucket_filename, bucket_name)
+            buffer = BytesIO()
+            data_frame.to_csv(buffer, index=None, header=True)
+            self.upload_fileobj(buffer.getbuffer(), bucket_filename, bucket_name)
             logging.info("Exited the upload_df_as_csv method of SimpleStorageService class")
         except Exception as e:
             raise MyException(e, sys) from e
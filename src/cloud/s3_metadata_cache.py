@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from src.constants import S3_METADATA_CACHE_MAX_ENTRIES, S3_METADATA_CACHE_TTL_SECONDS
+
+
+class S3MetadataCache:
+    """
+    Thread-safe TTL cache of S3 object metadata (ETag, size, LastModified) keyed by (bucket, key).
+
+    Missing keys are cached too, so repeated existence checks of an absent model cost one HEAD per
+    TTL. Writers through SimpleStorageService invalidate the keys they touch, so a process always
+    sees its own uploads; changes made by other processes show up within the TTL. At most max_entries
+    keys are kept, so a long-running process does not grow the cache with every key it ever looked up:
+    the least recently used ones, which include the expired ones nobody asks for again, are evicted.
+    """
+
+    def __init__(self, ttl_seconds: float = S3_METADATA_CACHE_TTL_SECONDS,
+                 max_entries: int = S3_METADATA_CACHE_MAX_ENTRIES):
+        """
+        :param ttl_seconds: How long a looked-up entry is reused
+        :param max_entries: Number of keys kept
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Optional[dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, bucket_name: str, s3_key: str, fetch: Callable[[], Optional[dict]],
+            max_age: float = None) -> Optional[dict]:
+        """
+        Returns the cached metadata of the key, or calls fetch (a HEAD) when it is older than max_age
+        :param max_age: Oldest entry to accept in seconds, defaults to the TTL; 0 always fetches
+        :return: The metadata dictionary, or None if the key does not exist
+        """
+        max_age = self.ttl_seconds if max_age is None else max_age
+        key = (bucket_name, s3_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < max_age:
+                self._entries.move_to_end(key)
+                return entry[1]
+        metadata = fetch()
+        self.put(bucket_name, s3_key, metadata)
+        return metadata
+
+
+    def put(self, bucket_name: str, s3_key: str, metadata: Optional[dict]) -> None:
+        key = (bucket_name, s3_key)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), metadata)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def invalidate(self, bucket_name: str, s3_key: str) -> None:
+        with self._lock:
+            self._entries.pop((bucket_name, s3_key), None)
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
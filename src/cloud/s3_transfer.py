@@ -0,0 +1,388 @@
+import json
+import os
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple, Union
+
+from botocore.exceptions import ClientError
+
+from src.entities.config_entity import S3TransferConfig
+from src.exceptions import MyException
+from src.logging import logging
+
+# Bodies of ranged GETs are copied into the destination buffer in slices of this size
+READ_CHUNK_SIZE = 1024 * 1024
+# S3 rejects multipart parts smaller than 5 MiB (except the last) and uploads with more than 10000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10_000
+
+UPLOAD_STATE_SUFFIX = ".s3upload.json"
+DOWNLOAD_PART_SUFFIX = ".s3part"
+DOWNLOAD_STATE_SUFFIX = ".s3part.json"
+
+
+def _write_state(state_path: str, state: dict) -> None:
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(tmp_path, state_path)
+
+
+def _read_state(state_path: str) -> Optional[dict]:
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, "r") as state_file:
+            return json.load(state_file)
+    except ValueError:
+        logging.warning(f"Ignoring unreadable transfer state {state_path}")
+        return None
+
+
+def _is_client_error(error: Exception) -> bool:
+    # 4xx answers (missing key, changed ETag, access denied) will not succeed on a retry
+    if not isinstance(error, ClientError):
+        return False
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 500)
+    return 400 <= status < 500
+
+
+class S3TransferManager:
+    """
+    Parallel, resumable multipart transfers between S3 and local files or in-memory buffers.
+
+    Downloads issue ranged GETs on a thread pool, each writing straight into its slice of a buffer
+    preallocated from the object's size, and pin the object's ETag so a concurrent overwrite fails the
+    transfer instead of mixing two versions. Uploads above the multipart threshold send their parts
+    concurrently; buffers and file objects are streamed part by part, so no temporary file is written
+    and at most 2 x max_concurrency parts are held in memory.
+
+    Transfers to and from local files are resumable: their progress is kept in a JSON sidecar next to
+    the local file (the multipart UploadId for uploads, the completed ranges for downloads) and the next
+    call for the same file and key only transfers what is missing. Interrupted uploads are left open in
+    the bucket for that reason; a lifecycle rule aborting incomplete multipart uploads cleans up the
+    ones that are never resumed.
+    """
+
+    def __init__(self, s3_client, transfer_config: S3TransferConfig = None):
+        """
+        :param s3_client: boto3 S3 client
+        :param transfer_config: Part size, multipart threshold, concurrency and retries
+        """
+        self.s3_client = s3_client
+        self.transfer_config = transfer_config or S3TransferConfig()
+
+
+    def _part_size(self, size: int) -> int:
+        part_size = max(self.transfer_config.multipart_chunk_size, MIN_PART_SIZE)
+        return max(part_size, -(-size // MAX_PARTS))
+
+
+    def _with_retries(self, description: str, func: Callable):
+        attempts = self.transfer_config.max_retries + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                return func()
+            except Exception as e:
+                if attempt == attempts or _is_client_error(e):
+                    raise
+                logging.warning(f"{description} failed (attempt {attempt}/{attempts}), retrying: {e}")
+
+
+    #Downloads
+    def _head(self, bucket_name: str, s3_key: str) -> Tuple[int, str]:
+        response = self.s3_client.head_object(Bucket=bucket_name, Key=s3_key)
+        return response["ContentLength"], response["ETag"]
+
+
+    def _download_range(self, bucket_name: str, s3_key: str, etag: str, start: int, end: int,
+                        write: Callable[[int, bytes], None]) -> None:
+        def download():
+            response = self.s3_client.get_object(Bucket=bucket_name, Key=s3_key, IfMatch=etag,
+                                                 Range=f"bytes={start}-{end - 1}")
+            position = start
+            for chunk in response["Body"].iter_chunks(READ_CHUNK_SIZE):
+                write(position, chunk)
+                position += len(chunk)
+            if position != end:
+                raise IOError(f"Short read of s3://{bucket_name}/{s3_key} bytes {start}-{end - 1}: "
+                              f"got {position - start} bytes")
+        self._with_retries(f"Download of s3://{bucket_name}/{s3_key} bytes {start}-{end - 1}", download)
+
+
+    def _run_parts(self, parts: Iterator[Tuple[int, Callable]], on_done: Callable = None) -> None:
+        # Runs part tasks on the pool with a bounded number in flight, so lazily produced parts (read
+        # from a stream) are not all buffered at once. After a failure no new part is started, but the
+        # parts already running finish and are reported, so a resumed transfer does not redo them.
+        max_in_flight = 2 * self.transfer_config.max_concurrency
+        in_flight = {}
+        errors = []
+
+        def collect(futures) -> None:
+            for future in futures:
+                part_number = in_flight.pop(future)
+                if future.cancelled():
+                    continue
+                if future.exception() is not None:
+                    errors.append(future.exception())
+                elif on_done is not None:
+                    on_done(part_number, future.result())
+
+        with ThreadPoolExecutor(max_workers=self.transfer_config.max_concurrency) as executor:
+            try:
+                for part_number, task in parts:
+                    if len(in_flight) >= max_in_flight:
+                        collect(wait(in_flight, return_when=FIRST_COMPLETED)[0])
+                    if errors:
+                        break
+                    in_flight[executor.submit(task)] = part_number
+            except BaseException:
+                for future in in_flight:
+                    future.cancel()
+                raise
+            finally:
+                collect(wait(in_flight)[0])
+        if errors:
+            raise errors[0]
+
+
+    def _download_into_buffer(self, bucket_name: str, s3_key: str, size: int, etag: str) -> bytearray:
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+
+        def write(position: int, chunk: bytes) -> None:
+            view[position:position + len(chunk)] = chunk
+
+        part_size = self._part_size(size) if size > self.transfer_config.multipart_threshold else max(size, 1)
+        parts = ((start, lambda start=start: self._download_range(bucket_name, s3_key, etag, start,
+                                                                  min(start + part_size, size), write))
+                 for start in range(0, size, part_size))
+        self._run_parts(parts)
+        return buffer
+
+
+    def download_bytes(self, bucket_name: str, s3_key: str, size: int = None, etag: str = None) -> bytearray:
+        """
+        Downloads an object into memory with parallel ranged GETs into a preallocated buffer
+        :param bucket_name: Name of the S3 bucket
+        :param s3_key: Exact key of the object
+        :param size: Size of the object if already known, e.g. from cached metadata
+        :param etag: ETag that size belongs to; if the object has changed since, it is looked up again
+        :return: The object's content
+        """
+        try:
+            if size is None or etag is None:
+                return self._download_into_buffer(bucket_name, s3_key, *self._head(bucket_name, s3_key))
+            try:
+                return self._download_into_buffer(bucket_name, s3_key, size, etag)
+            except ClientError as e:
+                # 412: the object was replaced after the metadata was read; 416: it also shrank
+                if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") not in (412, 416):
+                    raise
+                logging.info(f"s3://{bucket_name}/{s3_key} changed since its metadata was read, looking it up again")
+                return self._download_into_buffer(bucket_name, s3_key, *self._head(bucket_name, s3_key))
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def download_file(self, bucket_name: str, s3_key: str, file_path: str) -> str:
+        """
+        Downloads an object to a local file, resuming a previous interrupted download of the same object
+        :param bucket_name: Name of the S3 bucket
+        :param s3_key: Exact key of the object
+        :param file_path: Local destination; the data is written next to it and renamed when complete
+        :return: file_path
+        """
+        try:
+            size, etag = self._head(bucket_name, s3_key)
+            part_size = self._part_size(size)
+            part_path = f"{file_path}{DOWNLOAD_PART_SUFFIX}"
+            state_path = f"{file_path}{DOWNLOAD_STATE_SUFFIX}"
+            identity = {"bucket": bucket_name, "key": s3_key, "etag": etag, "size": size, "part_size": part_size}
+
+            state = _read_state(state_path)
+            if (state is not None and {k: state.get(k) for k in identity} == identity
+                    and os.path.exists(part_path) and os.path.getsize(part_path) == size):
+                completed = set(state["completed"])
+                logging.info(f"Resuming download of s3://{bucket_name}/{s3_key}: "
+                             f"{len(completed)} parts already downloaded")
+            else:
+                completed = set()
+                os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+                with open(part_path, "wb") as part_file:
+                    part_file.truncate(size)
+                _write_state(state_path, {**identity, "completed": []})
+
+            lock = threading.Lock()
+
+            def download(start: int) -> None:
+                # Each part writes its own disjoint range of the file through its own handle
+                with open(part_path, "r+b") as part_file:
+                    def write(position: int, chunk: bytes) -> None:
+                        part_file.seek(position)
+                        part_file.write(chunk)
+                    self._download_range(bucket_name, s3_key, etag, start, min(start + part_size, size), write)
+
+            def on_done(start: int, _) -> None:
+                with lock:
+                    completed.add(start)
+                    _write_state(state_path, {**identity, "completed": sorted(completed)})
+
+            parts = ((start, lambda start=start: download(start))
+                     for start in range(0, size, part_size) if start not in completed)
+            self._run_parts(parts, on_done)
+
+            os.replace(part_path, file_path)
+            os.remove(state_path)
+            return file_path
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    #Uploads
+    def _upload_parts(self, bucket_name: str, s3_key: str, upload_id: str,
+                      parts: Iterator[Tuple[int, bytes]], completed: Dict[int, str],
+                      on_done: Callable[[int, str], None] = None) -> None:
+        def upload(part_number: int, body: bytes) -> str:
+            return self._with_retries(
+                f"Upload of part {part_number} of s3://{bucket_name}/{s3_key}",
+                lambda: self.s3_client.upload_part(Bucket=bucket_name, Key=s3_key, UploadId=upload_id,
+                                                   PartNumber=part_number, Body=body)["ETag"])
+
+        def done(part_number: int, etag: str) -> None:
+            completed[part_number] = etag
+            if on_done is not None:
+                on_done(part_number, etag)
+
+        self._run_parts(((part_number, lambda part_number=part_number, body=body: upload(part_number, body))
+                         for part_number, body in parts), done)
+        self.s3_client.complete_multipart_upload(
+            Bucket=bucket_name, Key=s3_key, UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": part_number, "ETag": etag}
+                                       for part_number, etag in sorted(completed.items())]})
+
+
+    def _list_parts(self, bucket_name: str, s3_key: str, upload_id: str) -> Optional[Dict[int, str]]:
+        # Parts the bucket already holds for the upload, or None if the upload no longer exists
+        completed = {}
+        try:
+            paginator = self.s3_client.get_paginator("list_parts")
+            for page in paginator.paginate(Bucket=bucket_name, Key=s3_key, UploadId=upload_id):
+                for part in page.get("Parts", []):
+                    completed[part["PartNumber"]] = part["ETag"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchUpload":
+                return None
+            raise
+        return completed
+
+
+    def upload_fileobj(self, fileobj: Union[bytes, bytearray, memoryview, BinaryIO], bucket_name: str,
+                       s3_key: str) -> None:
+        """
+        Uploads an in-memory buffer or a readable binary stream, part by part, without a temporary file
+        :param fileobj: Bytes-like object or file object opened in binary mode
+        :param bucket_name: Name of the S3 bucket
+        :param s3_key: Target key
+        """
+        try:
+            threshold = self.transfer_config.multipart_threshold
+            if isinstance(fileobj, (bytes, bytearray, memoryview)):
+                view = memoryview(fileobj).cast("B")
+                size = len(view)
+                part_size = self._part_size(size)
+                head = bytes(view[:threshold])
+                parts = ((part_number, bytes(view[start:start + part_size]))
+                         for part_number, start in enumerate(range(0, size, part_size), start=1))
+            else:
+                # The size of a stream is unknown, so parts keep the configured size
+                part_size = self._part_size(0)
+                head = fileobj.read(threshold)
+                parts = self._stream_parts(head, fileobj, part_size)
+
+            if len(head) < threshold:
+                self._with_retries(f"Upload of s3://{bucket_name}/{s3_key}",
+                                   lambda: self.s3_client.put_object(Bucket=bucket_name, Key=s3_key, Body=head))
+                return
+
+            upload_id = self.s3_client.create_multipart_upload(Bucket=bucket_name, Key=s3_key)["UploadId"]
+            try:
+                self._upload_parts(bucket_name, s3_key, upload_id, parts, {})
+            except BaseException:
+                # Buffers and streams are not persisted anywhere, so there is nothing to resume from
+                self.s3_client.abort_multipart_upload(Bucket=bucket_name, Key=s3_key, UploadId=upload_id)
+                raise
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    @staticmethod
+    def _stream_parts(head: bytes, fileobj: BinaryIO, part_size: int) -> Iterator[Tuple[int, bytes]]:
+        # Splits the already-read head and the rest of the stream into parts of part_size bytes
+        pending = bytearray(head)
+        part_number = 1
+        while True:
+            while len(pending) >= part_size:
+                yield part_number, bytes(pending[:part_size])
+                del pending[:part_size]
+                part_number += 1
+            chunk = fileobj.read(part_size - len(pending))
+            if not chunk:
+                if pending:
+                    yield part_number, bytes(pending)
+                return
+            pending += chunk
+
+
+    def upload_file(self, file_path: str, bucket_name: str, s3_key: str) -> None:
+        """
+        Uploads a local file, resuming a previous interrupted upload of the same file to the same key
+        :param file_path: Local file to upload
+        :param bucket_name: Name of the S3 bucket
+        :param s3_key: Target key
+        """
+        try:
+            stat = os.stat(file_path)
+            size = stat.st_size
+            if size < self.transfer_config.multipart_threshold:
+                with open(file_path, "rb") as file:
+                    body = file.read()
+                self._with_retries(f"Upload of s3://{bucket_name}/{s3_key}",
+                                   lambda: self.s3_client.put_object(Bucket=bucket_name, Key=s3_key, Body=body))
+                return
+
+            part_size = self._part_size(size)
+            state_path = f"{file_path}{UPLOAD_STATE_SUFFIX}"
+            identity = {"bucket": bucket_name, "key": s3_key, "size": size, "mtime_ns": stat.st_mtime_ns,
+                        "part_size": part_size}
+
+            completed = None
+            state = _read_state(state_path)
+            if state is not None and {k: state.get(k) for k in identity} == identity:
+                completed = self._list_parts(bucket_name, s3_key, state["upload_id"])
+            if completed is not None:
+                upload_id = state["upload_id"]
+                logging.info(f"Resuming upload of {file_path} to s3://{bucket_name}/{s3_key}: "
+                             f"{len(completed)} parts already uploaded")
+            else:
+                upload_id = self.s3_client.create_multipart_upload(Bucket=bucket_name, Key=s3_key)["UploadId"]
+                completed = {}
+                _write_state(state_path, {**identity, "upload_id": upload_id})
+
+            def parts() -> Iterator[Tuple[int, bytes]]:
+                with open(file_path, "rb") as file:
+                    for part_number, start in enumerate(range(0, size, part_size), start=1):
+                        if part_number in completed:
+                            continue
+                        file.seek(start)
+                        yield part_number, file.read(part_size)
+
+            self._upload_parts(bucket_name, s3_key, upload_id, parts(), completed)
+            os.remove(state_path)
+
+        except Exception as e:
+            raise MyException(e, sys) from e
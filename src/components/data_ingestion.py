@@ -1,14 +1,18 @@
 import os
 import sys
 
+import numpy as np
 from pandas import DataFrame
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import ShuffleSplit, train_test_split
 
+from src.constants import SCHEMA_FILE_PATH
 from src.entities.artifact_entity import DataIngestionArtifact
 from src.entities.config_entity import DataIngestionConfig
 from src.exceptions import MyException
 from src.logging import logging
 from src.data.proj_data_handler import GetData
+from src.utils.helpers import read_yaml_file, write_data, ChunkedDataWriter
+from src.utils.instrumentation import instrumented
 
 
 #Data Injestion Class
@@ -35,10 +39,14 @@ class DataIngestion:
 
             logging.info(f"Shape of dataframe: {df.shape}")
 
+            # Categorical columns are stored dictionary-encoded by the columnar formats
+            schema_config = read_yaml_file(file_path=SCHEMA_FILE_PATH)
+            for column in schema_config["categorical_columns"]:
+                if column in df.columns:
+                    df[column] = df[column].astype("category")
+
             feature_store_file_path = self.data_ingestion_config.feature_store_file_path
-            fs_dir = os.path.dirname(feature_store_file_path)
-            os.makedirs(fs_dir,exist_ok=True)
-            df.to_csv(feature_store_file_path,index=False,header=True)
+            write_data(df, feature_store_file_path)
             return df
         
         except Exception as e:
@@ -56,29 +64,91 @@ class DataIngestion:
             logging.info("Performed train test split on the dataframe")
             logging.info("Exited split_data_as_train_test method of Data_Ingestion class")
             
-            dir_path = os.path.dirname(self.data_ingestion_config.training_file_path)
-            os.makedirs(dir_path,exist_ok=True)
-
             logging.info(f"Exporting train and test file path.")
-            train_data.to_csv(self.data_ingestion_config.training_file_path,index=False,header=True)
-            test_data.to_csv(self.data_ingestion_config.testing_file_path,index=False,header=True)
+            write_data(train_data, self.data_ingestion_config.training_file_path)
+            write_data(test_data, self.data_ingestion_config.testing_file_path)
             logging.info(f"Exported train and test file path.")    
 
         except Exception as e:
             raise MyException(e, sys) 
 
 
+    #For streaming data from mongodb into the feature store and the train/test files chunk by chunk
+
+    def stream_data_to_feature_store(self) -> None:
+
+        try:
+            logging.info(f"Streaming data from mongodb in batches of {self.data_ingestion_config.batch_size}")
+            schema_config = read_yaml_file(file_path=SCHEMA_FILE_PATH)
+            drop_cols = schema_config["drop_columns"]
+            columns = [name for column in schema_config["columns"] for name in column if name not in drop_cols]
+
+            # The rows arrive in _id order, as in the in-memory mode; the test rows are the positions
+            # train_test_split picks for the same count and seed, so both modes split the data identically.
+            # That exactness costs one byte per document for the test mask (and a transient 8-byte-per-document
+            # permutation while it is built), on top of the batch_size rows held at a time
+            my_data = GetData()
+            n_documents = my_data.count_documents(collection_name=self.data_ingestion_config.collection_name)
+            is_test = np.zeros(n_documents, dtype=bool)
+            if n_documents > 0:
+                splitter = ShuffleSplit(n_splits=1, test_size=self.data_ingestion_config.train_test_split_ratio,
+                                        random_state=self.data_ingestion_config.split_random_state)
+                _, test_index = next(splitter.split(np.empty((n_documents, 0))))
+                is_test[test_index] = True
+                # test_index is a view of the whole permutation: release it before streaming
+                del test_index
+            n_rows = n_test_rows = 0
+
+            batches = my_data.iter_collection_batches(collection_name=self.data_ingestion_config.collection_name,
+                                                      batch_size=self.data_ingestion_config.batch_size,
+                                                      columns=columns,
+                                                      exclude_columns=drop_cols,
+                                                      numerical_columns=schema_config["numerical_columns"],
+                                                      categorical_columns=schema_config["categorical_columns"])
+            with ChunkedDataWriter(self.data_ingestion_config.feature_store_file_path) as feature_store_writer, \
+                    ChunkedDataWriter(self.data_ingestion_config.training_file_path) as train_writer, \
+                    ChunkedDataWriter(self.data_ingestion_config.testing_file_path) as test_writer:
+                for df in batches:
+                    # Documents inserted after the count go to train
+                    batch_is_test = np.zeros(len(df), dtype=bool)
+                    counted = is_test[n_rows:n_rows + len(df)]
+                    batch_is_test[:len(counted)] = counted
+
+                    feature_store_writer.write(df)
+                    train_writer.write(df[~batch_is_test])
+                    test_writer.write(df[batch_is_test])
+
+                    n_rows += len(df)
+                    n_test_rows += int(batch_is_test.sum())
+
+            if n_rows == 0:
+                raise Exception(f"Collection {self.data_ingestion_config.collection_name} returned no documents")
+            if n_rows != n_documents:
+                logging.warning(f"Collection {self.data_ingestion_config.collection_name} changed while streaming "
+                                f"({n_documents} documents counted, {n_rows} read); the split is not exact")
+
+            logging.info(f"Streamed {n_rows} rows to feature store: {n_rows - n_test_rows} train, {n_test_rows} test")
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
     #To Initiate Data Injestion
 
+    @instrumented
     def initiate_data_ingestion(self)-> DataIngestionArtifact:
         
         logging.info("Entered initiate_data_ingestion method of Data_Ingestion class")
 
         try:
-            dataframe = self.export_data_to_feature_store()
-            logging.info("Got the data from mongodb and saved to feature store")
-
-            self.save_splitted_data_to_feature_store(dataframe)
+            if self.data_ingestion_config.ingestion_mode == "streaming":
+                self.stream_data_to_feature_store()
+                logging.info("Streamed the data from mongodb to feature store and train/test files")
+            else:
+                dataframe = self.export_data_to_feature_store()
+                logging.info("Got the data from mongodb and saved to feature store")
+
+                self.save_splitted_data_to_feature_store(dataframe)
 
             logging.info(
                 "Exited initiate_data_ingestion method of Data_Ingestion class"
@@ -1,7 +1,6 @@
 import sys
 import numpy as np
 import pandas as pd
-from imblearn.combine import SMOTEENN
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler, MinMaxScaler
 from sklearn.compose import ColumnTransformer
@@ -12,7 +11,9 @@ from src.entities.artifact_entity import DataTransformationArtifact, DataIngesti
 from src.exceptions import MyException
 from src.logging import logging
 from src.utils.helpers import save_object, save_numpy_array_data, read_yaml_file, read_data
-from src.utils.transformation_utils import fill_na_and_knn_impute, encode_categorical_features, drop_columns
+from src.utils.instrumentation import instrumented
+from src.utils.rebalancing import rebalance
+from src.utils.transformation_utils import DropColumns, FillNaAndKNNImpute, EncodeCategoricalFeatures
 
 
 class DataTransformation:
@@ -30,86 +31,54 @@ class DataTransformation:
 
     #For Generating Preprocessing Object For Transforamtion
 
-    # def get_data_transformer_object(self) -> Pipeline:
-    #     """
-    #     Creates and returns a data transformer object for the data, 
-    #     including gender mapping, dummy variable creation, column renaming,
-    #     feature scaling, and type adjustments.
-    #     """
-    #     logging.info("Entered get_data_transformer_object method of DataTransformation class")
-
-    #     try:
-
-    #         # Preprocessor pipeline
-    #         preprocessor = Pipeline([
-    #             # Drop specified columns
-    #             ("drop_columns", DropColumns(schema_config=self.schema_config)),
-                
-    #             # Encode categorical features
-    #             ("encode_categorical", EncodeCategoricalFeatures()), 
-                
-    #             # Fill missing values and KNN impute
-    #             ("fill_na_and_knn", FillNaAndKNNImpute(n_neighbors=self.data_transformation_config.knn_n_neighbours)),
-                
-    #             # Apply scaling transformations
-    #             ("scale_features", ColumnTransformer(
-    #                 transformers=[
-    #                     ("StandardScaler", StandardScaler(), self.schema_config["num_features"]),  # Standard scaling
-    #                     ("MinMaxScaler", MinMaxScaler(), self.schema_config["mm_columns"])  # Min-max scaling
-    #                 ],
-    #                 remainder="passthrough"  # Retain other columns as they are
-    #             ))
-    #         ])
-    #         logging.info("Final Pipeline Ready!!")
-    #         logging.info("Exited get_data_transformer_object method of DataTransformation class")
-    #         return preprocessor
-
-
-    #     except Exception as e:
-    #         logging.exception("Exception occurred in get_data_transformer_object method of DataTransformation class")
-    #         raise MyException(e, sys) from e
-        
     def get_data_transformer_object(self) -> Pipeline:
         """
-        Creates and returns a data transformer object for the data, 
-        including gender mapping, dummy variable creation, column renaming,
-        feature scaling, and type adjustments.
+        Creates and returns the preprocessing pipeline, from raw ingested columns to model features:
+        column dropping, KNN imputation, one-hot encoding and feature scaling.
+        Every step is fitted once on the training data and reused by test, evaluation and serving.
         """
         logging.info("Entered get_data_transformer_object method of DataTransformation class")
 
         try:
-            # Initialize transformers
-            numeric_transformer = StandardScaler()
-            min_max_scaler = MinMaxScaler()
-            logging.info("Transformers Initialized: StandardScaler-MinMaxScaler")
-
             # Load schema configurations
             num_features = self.schema_config['num_features']
             mm_columns = self.schema_config['mm_columns']
             logging.info("Cols loaded from schema.")
 
-            # Creating preprocessor pipeline
-            preprocessor = ColumnTransformer(
-                transformers=[
-                    ("StandardScaler", numeric_transformer, num_features),
-                    ("MinMaxScaler", min_max_scaler, mm_columns)
-                ],
-                remainder='passthrough'  # Leaves other columns as they are
-            )
-
-            # Wrapping everything in a single pipeline
-            final_pipeline = Pipeline(steps=[("Preprocessor", preprocessor)])
+            preprocessor = Pipeline(steps=[
+                # Drop specified columns
+                ("drop_columns", DropColumns(columns=self.schema_config["drop_columns"])),
+
+                # Fill missing values and KNN impute
+                ("fill_na_and_knn", FillNaAndKNNImpute(n_neighbors=self.data_transformation_config.knn_n_neighbours,
+                                                       engine=self.data_transformation_config.knn_engine,
+                                                       chunk_size=self.data_transformation_config.knn_chunk_size,
+                                                       n_jobs=self.data_transformation_config.knn_n_jobs)),
+
+                # Encode categorical features
+                ("encode_categorical", EncodeCategoricalFeatures()),
+
+                # Apply scaling transformations
+                ("Preprocessor", ColumnTransformer(
+                    transformers=[
+                        ("StandardScaler", StandardScaler(), num_features),  # Standard scaling
+                        ("MinMaxScaler", MinMaxScaler(), mm_columns)  # Min-max scaling
+                    ],
+                    remainder="passthrough"  # Leaves other columns as they are
+                ))
+            ])
             logging.info("Final Pipeline Ready!!")
             logging.info("Exited get_data_transformer_object method of DataTransformation class")
-            return final_pipeline
+            return preprocessor
 
         except Exception as e:
             logging.exception("Exception occurred in get_data_transformer_object method of DataTransformation class")
             raise MyException(e, sys) from e
-        
+
 
     #Initiates Data Transformation
 
+    @instrumented
     def initiate_data_transformation(self) -> DataTransformationArtifact:
         """
         Initiates the data transformation component for the pipeline.
@@ -117,64 +86,63 @@ class DataTransformation:
         try:
             logging.info("Data Transformation Started !!!")
             if not self.data_validation_artifact.validation_status:
-                raise Exception(self.data_validation_artifact.message)
+                raise Exception(self.data_validation_artifact.validation_error_msg)
 
             # Load train and test data
             train_df = read_data(file_path=self.data_ingestion_artifact.train_file_path)
             test_df = read_data(file_path=self.data_ingestion_artifact.test_file_path)
             logging.info("Train-Test data loaded")
 
-            input_feature_train_df = train_df.drop(columns=[TARGET_COLUMN], axis=1)
+            input_feature_train_df = train_df.drop(columns=[TARGET_COLUMN])
             target_feature_train_df = train_df[TARGET_COLUMN]
 
-            input_feature_test_df = test_df.drop(columns=[TARGET_COLUMN], axis=1)
+            input_feature_test_df = test_df.drop(columns=[TARGET_COLUMN])
             target_feature_test_df = test_df[TARGET_COLUMN]
             logging.info("Input and Target cols defined for both train and test df.")
 
 
-            # Apply custom transformations in specified sequence
-            input_feature_train_df = drop_columns(df=input_feature_train_df,schema_config=self.schema_config)
-            input_feature_train_df = fill_na_and_knn_impute(df=input_feature_train_df,n_neighbors=self.data_transformation_config.knn_n_neighbours)
-            input_feature_train_df = encode_categorical_features(df=input_feature_train_df)
-
-            input_feature_test_df = drop_columns(df=input_feature_test_df,schema_config=self.schema_config)
-            input_feature_test_df = fill_na_and_knn_impute(df=input_feature_test_df,n_neighbors=self.data_transformation_config.knn_n_neighbours)
-            input_feature_test_df = encode_categorical_features(df=input_feature_test_df)
-            logging.info("Custom transformations applied to train and test data")
-
-
             logging.info("Starting data transformation")
             preprocessor = self.get_data_transformer_object()
             logging.info("Got the preprocessor object")
 
             logging.info("Initializing transformation for Training-data")
+            # Imputer, categories and scalers are fitted on train only; test is only transformed
             input_feature_train_arr = preprocessor.fit_transform(input_feature_train_df)
             logging.info("Initializing transformation for Testing-data")
             input_feature_test_arr = preprocessor.transform(input_feature_test_df)
             logging.info("Transformation done end to end to train-test df.")
 
-            logging.info("Applying SMOTEENN for handling imbalanced dataset.")
-            smt = SMOTEENN(sampling_strategy="minority")
-            input_feature_train_final, target_feature_train_final = smt.fit_resample(
-                input_feature_train_arr, target_feature_train_df
+            config = self.data_transformation_config
+            logging.info(f"Applying {config.rebalance_strategy} rebalancing for handling imbalanced dataset.")
+            input_feature_train_final, target_feature_train_final, scale_pos_weight = rebalance(
+                input_feature_train_arr, target_feature_train_df, strategy=config.rebalance_strategy,
+                k_neighbors=config.rebalance_k_neighbors, n_jobs=config.rebalance_n_jobs,
+                random_state=config.random_state
             )
             
-            logging.info("SMOTEENN applied to test df.")
-
-            train_arr = np.c_[input_feature_train_final, np.array(target_feature_train_final)]
-            test_arr = np.c_[input_feature_test_arr, np.array(target_feature_test_df)]
-            logging.info("feature-target concatenation done for train-test df.")
+            logging.info("Rebalancing applied to train df.")
 
+            # Features and labels are kept apart, as contiguous float32 (XGBoost's own precision) and uint8 arrays,
+            # so the trainer can memory-map them and pass them to XGBoost without a copy
             save_object(self.data_transformation_config.transformed_object_file_path, preprocessor)
-            save_numpy_array_data(self.data_transformation_config.transformed_train_file_path, array=train_arr)
-            save_numpy_array_data(self.data_transformation_config.transformed_test_file_path, array=test_arr)
+            save_numpy_array_data(self.data_transformation_config.transformed_train_file_path,
+                                  array=np.ascontiguousarray(input_feature_train_final, dtype=np.float32))
+            save_numpy_array_data(self.data_transformation_config.transformed_train_label_file_path,
+                                  array=np.asarray(target_feature_train_final, dtype=np.uint8))
+            save_numpy_array_data(self.data_transformation_config.transformed_test_file_path,
+                                  array=np.ascontiguousarray(input_feature_test_arr, dtype=np.float32))
+            save_numpy_array_data(self.data_transformation_config.transformed_test_label_file_path,
+                                  array=np.asarray(target_feature_test_df, dtype=np.uint8))
             logging.info("Saving transformation object and transformed files.")
 
             logging.info("Data transformation completed successfully")
             return DataTransformationArtifact(
                 transformed_object_file_path=self.data_transformation_config.transformed_object_file_path,
                 transformed_train_file_path=self.data_transformation_config.transformed_train_file_path,
-                transformed_test_file_path=self.data_transformation_config.transformed_test_file_path
+                transformed_test_file_path=self.data_transformation_config.transformed_test_file_path,
+                transformed_train_label_file_path=self.data_transformation_config.transformed_train_label_file_path,
+                transformed_test_label_file_path=self.data_transformation_config.transformed_test_label_file_path,
+                scale_pos_weight=scale_pos_weight
             )
 
         except Exception as e:
@@ -3,6 +3,7 @@ from src.exceptions import MyException
 from src.entities.config_entity import DataValidationConfig
 from src.entities.artifact_entity import DataValidationArtifact, DataIngestionArtifact 
 from src.utils.helpers import read_yaml_file, read_data
+from src.utils.instrumentation import instrumented
 from src.constants import SCHEMA_FILE_PATH
 
 import os
@@ -30,7 +31,11 @@ class DataValidation:
     def validate_column_numbers(self, dataframe:pd.DataFrame)-> bool:
 
         try:
-            status = len(dataframe.columns.to_list()) == len(self.schema_config["columns"])
+            expected_columns = [name for column in self.schema_config["columns"] for name in column]
+            # drop_columns may already have been dropped by the server during streaming ingestion
+            expected_columns = [column for column in expected_columns
+                                if column in dataframe.columns or column not in self.schema_config["drop_columns"]]
+            status = len(dataframe.columns.to_list()) == len(expected_columns)
             logging.info(f"Is Number of Columns same in Ingested Data: [{status}]")
             return status
         except Exception as e:
@@ -58,6 +63,7 @@ class DataValidation:
     
    
     #Run Data Validation
+    @instrumented
     def initiate_data_validation(self)-> DataValidationArtifact:
 
         try:
@@ -3,9 +3,10 @@ import sys
 from src.cloud.aws_storage import SimpleStorageService
 from src.exceptions import MyException
 from src.logging import logging
+from src.utils.instrumentation import instrumented
 from src.entities.artifact_entity import ModelPusherArtifact, ModelEvaluationArtifact
 from src.entities.config_entity import ModelPusherConfig
-from src.entities.s3_config import CloudModelEstimator
+from src.entities.model_registry import ModelRegistry
 
 
 class ModelPusher:
@@ -18,9 +19,11 @@ class ModelPusher:
         self.s3 = SimpleStorageService()
         self.model_evaluation_artifact = model_evaluation_artifact
         self.model_pusher_config = model_pusher_config
-        self.cloud_model_estimator = CloudModelEstimator(bucket_name=model_pusher_config.bucket_name,
-                                model_path=model_pusher_config.s3_model_key_path)
+        self.model_registry = ModelRegistry(bucket_name=model_pusher_config.bucket_name,
+                                            registry_prefix=model_pusher_config.registry_prefix,
+                                            s3=self.s3)
 
+    @instrumented
     def initiate_model_pusher(self) -> ModelPusherArtifact:
         """
         Method Name :   initiate_model_evaluation
@@ -34,11 +37,22 @@ class ModelPusher:
         try:
             print("------------------------------------------------------------------------------------------------")
             logging.info("Uploading artifacts folder to s3 bucket")
-            
-            logging.info("Uploading new model to S3 bucket....")
-            self.cloud_model_estimator.save_model(from_file=self.model_evaluation_artifact.trained_model_path)
+
+            # A new immutable registry version holds the pickled model, the native booster and its spec;
+            # promoting it is a single manifest write, so serving never sees a half-uploaded model
+            logging.info("Publishing new model version to the model registry....")
+            model_version = self.model_registry.publish_version(
+                files={
+                    self.model_pusher_config.s3_model_key_path: self.model_evaluation_artifact.trained_model_path,
+                    self.model_pusher_config.s3_native_model_key_path: self.model_evaluation_artifact.trained_native_model_path,
+                    self.model_pusher_config.s3_model_spec_key_path: self.model_evaluation_artifact.trained_model_spec_path,
+                },
+                metadata={"changed_accuracy": self.model_evaluation_artifact.changed_accuracy})
+            self.model_registry.promote(model_version)
             model_pusher_artifact = ModelPusherArtifact(bucket_name=self.model_pusher_config.bucket_name,
-                                                        s3_model_path=self.model_pusher_config.s3_model_key_path)
+                                                        s3_model_path=self.model_registry.version_key(
+                                                            model_version, self.model_pusher_config.s3_model_key_path),
+                                                        model_version=model_version)
 
             logging.info("Uploaded artifacts folder to s3 bucket")
             logging.info(f"Model pusher artifact: [{model_pusher_artifact}]")
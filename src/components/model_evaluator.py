@@ -3,7 +3,8 @@ from src.entities.artifact_entity import ModelTrainerArtifact, DataIngestionArti
 from sklearn.metrics import f1_score
 from src.exceptions import MyException
 from src.constants import TARGET_COLUMN,SCHEMA_FILE_PATH
-from src.utils.helpers import read_yaml_file
+from src.utils.helpers import read_yaml_file, read_data
+from src.utils.instrumentation import instrumented
 from src.logging import logging
 import sys
 import pandas as pd
@@ -48,7 +49,8 @@ class ModelEvaluation:
             bucket_name = self.model_eval_config.bucket_name
             model_path=self.model_eval_config.s3_model_key_path
             cloud_model= CloudModelEstimator(bucket_name=bucket_name,
-                                               model_path=model_path)
+                                               model_path=model_path,
+                                               registry_prefix=self.model_eval_config.registry_prefix)
 
             if cloud_model.is_model_present(model_path=model_path):
                 return cloud_model
@@ -67,14 +69,9 @@ class ModelEvaluation:
         On Failure  :   Write an exception log and then raise an exception
         """
         try:
-            test_df = pd.read_csv(self.data_ingestion_artifact.test_file_path)
+            test_df = read_data(file_path=self.data_ingestion_artifact.test_file_path)
             x, y = test_df.drop(TARGET_COLUMN, axis=1), test_df[TARGET_COLUMN]
-            logging.info("Test data loaded and now transforming it for prediction...")
-
-             
-            x = drop_columns(df=x,schema_config=self.schema_config)
-            x = fill_na_and_knn_impute(df=x,n_neighbors=self.data_transformation_config.knn_n_neighbours)
-            x = encode_categorical_features(df=x)
+            logging.info("Test data loaded.")
 
             trained_model_f1_score = self.model_trainer_artifact.metric_artifact.f1_score
             logging.info(f"F1_Score for this model: {trained_model_f1_score}")
@@ -83,7 +80,17 @@ class ModelEvaluation:
             best_model = self.get_best_model()
             if best_model is not None:
                 logging.info(f"Computing F1_Score for production model..")
-                y_hat_best_model = best_model.predict(x)
+                production_model = best_model.load_model()
+                if not production_model.accepts_raw_features:
+                    # Models trained before the fitted pipeline expect frames imputed and one-hot encoded on their own
+                    logging.info("Production model predates the fitted preprocessing pipeline, transforming test data for it")
+                    x = drop_columns(df=x,schema_config=self.schema_config)
+                    x = fill_na_and_knn_impute(df=x,n_neighbors=self.data_transformation_config.knn_n_neighbours,
+                                               engine=self.data_transformation_config.knn_engine,
+                                               chunk_size=self.data_transformation_config.knn_chunk_size,
+                                               n_jobs=self.data_transformation_config.knn_n_jobs)
+                    x = encode_categorical_features(df=x)
+                y_hat_best_model = production_model.predict(x)
                 best_model_f1_score = f1_score(y, y_hat_best_model)
                 logging.info(f"F1_Score-Production Model: {best_model_f1_score}, F1_Score-New Trained Model: {trained_model_f1_score}")
             
@@ -101,6 +108,7 @@ class ModelEvaluation:
         
 
 
+    @instrumented
     def initiate_model_evaluation(self) -> ModelEvaluationArtifact:
         """
         Method Name :   initiate_model_evaluation
@@ -119,6 +127,8 @@ class ModelEvaluation:
                 is_model_accepted=evaluate_model_response.is_model_accepted,
                 s3_model_path=s3_model_path,
                 trained_model_path=self.model_trainer_artifact.trained_model_file_path,
+                trained_native_model_path=self.model_trainer_artifact.trained_native_model_file_path,
+                trained_model_spec_path=self.model_trainer_artifact.trained_model_spec_file_path,
                 changed_accuracy=evaluate_model_response.difference)
 
             logging.info(f"Model evaluation artifact: {model_evaluation_artifact}")
@@ -1,20 +1,54 @@
 import sys
 import os
 import json
-from typing import Tuple
+import shutil
+from typing import Optional, Tuple
 
 import numpy as np
+import xgboost as xgb
 from xgboost import XGBClassifier
 from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
 
 from src.exceptions import MyException
 from src.logging import logging
-from src.constants import MODEL_HYPERPARAMETERS_FILE_PATH
+from src.constants import MODEL_HYPERPARAMETERS_FILE_PATH, SCHEMA_FILE_PATH
 from src.utils.helpers import read_yaml_file
 from src.utils.helpers import load_numpy_array_data, load_object, save_object
+from src.utils.instrumentation import instrumented
 from src.entities.config_entity import ModelTrainerConfig
-from src.entities.artifact_entity import DataTransformationArtifact, ModelTrainerArtifact, ClassificationMetricArtifact
+from src.entities.artifact_entity import (DataTransformationArtifact, ModelTrainerArtifact, ClassificationMetricArtifact,
+                                          ModelTunerArtifact)
 from src.entities.estimator_config import MyModel
+from src.utils.feature_encoder import FeatureEncoder
+
+
+# XGBClassifier parameters whose native training parameter has another name
+NATIVE_PARAMETER_NAMES = {"n_jobs": "nthread", "random_state": "seed"}
+
+
+class TransformedShardIter(xgb.DataIter):
+    """
+    Feeds the memory-mapped transformed features and labels to XGBoost shard_rows rows at a time.
+    Only the shard being read is paged in; XGBoost keeps its own compressed pages in cache_prefix on disk.
+    """
+
+    def __init__(self, features_file_path: str, labels_file_path: str, shard_rows: int, cache_prefix: str):
+        self.features = load_numpy_array_data(file_path=features_file_path, mmap_mode="r")
+        self.labels = load_numpy_array_data(file_path=labels_file_path, mmap_mode="r")
+        self.shard_rows = shard_rows
+        self._start = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> bool:
+        if self._start >= len(self.labels):
+            return False
+        end = self._start + self.shard_rows
+        input_data(data=self.features[self._start:end], label=self.labels[self._start:end])
+        self._start = end
+        return True
+
+    def reset(self) -> None:
+        self._start = 0
 
 
 
@@ -22,38 +56,88 @@ from src.entities.estimator_config import MyModel
 
 class ModelTrainer:
     def __init__(self, data_transformation_artifact:DataTransformationArtifact,
-                 model_training_config:ModelTrainerConfig):
-       
+                 model_training_config:ModelTrainerConfig,
+                 model_tuner_artifact:Optional[ModelTunerArtifact] = None):
+        """
+        With a model tuner artifact the model is trained with the tuned parameters instead of configs/model.yaml
+        """
         self.data_transformation_artifact = data_transformation_artifact
         self.model_training_config = model_training_config
-        self.model_hyperparameters = read_yaml_file(MODEL_HYPERPARAMETERS_FILE_PATH)
+        self.model_hyperparameters = read_yaml_file(model_tuner_artifact.best_params_file_path if model_tuner_artifact
+                                                    else MODEL_HYPERPARAMETERS_FILE_PATH)
+        # The scale_pos_weight rebalancing strategy reweighs the positive class instead of resampling rows
+        if data_transformation_artifact.scale_pos_weight != 1.0:
+            self.model_hyperparameters["hyperparameters"].setdefault("scale_pos_weight",
+                                                                     data_transformation_artifact.scale_pos_weight)
+
+
+    #For Chunked Predictions
+
+    def predict_in_chunks(self, model: XGBClassifier, features: np.ndarray) -> np.ndarray:
+        """
+        Predicts labels predict_chunk_size rows at a time, so scoring a memory-mapped array
+        never materialises it (or an XGBoost matrix of it) in full
+        """
+        chunk_size = self.model_training_config.predict_chunk_size
+        predictions = np.empty(len(features), dtype=np.uint8)
+        for start in range(0, len(features), chunk_size):
+            predictions[start:start + chunk_size] = model.predict(features[start:start + chunk_size])
+        return predictions
+
+
+    #For Out-of-Core Training
+
+    def train_external_memory(self) -> XGBClassifier:
+        """
+        Trains with tree_method="hist" on an external-memory matrix built from shards of the transformed
+        train files, so memory is bounded by the shard size and XGBoost's page cache on disk rather than
+        by the size of the training set. Returns the booster wrapped in an XGBClassifier.
+        """
+        hyperparameters = dict(self.model_hyperparameters["hyperparameters"])
+        num_boost_round = hyperparameters.pop("n_estimators")
+        params = {"objective": "binary:logistic", "tree_method": "hist",
+                  **{NATIVE_PARAMETER_NAMES.get(name, name): value for name, value in hyperparameters.items()}}
+
+        cache_dir = self.model_training_config.external_memory_cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        iterator = train_matrix = None
+        try:
+            iterator = TransformedShardIter(self.data_transformation_artifact.transformed_train_file_path,
+                                            self.data_transformation_artifact.transformed_train_label_file_path,
+                                            shard_rows=self.model_training_config.shard_rows,
+                                            cache_prefix=os.path.join(cache_dir, "train"))
+            # ExtMemQuantileDMatrix (XGBoost >= 3.0) builds the histogram pages directly from the shards
+            train_matrix = xgb.ExtMemQuantileDMatrix(iterator)
+            booster = xgb.train(params, train_matrix, num_boost_round=num_boost_round)
+        finally:
+            # XGBoost deletes its page files when the matrix is freed, so free it before removing the directory
+            iterator = train_matrix = None
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        model = XGBClassifier(**self.model_hyperparameters["hyperparameters"])
+        model.load_model(bytearray(booster.save_raw("ubj")))
+        return model
 
 
     #For Model & Report
 
-    def get_model_object_and_report(self, train: np.array, test: np.array) -> Tuple[object, object]:
+    def get_model_object_and_report(self, x_train: np.ndarray, y_train: np.ndarray,
+                                    x_test: np.ndarray, y_test: np.ndarray) -> Tuple[object, object]:
 
         try:
             logging.info("Training XGBClassifier with specified parameters")
 
-            #Splitting the Data
-            x_train, y_train, x_test, y_test = train[:, :-1], train[:, -1], test[:, :-1], test[:, -1]
-            logging.info("train-test split done.")
-
-            model = XGBClassifier(
-            n_estimators=self.model_hyperparameters["hyperparameters"]["n_estimators"],
-            max_depth=self.model_hyperparameters["hyperparameters"]["max_depth"],
-            learning_rate=self.model_hyperparameters["hyperparameters"]["learning_rate"],
-            subsample=self.model_hyperparameters["hyperparameters"]["subsample"])
-                            
-
-            # Fit the model
-            logging.info("Model training going on...")
-            model.fit(x_train, y_train)
+            # Fit the model; the float32 features are read by XGBoost in place
+            logging.info(f"Model training going on ({self.model_training_config.training_mode})...")
+            if self.model_training_config.training_mode == "external_memory":
+                model = self.train_external_memory()
+            else:
+                model = XGBClassifier(**self.model_hyperparameters["hyperparameters"])
+                model.fit(x_train, y_train)
             logging.info("Model training done.")
 
             # Predictions and evaluation metrics
-            y_pred = model.predict(x_test)
+            y_pred = self.predict_in_chunks(model, x_test)
             accuracy = accuracy_score(y_test, y_pred)
             f1 = f1_score(y_test, y_pred)
             precision = precision_score(y_test, y_pred)
@@ -68,8 +152,42 @@ class ModelTrainer:
         
 
 
+    #For Exporting the Booster in XGBoost's Native Format
+
+    def export_native_model(self, trained_model: XGBClassifier, preprocessing_obj: object) -> None:
+        """
+        Saves the booster as UBJSON and the scaling/one-hot layout as a small JSON sidecar,
+        so serving can rebuild a predict-only model without pickle or sklearn.
+        """
+        try:
+            native_model_path = self.model_training_config.trained_native_model_file_path
+            os.makedirs(os.path.dirname(native_model_path), exist_ok=True)
+            trained_model.get_booster().save_model(native_model_path)
+
+            encoder = FeatureEncoder.from_preprocessor(preprocessing_obj, read_yaml_file(SCHEMA_FILE_PATH))
+            try:
+                best_iteration = int(trained_model.best_iteration)
+            except AttributeError:
+                best_iteration = None
+            model_spec = {
+                "model_name": trained_model.__class__.__name__,
+                "classes": trained_model.classes_.tolist(),
+                "best_iteration": best_iteration,
+                "encoder": encoder.to_dict()
+                }
+
+            with open(self.model_training_config.trained_model_spec_file_path, "w") as spec_file:
+                json.dump(model_spec, spec_file, indent=4)
+
+            logging.info("Native booster and model spec sidecar saved.")
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
     #For Initiation
 
+    @instrumented
     def initiate_model_trainer(self)-> ModelTrainerArtifact:
 
         logging.info("Entered initiate_model_trainer method of ModelTrainer class")
@@ -78,13 +196,17 @@ class ModelTrainer:
             print("------------------------------------------------------------------------------------------------")
             print("Starting Model Trainer Component")
 
-            # Load transformed train and test data
-            train_arr = load_numpy_array_data(file_path=self.data_transformation_artifact.transformed_train_file_path)
-            test_arr = load_numpy_array_data(file_path=self.data_transformation_artifact.transformed_test_file_path)
-            logging.info("train-test data loaded")
+            # Map the transformed train and test data; pages are read from disk as XGBoost scans them
+            artifact = self.data_transformation_artifact
+            x_train = load_numpy_array_data(file_path=artifact.transformed_train_file_path, mmap_mode="r")
+            y_train = load_numpy_array_data(file_path=artifact.transformed_train_label_file_path, mmap_mode="r")
+            x_test = load_numpy_array_data(file_path=artifact.transformed_test_file_path, mmap_mode="r")
+            y_test = load_numpy_array_data(file_path=artifact.transformed_test_label_file_path, mmap_mode="r")
+            logging.info("train-test data mapped")
 
             # Train model and get metrics
-            trained_model, metric_artifact = self.get_model_object_and_report(train=train_arr, test=test_arr)
+            trained_model, metric_artifact = self.get_model_object_and_report(x_train=x_train, y_train=y_train,
+                                                                              x_test=x_test, y_test=y_test)
             logging.info("Model object and artifact loaded.")
 
             # Load preprocessing object
@@ -92,7 +214,7 @@ class ModelTrainer:
             logging.info("Preprocessing obj loaded.")
 
             # Check if the model's accuracy meets the expected threshold
-            if accuracy_score(train_arr[:, -1], trained_model.predict(train_arr[:, :-1])) < self.model_hyperparameters["Expected_Model_Score"]:
+            if accuracy_score(y_train, self.predict_in_chunks(trained_model, x_train)) < self.model_hyperparameters["Expected_Model_Score"]:
                 logging.info("No model found with score above the base score")
                 raise Exception("No model found with score above the base score")
 
@@ -103,6 +225,8 @@ class ModelTrainer:
 
             logging.info("Saved final model object that includes both preprocessing and the trained model")
 
+            self.export_native_model(trained_model=trained_model, preprocessing_obj=preprocessing_obj)
+
 
             #Saving Model Parameters used to a JSON file
             model_parameters = {
@@ -140,6 +264,8 @@ class ModelTrainer:
             # Create and return the ModelTrainerArtifact
             model_trainer_artifact = ModelTrainerArtifact(
                 trained_model_file_path=self.model_training_config.trained_model_file_path,
+                trained_native_model_file_path=self.model_training_config.trained_native_model_file_path,
+                trained_model_spec_file_path=self.model_training_config.trained_model_spec_file_path,
                 trained_model_parameters_path=self.model_training_config.trained_model_parameters_path,
                 trained_model_metrics_path=self.model_training_config.trained_model_metrics_path,
                 metric_artifact=metric_artifact
@@ -0,0 +1,207 @@
+import sys
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple
+
+import numpy as np
+import optuna
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend, JournalFileOpenLock
+from optuna.trial import TrialState
+from sklearn.model_selection import train_test_split
+from xgboost import XGBClassifier
+from xgboost.callback import TrainingCallback
+
+from src.exceptions import MyException
+from src.logging import logging
+from src.utils.helpers import read_yaml_file, write_yaml_file
+from src.utils.instrumentation import instrumented
+from src.entities.config_entity import ModelTunerConfig
+from src.entities.artifact_entity import DataTransformationArtifact, ModelTunerArtifact
+
+TUNING_METRIC = "logloss"
+
+
+
+def _get_storage(storage_file_path: str) -> JournalStorage:
+    # The open lock works on every local file system, unlike the default symlink lock
+    return JournalStorage(JournalFileBackend(storage_file_path, lock_obj=JournalFileOpenLock(storage_file_path)))
+
+
+def suggest_params(trial: optuna.Trial, search_space: Dict[str, dict]) -> dict:
+    """
+    Samples one XGBClassifier parameter set from the search space of configs/model.yaml
+    """
+    params = {}
+    for name, space in search_space.items():
+        if space["type"] == "int":
+            params[name] = trial.suggest_int(name, space["low"], space["high"], log=space.get("log", False))
+        else:
+            params[name] = trial.suggest_float(name, space["low"], space["high"], log=space.get("log", False))
+    return params
+
+
+class OptunaPruningCallback(TrainingCallback):
+    """
+    Reports the validation loss of every boosting round to the trial and stops training
+    as soon as the pruner finds the trial worse than the median of earlier trials at that round
+    """
+
+    def __init__(self, trial: optuna.Trial):
+        self.trial = trial
+        self.pruned = False
+
+    def after_iteration(self, model, epoch: int, evals_log: dict) -> bool:
+        self.trial.report(evals_log["validation_0"][TUNING_METRIC][-1], step=epoch)
+        if self.trial.should_prune():
+            self.pruned = True
+            return True
+        return False
+
+
+def _load_split(train_file_path: str, train_label_file_path: str, validation_fraction: float,
+                random_state: int) -> Tuple[np.ndarray, ...]:
+    # Every worker derives the same stratified split; the test set is left for evaluation
+    features = np.load(train_file_path, mmap_mode="r")
+    labels = np.load(train_label_file_path)
+    fit_index, valid_index = train_test_split(np.arange(len(labels)), test_size=validation_fraction,
+                                              stratify=labels, random_state=random_state)
+    fit_index.sort()
+    valid_index.sort()
+    return features[fit_index], labels[fit_index], features[valid_index], labels[valid_index]
+
+
+def _run_worker(worker_index: int, train_file_path: str, train_label_file_path: str, scale_pos_weight: float,
+                model_tuner_config: ModelTunerConfig, search_space: Dict[str, dict], n_threads: int) -> None:
+    # Runs in a tuning process: pulls trials from the shared study until the trial budget or the timeout is used up
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    x_fit, y_fit, x_valid, y_valid = _load_split(train_file_path, train_label_file_path,
+                                                 model_tuner_config.validation_fraction, model_tuner_config.random_state)
+    study = optuna.load_study(
+        study_name=model_tuner_config.study_name,
+        storage=_get_storage(model_tuner_config.study_storage_file_path),
+        # Seeds differ per worker, otherwise every worker would start with the same random trials
+        sampler=optuna.samplers.TPESampler(seed=model_tuner_config.random_state + worker_index),
+        pruner=optuna.pruners.MedianPruner(n_startup_trials=model_tuner_config.pruner_startup_trials,
+                                           n_warmup_steps=model_tuner_config.pruner_warmup_steps))
+
+    def objective(trial: optuna.Trial) -> float:
+        pruning_callback = OptunaPruningCallback(trial)
+        model = XGBClassifier(n_estimators=model_tuner_config.max_estimators,
+                              early_stopping_rounds=model_tuner_config.early_stopping_rounds,
+                              eval_metric=TUNING_METRIC, n_jobs=n_threads, callbacks=[pruning_callback],
+                              random_state=model_tuner_config.random_state, scale_pos_weight=scale_pos_weight,
+                              **suggest_params(trial, search_space))
+        model.fit(x_fit, y_fit, eval_set=[(x_valid, y_valid)], verbose=False)
+        if pruning_callback.pruned:
+            raise optuna.TrialPruned()
+        trial.set_user_attr("n_estimators", int(model.best_iteration) + 1)
+        return float(model.best_score)
+
+    study.optimize(objective, timeout=model_tuner_config.timeout_seconds,
+                   callbacks=[optuna.study.MaxTrialsCallback(model_tuner_config.n_trials,
+                                                             states=(TrialState.COMPLETE, TrialState.PRUNED))])
+
+
+
+#Initiating Model Tuner Class
+
+class ModelTuner:
+    """
+    Optional stage searching the XGBClassifier parameters with Optuna before training.
+
+    Trials run in n_workers spawned processes sharing one study in a journal file, each on the
+    memory-mapped transformed train features split into fit and validation rows, with XGBoost using
+    an equal share of the CPUs. Early stopping picks the number of trees and median pruning stops
+    trials whose validation loss falls behind. The search ends after n_trials finished or pruned
+    trials or timeout_seconds; the best parameters are written to best_params.yaml in the
+    layout of configs/model.yaml, for the trainer to use.
+    """
+
+    def __init__(self, data_transformation_artifact: DataTransformationArtifact,
+                 model_tuner_config: ModelTunerConfig):
+
+        self.data_transformation_artifact = data_transformation_artifact
+        self.model_tuner_config = model_tuner_config
+        self.model_hyperparameters = read_yaml_file(model_tuner_config.model_config_file_path)
+
+
+    #For Running the Study
+
+    def run_study(self) -> optuna.Study:
+        """
+        Runs the trials across the worker processes and returns the finished study
+        """
+        try:
+            config = self.model_tuner_config
+            os.makedirs(config.model_tuner_dir, exist_ok=True)
+            study = optuna.create_study(study_name=config.study_name, direction="minimize",
+                                        storage=_get_storage(config.study_storage_file_path), load_if_exists=True)
+
+            n_workers = max(1, min(config.n_workers, config.n_trials, os.cpu_count() or 1))
+            n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+            logging.info(f"Running {config.n_trials} tuning trials in {n_workers} processes "
+                         f"with {n_threads} XGBoost threads each")
+
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = [executor.submit(_run_worker, worker_index,
+                                           self.data_transformation_artifact.transformed_train_file_path,
+                                           self.data_transformation_artifact.transformed_train_label_file_path,
+                                           self.data_transformation_artifact.scale_pos_weight,
+                                           config, self.model_hyperparameters["search_space"], n_threads)
+                           for worker_index in range(n_workers)]
+                for future in futures:
+                    future.result()
+            return study
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    #For Initiation
+
+    @instrumented
+    def initiate_model_tuner(self) -> ModelTunerArtifact:
+
+        logging.info("Entered initiate_model_tuner method of ModelTuner class")
+
+        try:
+            print("------------------------------------------------------------------------------------------------")
+            print("Starting Model Tuner Component")
+
+            study = self.run_study()
+            complete_trials = study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,))
+            pruned_trials = study.get_trials(deepcopy=False, states=(TrialState.PRUNED,))
+            if not complete_trials:
+                raise Exception("No tuning trial completed")
+
+            best_trial = study.best_trial
+            best_params = {"n_estimators": best_trial.user_attrs["n_estimators"], **best_trial.params}
+            logging.info(f"Best trial {best_trial.number}: validation {TUNING_METRIC} {best_trial.value:.5f} "
+                         f"with {best_params} ({len(complete_trials)} completed, {len(pruned_trials)} pruned)")
+
+            # Written in the layout of configs/model.yaml so the trainer reads either file the same way
+            write_yaml_file(self.model_tuner_config.best_params_file_path,
+                            {"hyperparameters": best_params,
+                             "Expected_Model_Score": self.model_hyperparameters["Expected_Model_Score"],
+                             "tuning": {"study_name": self.model_tuner_config.study_name,
+                                        "metric": TUNING_METRIC,
+                                        "best_value": float(best_trial.value),
+                                        "best_trial": best_trial.number,
+                                        "n_complete_trials": len(complete_trials),
+                                        "n_pruned_trials": len(pruned_trials)}},
+                            replace=True)
+
+            model_tuner_artifact = ModelTunerArtifact(
+                best_params_file_path=self.model_tuner_config.best_params_file_path,
+                study_storage_file_path=self.model_tuner_config.study_storage_file_path,
+                best_value=float(best_trial.value),
+                n_complete_trials=len(complete_trials),
+                n_pruned_trials=len(pruned_trials)
+            )
+            logging.info(f"Model tuner artifact: {model_tuner_artifact}")
+            return model_tuner_artifact
+
+        except Exception as e:
+            raise MyException(e, sys) from e
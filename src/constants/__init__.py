@@ -14,11 +14,20 @@ DATA_INGESTION_FEATURE_STORE_DIR: str = "feature_store"
 DATA_INGESTION_INGESTED_DIR: str = "ingested"
 DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO: float = 0.20
 SPLIT_RANDOM_STATE: int = 42
+# "streaming" holds batch_size rows at a time plus the exact train/test split mask, one byte per document
+# (O(n), but far below the rows themselves); "in_memory" loads the whole collection
+DATA_INGESTION_MODE: str = "streaming"
+DATA_INGESTION_BATCH_SIZE: int = 10_000
 
 ARTIFACT_DIR: str = "artifact"
-INGESTED_FILE_NAME: str = "data.csv"
-TRAIN_FILE_NAME: str = "train.csv"
-TEST_FILE_NAME: str = "test.csv"
+STAGE_CACHE_DIR_NAME: str = "stage_cache"
+STAGE_CACHE_ENABLED: bool = True  # reuse artifacts of stages whose inputs, config and code are unchanged
+RUN_REPORT_FILE_NAME: str = "run_report.json"  # per-stage time, CPU, peak memory and artifact shapes of a run
+INSTRUMENTATION_SAMPLE_INTERVAL_SECONDS: float = 0.05
+DATA_ARTIFACT_FORMAT: str = "parquet"  # "parquet", "feather" (Arrow IPC) or "csv"
+INGESTED_FILE_NAME: str = f"data.{DATA_ARTIFACT_FORMAT}"
+TRAIN_FILE_NAME: str = f"train.{DATA_ARTIFACT_FORMAT}"
+TEST_FILE_NAME: str = f"test.{DATA_ARTIFACT_FORMAT}"
 
 
 #Data Validation related constants
@@ -33,15 +42,43 @@ DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR: str = "transformed"
 DATA_TRANSFORMATION_PREPROCESSING_OBJECT_DIR: str = "transformed_object"
 PREPROCSSING_OBJECT_FILE_NAME = "preprocessing.pkl"
 IMPUTE_KNN_N_NEIGHBOURS: int = 5
+IMPUTE_KNN_ENGINE: str = "indexed"  # "indexed" (KD trees, chunked, parallel) or "sklearn" (exact KNNImputer)
+IMPUTE_KNN_CHUNK_SIZE: int = 10_000
+IMPUTE_KNN_N_JOBS: int = -1
+REBALANCE_STRATEGY: str = "smoteenn"  # "smoteenn", "smote", "undersample", "scale_pos_weight" or "none"
+REBALANCE_K_NEIGHBORS: int = 5
+REBALANCE_N_JOBS: int = -1
 
 
 #Model Trainer related constants
 MODEL_TRAINER_DIR_NAME: str = "model_trainer"
 TRAINED_MODEL_DIR: str = "trained_model"
 TRAINED_MODEL_NAME: str = "model.pkl"
+TRAINED_NATIVE_MODEL_NAME: str = "model.ubj"
+TRAINED_MODEL_SPEC_NAME: str = "model_spec.json"
 TRAINED_MODEL_PARAMETERS: str = "parameters.yaml"
 TRAINED_MODEL_METRICS: str = "metrics.yaml"
 MODEL_HYPERPARAMETERS_FILE_PATH: str = os.path.join("configs", "model.yaml")
+MODEL_TRAINER_PREDICT_CHUNK_SIZE: int = 100_000  # rows scored at a time for the accuracy checks
+MODEL_TRAINER_TRAINING_MODE: str = "in_memory"  # "in_memory" or "external_memory" (shards streamed through a DataIter)
+MODEL_TRAINER_SHARD_ROWS: int = 1_000_000  # rows per shard in external-memory mode
+MODEL_TRAINER_EXTERNAL_MEMORY_CACHE_DIR: str = "xgb_cache"
+
+
+#Model Tuner related constants
+MODEL_TUNING_ENABLED: bool = False  # run the Optuna search before training and train with its best parameters
+MODEL_TUNER_DIR_NAME: str = "model_tuner"
+MODEL_TUNER_STUDY_STORAGE_NAME: str = "study.journal"
+MODEL_TUNER_BEST_PARAMS_NAME: str = "best_params.yaml"
+MODEL_TUNER_STUDY_NAME: str = "xgb-classifier"
+MODEL_TUNER_N_TRIALS: int = 50
+MODEL_TUNER_N_WORKERS: int = 2
+MODEL_TUNER_TIMEOUT_SECONDS: float = 1800.0
+MODEL_TUNER_MAX_ESTIMATORS: int = 1000  # upper bound; early stopping picks the number of trees
+MODEL_TUNER_EARLY_STOPPING_ROUNDS: int = 30
+MODEL_TUNER_VALIDATION_FRACTION: float = 0.2
+MODEL_TUNER_PRUNER_STARTUP_TRIALS: int = 5
+MODEL_TUNER_PRUNER_WARMUP_STEPS: int = 20
 
 
 #Model Evaluation related constants
@@ -49,6 +86,79 @@ MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE: float = 0.02
 MODEL_BUCKET_NAME = "ad-click-mlops"
 MODEL_PUSHER_S3_KEY = "model-registry"
 S3_STORED_MODEL_FILE_NAME = "model.pkl"
+S3_STORED_NATIVE_MODEL_FILE_NAME = "model.ubj"
+S3_STORED_MODEL_SPEC_FILE_NAME = "model_spec.json"
+
+
+#Model Registry related constants
+MODEL_REGISTRY_MANIFEST_NAME: str = "manifest.json"
+MODEL_REGISTRY_VERSIONS_DIR: str = "versions"
+MODEL_REGISTRY_VERSION_INFO_NAME: str = "version.json"
+MODEL_REGISTRY_HISTORY_SIZE: int = 20
+MODEL_REGISTRY_CACHE_DIR: str = os.path.join(ARTIFACT_DIR, "model_registry_cache")
+MODEL_REGISTRY_CACHE_MAX_VERSIONS: int = 5
+# Models pushed before the registry existed sit at these keys in the bucket root; the first is required
+MODEL_REGISTRY_LEGACY_FILE_NAMES: list = [S3_STORED_MODEL_FILE_NAME, S3_STORED_NATIVE_MODEL_FILE_NAME,
+                                          S3_STORED_MODEL_SPEC_FILE_NAME]
+
+
+#S3 transfer related constants
+S3_TRANSFER_MULTIPART_THRESHOLD: int = 64 * 1024 * 1024
+S3_TRANSFER_CHUNK_SIZE: int = 16 * 1024 * 1024
+S3_TRANSFER_MAX_CONCURRENCY: int = 10
+S3_TRANSFER_MAX_RETRIES: int = 3
+S3_METADATA_CACHE_TTL_SECONDS: float = 30.0
+S3_METADATA_CACHE_MAX_ENTRIES: int = 10_000  # least recently used keys beyond this are evicted
+S3_LIST_PAGE_SIZE: int = 1000
+
+
+#Model Serving related constants
+MODEL_CACHE_REFRESH_INTERVAL_SECONDS: int = 60
+SERVING_MODEL_FORMAT: str = "pickle"  # "pickle" (MyModel) or "native" (XGBoost UBJSON + JSON sidecar)
+MICRO_BATCH_MAX_SIZE: int = 64
+MICRO_BATCH_MAX_WAIT_MS: float = 2.0
+MICRO_BATCH_MAX_QUEUE_SIZE: int = 1024  # rows waiting for a batch before new ones get 503
+INFERENCE_MAX_WORKERS: int = min(4, os.cpu_count() or 1)  # batches scored in parallel per server process
+INFERENCE_THREADS_PER_WORKER: int = max(1, (os.cpu_count() or 1) // INFERENCE_MAX_WORKERS)
+INFERENCE_MAX_PENDING: int = 32  # running and queued scoring calls before new ones get 503
+PREDICTION_BATCH_MAX_RECORDS: int = 10_000  # records per /predict/batch request before it gets 413
+MODEL_WARMUP_BATCH_SIZE: int = 32
+PREDICTION_TABLE_ENABLED: bool = False  # score every point of the input space at model load and serve lookups
+PREDICTION_TABLE_NUMERIC_RANGES: dict = {"age": (18, 80)}  # inclusive integer range tabulated per numeric field
+PREDICTION_TABLE_MAX_ENTRIES: int = 5_000_000
+PREDICTION_TABLE_CHECK_SAMPLES: int = 2000
+ADMIN_TOKEN_ENV_KEY = "ADMIN_TOKEN"
+
+# Raw feature fields the preprocessing pipeline is fitted on
+AD_INPUT_FEATURE_COLUMNS: list = [
+    "age",
+    "gender",
+    "device_type",
+    "ad_position",
+    "browsing_history",
+    "time_of_day",
+]
+# Raw feature fields that are numbers; form posts send them as strings
+AD_NUMERIC_FEATURE_COLUMNS: list = ["age"]
+
+
+#Training Job related constants
+TRAINING_JOBS_DIR: str = os.path.join(ARTIFACT_DIR, "training_jobs")
+TRAINING_JOB_NICENESS: int = 10  # added to the training process's niceness so serving keeps the CPU first
+
+#Logging related constants; each can be overridden by the environment variable of the same name
+LOG_LEVEL: str = "DEBUG"
+LOG_FORMAT: str = "text"  # "text" or "json" (one JSON object per line)
+LOG_ASYNC: bool = True  # write logs on a background thread fed by a queue
+LOG_QUEUE_SIZE: int = 10_000  # records waiting for the writer thread; more are dropped rather than waited on
+LOG_MODULE_LEVELS: dict = {"botocore": "WARNING", "boto3": "WARNING", "s3transfer": "WARNING", "urllib3": "WARNING"}
+LOG_HOT_PATH_SAMPLE_RATE: int = 100  # one in N sampled debug messages on the prediction path is logged
+
+# Budget for importing the serving app in a fresh interpreter, enforced by src/tests/test_import_time.py
+SERVING_IMPORT_TIME_BUDGET_SECONDS: float = 1.5
+# Modules the serving app only imports once it loads a model (sklearn, xgboost) or runs training
+SERVING_DEFERRED_MODULES: list = ["sklearn", "xgboost", "imblearn", "optuna", "pymongo", "mypy_boto3_s3",
+                               "src.components", "src.pipelines.train_pipeline"]
 
 APP_HOST = "0.0.0.0"
 APP_PORT = 5000
@@ -1,7 +1,7 @@
 import sys
 import pandas as pd
 import numpy as np
-from typing import Optional
+from typing import Iterator, List, Optional
 
 from src.config.mongo_db_handler import MongoDBClient
 from src.exceptions import MyException
@@ -37,14 +37,107 @@ class GetData:
 
             logging.info("Data Retrieved, Converting to DataFrame")
 
-            df = pd.DataFrame(list(collection.find()))
-            print(f"Data fecthed with len: {len(df)}")
+            # Sorted by _id (served from its index) so the rows, and the train/test split, do not depend on
+            # the server's natural order
+            df = pd.DataFrame(list(collection.find().sort("_id", 1)))
+            logging.info(f"Data fetched with len: {len(df)}")
             
             if "_id" in df.columns.to_list():
-                df = df.drop(columns=["_id"], axis=1)
+                df = df.drop(columns=["_id"])
             df.replace({"na":np.nan},inplace=True)
             return df
 
         except Exception as e:
             raise MyException(e, sys)
-        
\ No newline at end of file
+
+
+    def iter_collection_batches(self, collection_name: str, batch_size: int, columns: List[str],
+                                exclude_columns: List[str] = (), numerical_columns: List[str] = (),
+                                categorical_columns: List[str] = (), database_name: Optional[str] = None) -> Iterator[pd.DataFrame]:
+
+        #Pages through the collection in _id order and yields typed DataFrame chunks of at most batch_size rows.
+        #_id and exclude_columns are dropped by the server through the projection, so they never reach Python.
+        #Every chunk has exactly `columns`, in that order, so chunks can be appended to one file.
+
+        try:
+            if database_name is None:
+                collection = self.mongo_client.database[collection_name]
+            else:
+                collection = self.mongo_client[database_name][collection_name]
+
+            projection = {"_id": 0, **{column: 0 for column in exclude_columns}}
+            cursor = collection.find({}, projection=projection, batch_size=batch_size).sort("_id", 1)
+
+            n_rows = 0
+            documents = []
+            for document in cursor:
+                documents.append(document)
+                if len(documents) == batch_size:
+                    n_rows += len(documents)
+                    yield self._documents_to_df(documents, columns, numerical_columns, categorical_columns)
+                    documents = []
+            if documents:
+                n_rows += len(documents)
+                yield self._documents_to_df(documents, columns, numerical_columns, categorical_columns)
+
+            logging.info(f"Streamed {n_rows} documents from {collection_name} in batches of {batch_size}")
+
+        except Exception as e:
+            raise MyException(e, sys)
+
+
+    def count_documents(self, collection_name: str, database_name: Optional[str] = None) -> int:
+
+        #Returns the number of documents in the collection, from the server's count without reading them
+
+        try:
+            if database_name is None:
+                collection = self.mongo_client.database[collection_name]
+            else:
+                collection = self.mongo_client[database_name][collection_name]
+            return collection.count_documents({})
+
+        except Exception as e:
+            raise MyException(e, sys)
+
+
+    def get_collection_fingerprint(self, collection_name: str, database_name: Optional[str] = None) -> str:
+
+        #Returns a string that changes whenever the collection's content changes, without sending the documents
+        #to Python. Uses the server's dbHash, an MD5 over the collection: the server still reads and hashes every
+        #document, a full collection scan on each pipeline run (cheaper than ingesting, but not free).
+        #Where that command is not allowed (e.g. shared Atlas tiers) it falls back to document count + largest
+        #_id, which catches inserts and deletes only: an in-place update is not seen, so a changed collection
+        #can still reuse the cached ingestion. A warning is logged whenever the fallback is used.
+
+        try:
+            database = self.mongo_client.database if database_name is None else self.mongo_client.client[database_name]
+            try:
+                db_hash = database.command("dbHash", collections=[collection_name])
+                return f"dbHash:{db_hash['collections'].get(collection_name, '')}"
+            except Exception as e:
+                logging.warning(f"dbHash not available for {collection_name} ({e}); fingerprinting it by document "
+                                "count and max _id instead. Documents updated in place are not detected, so a stale "
+                                "cached ingestion may be reused: disable the stage cache if the collection was edited")
+
+            collection = database[collection_name]
+            last_document = collection.find_one({}, projection={"_id": 1}, sort=[("_id", -1)])
+            last_id = last_document["_id"] if last_document is not None else None
+            return f"count:{collection.count_documents({})}:max_id:{last_id}"
+
+        except Exception as e:
+            raise MyException(e, sys)
+
+
+    @staticmethod
+    def _documents_to_df(documents: List[dict], columns: List[str], numerical_columns: List[str],
+                         categorical_columns: List[str]) -> pd.DataFrame:
+        df = pd.DataFrame(documents, columns=columns)
+        df.replace({"na": np.nan}, inplace=True)
+        for column in numerical_columns:
+            if column in df.columns:
+                df[column] = pd.to_numeric(df[column], errors="coerce")
+        for column in categorical_columns:
+            if column in df.columns:
+                df[column] = df[column].astype("category")
+        return df
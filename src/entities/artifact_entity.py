@@ -22,6 +22,9 @@ class DataTransformationArtifact:
     transformed_object_file_path:str 
     transformed_train_file_path:str
     transformed_test_file_path:str
+    transformed_train_label_file_path:str
+    transformed_test_label_file_path:str
+    scale_pos_weight:float = 1.0
 
 
 #For Classification Metrics
@@ -37,11 +40,24 @@ class ClassificationMetricArtifact:
 @dataclass
 class ModelTrainerArtifact:
     trained_model_file_path:str
+    trained_native_model_file_path:str
+    trained_model_spec_file_path:str
     trained_model_metrics_path:str
     trained_model_parameters_path:str 
     metric_artifact:ClassificationMetricArtifact      
 
 
+#For Model Tuner
+@dataclass
+class ModelTunerArtifact:
+    best_params_file_path:str
+    study_storage_file_path:str
+    best_value:float
+    n_complete_trials:int
+    n_pruned_trials:int
+
+
+
 #For Model Evaluation
 @dataclass
 class ModelEvaluationArtifact:
@@ -49,10 +65,13 @@ class ModelEvaluationArtifact:
     changed_accuracy:float
     s3_model_path:str 
     trained_model_path:str
+    trained_native_model_path:str
+    trained_model_spec_path:str
 
 
 #For Model Pusher
 @dataclass
 class ModelPusherArtifact:
     bucket_name:str
-    s3_model_path:str
\ No newline at end of file
+    s3_model_path:str
+    model_version:str
\ No newline at end of file
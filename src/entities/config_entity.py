@@ -1,6 +1,6 @@
 import os
 from src.constants import *
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 
 TIMESTAMP: str = datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
@@ -12,6 +12,11 @@ class TrainingPipelineConfig:
     pipeline_name: str = PIPELINE_NAME
     artifact_dir: str = os.path.join(ARTIFACT_DIR, TIMESTAMP)
     timestamp: str = TIMESTAMP
+    stage_cache_dir: str = os.path.join(ARTIFACT_DIR, STAGE_CACHE_DIR_NAME)
+    stage_cache_enabled: bool = STAGE_CACHE_ENABLED
+    model_tuning_enabled: bool = MODEL_TUNING_ENABLED
+    run_report_file_path: str = os.path.join(artifact_dir, RUN_REPORT_FILE_NAME)
+    instrumentation_sample_interval: float = INSTRUMENTATION_SAMPLE_INTERVAL_SECONDS
 
 
 training_pipeline_config: TrainingPipelineConfig = TrainingPipelineConfig()
@@ -27,6 +32,8 @@ class DataIngestionConfig:
     train_test_split_ratio: float = DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO
     split_random_state: int = SPLIT_RANDOM_STATE
     collection_name:str = DATA_INGESTION_COLLECTION_NAME
+    ingestion_mode: str = DATA_INGESTION_MODE
+    batch_size: int = DATA_INGESTION_BATCH_SIZE
 
 
 #Data Validation Component Configs
@@ -41,13 +48,24 @@ class DataValidationConfig:
 class DataTransformationConfig:
     data_transformation_dir = os.path.join(training_pipeline_config.artifact_dir,DATA_TRANFORMATION_DIR_NAME)
     transformed_train_file_path: str = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
-                                                    TRAIN_FILE_NAME.replace("csv", "npy"))
+                                                    os.path.splitext(TRAIN_FILE_NAME)[0] + "_features.npy")
+    transformed_train_label_file_path: str = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+                                                          os.path.splitext(TRAIN_FILE_NAME)[0] + "_labels.npy")
     transformed_test_file_path: str = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
-                                                   TEST_FILE_NAME.replace("csv", "npy"))
+                                                   os.path.splitext(TEST_FILE_NAME)[0] + "_features.npy")
+    transformed_test_label_file_path: str = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+                                                         os.path.splitext(TEST_FILE_NAME)[0] + "_labels.npy")
     transformed_object_file_path: str = os.path.join(data_transformation_dir,
                                                      DATA_TRANSFORMATION_PREPROCESSING_OBJECT_DIR,
                                                      PREPROCSSING_OBJECT_FILE_NAME)
     knn_n_neighbours: int = IMPUTE_KNN_N_NEIGHBOURS
+    knn_engine: str = IMPUTE_KNN_ENGINE
+    knn_chunk_size: int = IMPUTE_KNN_CHUNK_SIZE
+    knn_n_jobs: int = IMPUTE_KNN_N_JOBS
+    rebalance_strategy: str = REBALANCE_STRATEGY
+    rebalance_k_neighbors: int = REBALANCE_K_NEIGHBORS
+    rebalance_n_jobs: int = REBALANCE_N_JOBS
+    random_state: int = SPLIT_RANDOM_STATE
 
 
 #Model Trainer Component Configs
@@ -55,9 +73,34 @@ class DataTransformationConfig:
 class ModelTrainerConfig:
     model_trainer_dir: str = os.path.join(training_pipeline_config.artifact_dir, MODEL_TRAINER_DIR_NAME)
     trained_model_file_path: str = os.path.join(model_trainer_dir, TRAINED_MODEL_DIR, TRAINED_MODEL_NAME)
+    trained_native_model_file_path: str = os.path.join(model_trainer_dir, TRAINED_MODEL_DIR, TRAINED_NATIVE_MODEL_NAME)
+    trained_model_spec_file_path: str = os.path.join(model_trainer_dir, TRAINED_MODEL_DIR, TRAINED_MODEL_SPEC_NAME)
     trained_model_parameters_path: str = os.path.join(model_trainer_dir, TRAINED_MODEL_DIR,TRAINED_MODEL_PARAMETERS)
     trained_model_metrics_path: str = os.path.join(model_trainer_dir, TRAINED_MODEL_DIR,TRAINED_MODEL_METRICS)
     model_config_file_path: str = MODEL_HYPERPARAMETERS_FILE_PATH
+    predict_chunk_size: int = MODEL_TRAINER_PREDICT_CHUNK_SIZE
+    training_mode: str = MODEL_TRAINER_TRAINING_MODE
+    shard_rows: int = MODEL_TRAINER_SHARD_ROWS
+    external_memory_cache_dir: str = os.path.join(model_trainer_dir, MODEL_TRAINER_EXTERNAL_MEMORY_CACHE_DIR)
+
+
+#Model Tuner Component Configs
+@dataclass
+class ModelTunerConfig:
+    model_tuner_dir: str = os.path.join(training_pipeline_config.artifact_dir, MODEL_TUNER_DIR_NAME)
+    study_storage_file_path: str = os.path.join(model_tuner_dir, MODEL_TUNER_STUDY_STORAGE_NAME)
+    best_params_file_path: str = os.path.join(model_tuner_dir, MODEL_TUNER_BEST_PARAMS_NAME)
+    model_config_file_path: str = MODEL_HYPERPARAMETERS_FILE_PATH
+    study_name: str = MODEL_TUNER_STUDY_NAME
+    n_trials: int = MODEL_TUNER_N_TRIALS
+    n_workers: int = MODEL_TUNER_N_WORKERS
+    timeout_seconds: float = MODEL_TUNER_TIMEOUT_SECONDS
+    max_estimators: int = MODEL_TUNER_MAX_ESTIMATORS
+    early_stopping_rounds: int = MODEL_TUNER_EARLY_STOPPING_ROUNDS
+    validation_fraction: float = MODEL_TUNER_VALIDATION_FRACTION
+    pruner_startup_trials: int = MODEL_TUNER_PRUNER_STARTUP_TRIALS
+    pruner_warmup_steps: int = MODEL_TUNER_PRUNER_WARMUP_STEPS
+    random_state: int = SPLIT_RANDOM_STATE
 
 
 #Model Evaluation Component Configs
@@ -66,16 +109,46 @@ class ModelEvaluationConfig:
     changed_threshold_score: float = MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE
     bucket_name: str = MODEL_BUCKET_NAME
     s3_model_key_path: str = S3_STORED_MODEL_FILE_NAME
+    registry_prefix: str = MODEL_PUSHER_S3_KEY
 
 
 #Model Pusher Component Configs
 @dataclass
 class ModelPusherConfig:
     bucket_name: str = MODEL_BUCKET_NAME
-    s3_model_key_path: str = S3_STORED_MODEL_FILE_NAME  
+    s3_model_key_path: str = S3_STORED_MODEL_FILE_NAME
+    s3_native_model_key_path: str = S3_STORED_NATIVE_MODEL_FILE_NAME
+    s3_model_spec_key_path: str = S3_STORED_MODEL_SPEC_FILE_NAME
+    registry_prefix: str = MODEL_PUSHER_S3_KEY
+
+
+@dataclass
+class S3TransferConfig:
+    multipart_threshold: int = S3_TRANSFER_MULTIPART_THRESHOLD
+    multipart_chunk_size: int = S3_TRANSFER_CHUNK_SIZE
+    max_concurrency: int = S3_TRANSFER_MAX_CONCURRENCY
+    max_retries: int = S3_TRANSFER_MAX_RETRIES
 
 
 @dataclass
 class AdPredictorConfig:
     model_file_path: str = TRAINED_MODEL_NAME
-    model_bucket_name: str = MODEL_BUCKET_NAME    
\ No newline at end of file
+    native_model_file_path: str = S3_STORED_NATIVE_MODEL_FILE_NAME
+    model_spec_file_path: str = S3_STORED_MODEL_SPEC_FILE_NAME
+    model_format: str = SERVING_MODEL_FORMAT
+    model_bucket_name: str = MODEL_BUCKET_NAME
+    registry_prefix: str = MODEL_PUSHER_S3_KEY
+    registry_cache_dir: str = MODEL_REGISTRY_CACHE_DIR
+    model_refresh_interval_seconds: int = MODEL_CACHE_REFRESH_INTERVAL_SECONDS
+    micro_batch_max_size: int = MICRO_BATCH_MAX_SIZE
+    micro_batch_max_wait_ms: float = MICRO_BATCH_MAX_WAIT_MS
+    micro_batch_max_queue_size: int = MICRO_BATCH_MAX_QUEUE_SIZE
+    inference_max_workers: int = INFERENCE_MAX_WORKERS
+    inference_threads_per_worker: int = INFERENCE_THREADS_PER_WORKER
+    inference_max_pending: int = INFERENCE_MAX_PENDING
+    batch_max_records: int = PREDICTION_BATCH_MAX_RECORDS
+    model_warmup_batch_size: int = MODEL_WARMUP_BATCH_SIZE
+    prediction_table_enabled: bool = PREDICTION_TABLE_ENABLED
+    prediction_table_numeric_ranges: dict = field(default_factory=lambda: dict(PREDICTION_TABLE_NUMERIC_RANGES))
+    prediction_table_max_entries: int = PREDICTION_TABLE_MAX_ENTRIES
+    prediction_table_check_samples: int = PREDICTION_TABLE_CHECK_SAMPLES
\ No newline at end of file
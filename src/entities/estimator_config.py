@@ -1,12 +1,17 @@
 import sys
+from typing import TYPE_CHECKING, Tuple
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
-from sklearn.pipeline import Pipeline
 
 from src.exceptions import MyException
 from src.logging import logging
 
+if TYPE_CHECKING:
+    # Serving imports this module; sklearn is only loaded when a pickled model is
+    from sklearn.pipeline import Pipeline
+
 class TargetValueMapping:
     def __init__(self):
         self.yes:int = 0
@@ -18,7 +23,7 @@ class TargetValueMapping:
         return dict(zip(mapping_response.values(),mapping_response.keys()))
 
 class MyModel:
-    def __init__(self, preprocessing_object: Pipeline, trained_model_object: object):
+    def __init__(self, preprocessing_object: "Pipeline", trained_model_object: object):
         """
         :param preprocessing_object: Input Object of preprocesser
         :param trained_model_object: Input Object of trained model 
@@ -26,19 +31,34 @@ class MyModel:
         self.preprocessing_object = preprocessing_object
         self.trained_model_object = trained_model_object
 
+    @property
+    def accepts_raw_features(self) -> bool:
+        """
+        True when preprocessing_object is the fitted pipeline that starts from raw columns (age, gender, ...).
+        Models trained before it was introduced expect the one-hot encoded columns instead.
+        """
+        return "drop_columns" in getattr(self.preprocessing_object, "named_steps", {})
+
+
+    def limit_threads(self, n_threads: int) -> None:
+        """
+        Limits the threads the trained model predicts with (XGBoost's n_jobs)
+        """
+        if hasattr(self.trained_model_object, "set_params") and "n_jobs" in self.trained_model_object.get_params():
+            self.trained_model_object.set_params(n_jobs=n_threads)
+
+
     def predict(self, dataframe: pd.DataFrame) -> DataFrame:
         """
-        Function accepts preprocessed inputs (with all custom transformations already applied),
-        applies scaling using preprocessing_object, and performs prediction on transformed features.
+        Function accepts raw inputs (age, gender, device_type, ...), applies the fitted preprocessing
+        pipeline (imputation, one-hot encoding and scaling), and performs prediction on transformed features.
+        Models without the fitted pipeline (see accepts_raw_features) take one-hot encoded inputs.
         """
         try:
-            logging.info("Starting prediction process.")
-
             # Step 1: Apply scaling transformations using the pre-trained preprocessing object
             transformed_feature = self.preprocessing_object.transform(dataframe)
 
             # Step 2: Perform prediction using the trained model
-            logging.info("Using the trained model to get predictions")
             predictions = self.trained_model_object.predict(transformed_feature)
 
             return predictions
@@ -48,6 +68,38 @@ class MyModel:
             raise MyException(e, sys) from e
 
 
+    def predict_with_proba(self, dataframe: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores a whole batch with a single transform and a single model pass.
+        Returns the predicted labels and the probability of the positive class.
+        """
+        try:
+            transformed_feature = self.preprocessing_object.transform(dataframe)
+            probabilities = self.trained_model_object.predict_proba(transformed_feature)
+            predictions = self.trained_model_object.classes_[np.argmax(probabilities, axis=1)]
+            return predictions, probabilities[:, 1]
+
+        except Exception as e:
+            logging.error("Error occurred in predict_with_proba method", exc_info=True)
+            raise MyException(e, sys) from e
+
+
+    def predict_encoded(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores features that are already in the model's input layout (see FeatureEncoder),
+        skipping the preprocessing object. Returns the predicted labels and the probability
+        of the positive class.
+        """
+        try:
+            probabilities = self.trained_model_object.predict_proba(features)
+            predictions = self.trained_model_object.classes_[np.argmax(probabilities, axis=1)]
+            return predictions, probabilities[:, 1]
+
+        except Exception as e:
+            logging.error("Error occurred in predict_encoded method", exc_info=True)
+            raise MyException(e, sys) from e
+
+
     def __repr__(self):
         return f"{type(self.trained_model_object).__name__}()"
 
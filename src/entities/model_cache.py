@@ -0,0 +1,359 @@
+import dataclasses
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from pandas import DataFrame
+
+from src.constants import AD_INPUT_FEATURE_COLUMNS, SCHEMA_FILE_PATH
+from src.cloud.aws_handler import S3Client
+from src.entities.config_entity import AdPredictorConfig
+from src.entities.estimator_config import MyModel
+from src.entities.native_estimator import NativeModel
+from src.entities.s3_config import CloudModelEstimator
+from src.exceptions import InvalidRecordError, MyException
+from src.logging import logging
+from src.utils.feature_encoder import FeatureEncoder
+from src.utils.helpers import read_yaml_file
+from src.utils.prediction_table import PredictionTable
+
+
+@dataclass(frozen=True)
+class CachedModel:
+    model: Union[MyModel, NativeModel]
+    encoder: Optional[FeatureEncoder]
+    version: str
+    last_modified: str
+    loaded_at: float
+    warmup_seconds: float = 0.0
+    prediction_table: Optional[PredictionTable] = None
+
+
+    def predict_records(self, records: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores raw records by prediction table lookup when the model has one; records the table does not
+        cover (a missing or out-of-range number) are scored by the live model.
+        Returns: predicted labels and click probabilities for every record
+        """
+        table = self.prediction_table
+        if table is None:
+            return self.predict_live(records)
+        indices = table.index_records(records)
+        covered = indices >= 0
+        predictions, probabilities = table.lookup(np.where(covered, indices, 0))
+        if not covered.all():
+            uncovered = np.flatnonzero(~covered)
+            live_predictions, live_probabilities = self.predict_live([records[position] for position in uncovered])
+            predictions[uncovered] = live_predictions
+            probabilities[uncovered] = live_probabilities
+        return predictions, probabilities
+
+
+    def check_records(self, records: List[dict]) -> None:
+        """
+        Raises InvalidRecordError for records the model cannot score as it was trained: the native model has no
+        KNN imputer (it is not part of its sidecar), so it refuses records with a missing number rather
+        than passing NaN to the booster
+        """
+        if isinstance(self.model, NativeModel) and self.encoder.has_missing_numbers(records):
+            raise InvalidRecordError("The native production model cannot score records with a missing number "
+                             f"({', '.join(self.encoder.numeric_fields)}); serve the pickle model format for those")
+
+
+    def predict_live(self, records: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores raw records through the fast-path feature encoder, without building a DataFrame.
+        Batches with a missing number go through the model's fitted pipeline instead, so they are
+        KNN-imputed as in training; the native model refuses them (see check_records).
+        Returns: predicted labels and click probabilities for every record
+        """
+        self.check_records(records)
+        imputes_raw_features = getattr(self.model, "accepts_raw_features", False)
+        if self.encoder is not None and not (imputes_raw_features and self.encoder.has_missing_numbers(records)):
+            return self.model.predict_encoded(self.encoder.encode_records(records))
+        if imputes_raw_features:
+            return self.model.predict_with_proba(DataFrame(records, columns=AD_INPUT_FEATURE_COLUMNS))
+        raise ValueError("The production model does not support raw-record scoring")
+
+
+def build_warmup_records(encoder: Optional[FeatureEncoder], batch_size: int) -> List[dict]:
+    """
+    Returns a synthetic batch covering every category the encoder knows and a spread of ages
+    """
+    categories: Dict[str, list] = {}
+    if encoder is not None:
+        for _, field, category in encoder.one_hot_columns:
+            categories.setdefault(field, []).append(category)
+    records = []
+    for row in range(batch_size):
+        record = {field: None for field in AD_INPUT_FEATURE_COLUMNS}
+        record["age"] = 18 + (row * 7) % 60
+        for field, values in categories.items():
+            record[field] = values[row % len(values)]
+        records.append(record)
+    return records
+
+
+class ModelCache:
+    """
+    Process-wide cache of the production model.
+
+    The model is loaded once, then shared by every request. A background thread reads the
+    model registry manifest on a fixed interval and only reloads when the production version
+    changes (a promotion or a rollback); versions already in the registry's local disk cache are
+    not downloaded again. A reload builds the new model completely before swapping the
+    reference, so in-flight requests keep scoring with the model they already hold.
+
+    Before the swap the new model scores a synthetic batch through both serving paths (the
+    fast-path encoder and, for a batch with a missing age, the fitted pipeline with its
+    imputer), so the first real requests do not pay for lazy initialisation, and a model that
+    cannot score is never swapped in. Every prediction reports the version that served it.
+
+    With prediction_table_enabled, every point of the model's discrete input space is then scored
+    into a PredictionTable, which is checked against the live model on a sample before the swap;
+    requests are served by table lookup. A table that cannot be built or disagrees with the model
+    is dropped and the model is served live.
+
+    With model_format "native" the cache watches and loads the XGBoost booster and its JSON
+    sidecar instead of the pickled MyModel.
+    """
+
+    def __init__(self, prediction_pipeline_config: AdPredictorConfig = AdPredictorConfig()):
+        """
+        :param prediction_pipeline_config: Configuration holding the bucket, registry, model file and refresh interval
+        """
+        self.prediction_pipeline_config = prediction_pipeline_config
+        self.is_native = prediction_pipeline_config.model_format == "native"
+        self.estimator = self._create_estimator()
+        self._current: Optional[CachedModel] = None
+        self._reload_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+
+    def _create_estimator(self) -> CloudModelEstimator:
+        config = self.prediction_pipeline_config
+        return CloudModelEstimator(bucket_name=config.model_bucket_name,
+                                   model_path=config.native_model_file_path if self.is_native else config.model_file_path,
+                                   registry_prefix=config.registry_prefix,
+                                   cache_dir=config.registry_cache_dir)
+
+
+    def after_fork(self) -> None:
+        """
+        Prepares the cache inherited by a forked worker process: the cached model is kept (its pages are
+        shared copy-on-write with the parent), while the S3 clients, whose pooled connections the parent
+        opened, and the locks are created anew. Call it in the child before serving.
+        """
+        S3Client.s3_client = None
+        S3Client.s3_resource = None
+        self.estimator = self._create_estimator()
+        self._reload_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+
+
+    def _build_encoder(self, model: Union[MyModel, NativeModel]) -> Optional[FeatureEncoder]:
+        if isinstance(model, NativeModel):
+            return model.encoder
+        try:
+            return FeatureEncoder.from_preprocessor(model.preprocessing_object, read_yaml_file(SCHEMA_FILE_PATH))
+        except Exception:
+            logging.warning("Fast-path feature encoder unavailable for this model, using MyModel.predict",
+                            exc_info=True)
+            return None
+
+
+    def _load(self, metadata: dict) -> CachedModel:
+        if self.is_native:
+            model = self.estimator.load_native_model(self.prediction_pipeline_config.model_spec_file_path,
+                                                     version=metadata["version"])
+        else:
+            model = self.estimator.load_model(version=metadata["version"])
+        # Every inference worker thread scores with its own share of the cores
+        model.limit_threads(self.prediction_pipeline_config.inference_threads_per_worker)
+        cached_model = CachedModel(model=model,
+                                   encoder=self._build_encoder(model),
+                                   version=metadata["version"],
+                                   last_modified=metadata["last_modified"],
+                                   loaded_at=time.time())
+        cached_model = self._warm_up(cached_model)
+        if self.prediction_pipeline_config.prediction_table_enabled:
+            cached_model = self._build_prediction_table(cached_model)
+        # Single reference assignment: readers see either the old or the new model, never a partial one
+        self._current = cached_model
+        logging.info(f"Model cache loaded model version {cached_model.version} "
+                     f"(promoted {cached_model.last_modified}, warm-up {cached_model.warmup_seconds:.3f}s)")
+        return cached_model
+
+
+    def _warm_up(self, cached_model: CachedModel) -> CachedModel:
+        # Raises, leaving the current model in place, if the new model cannot score the synthetic batch
+        start = time.perf_counter()
+        records = build_warmup_records(cached_model.encoder, self.prediction_pipeline_config.model_warmup_batch_size)
+        batches = [records]
+        if getattr(cached_model.model, "accepts_raw_features", False):
+            batches.append([dict(record, age=None) for record in records[:2]])
+        for batch in batches:
+            predictions, probabilities = cached_model.predict_records(batch)
+            probabilities = np.asarray(probabilities, dtype=np.float64)
+            if len(predictions) != len(batch) or len(probabilities) != len(batch):
+                raise ValueError(f"Model version {cached_model.version} returned {len(predictions)} predictions "
+                                 f"for a warm-up batch of {len(batch)} records")
+            if not np.all(np.isfinite(probabilities)) or probabilities.min() < 0 or probabilities.max() > 1:
+                raise ValueError(f"Model version {cached_model.version} returned invalid warm-up probabilities")
+        return dataclasses.replace(cached_model, warmup_seconds=time.perf_counter() - start)
+
+
+    def _build_prediction_table(self, cached_model: CachedModel) -> CachedModel:
+        # A failure here only costs the lookup speed-up, so the model is still swapped in
+        config = self.prediction_pipeline_config
+        if cached_model.encoder is None:
+            logging.warning(f"Model version {cached_model.version} has no fast-path encoder, serving without a prediction table")
+            return cached_model
+        try:
+            table = PredictionTable.build(cached_model.encoder, cached_model.model.predict_encoded,
+                                          numeric_ranges=config.prediction_table_numeric_ranges,
+                                          max_entries=config.prediction_table_max_entries)
+            max_difference = table.verify(cached_model.predict_live, n_samples=config.prediction_table_check_samples)
+            logging.info(f"Prediction table of model version {cached_model.version} matches the live model "
+                         f"(largest probability difference {max_difference:.2e})")
+            return dataclasses.replace(cached_model, prediction_table=table)
+        except Exception:
+            logging.warning(f"Serving model version {cached_model.version} without a prediction table", exc_info=True)
+            return cached_model
+
+
+    def load(self) -> CachedModel:
+        """
+        Loads the production model into the cache, replacing any model already held
+        """
+        try:
+            with self._reload_lock:
+                return self._load(self.estimator.get_model_metadata())
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def get(self) -> CachedModel:
+        """
+        Returns the cached model together with its registry version, loading it on first use
+        """
+        try:
+            cached_model = self._current
+            if cached_model is not None:
+                return cached_model
+            with self._reload_lock:
+                if self._current is None:
+                    self._load(self.estimator.get_model_metadata())
+                return self._current
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def check_records(self, records: List[dict]) -> None:
+        """
+        Raises InvalidRecordError for records the loaded model refuses (see CachedModel.check_records), so a
+        caller can reject them before they join a micro-batch; does nothing before the first load
+        """
+        cached_model = self._current
+        if cached_model is not None:
+            cached_model.check_records(records)
+
+
+    def get_model(self) -> Union[MyModel, NativeModel]:
+        """
+        Returns the cached production model, loading it on first use
+        """
+        return self.get().model
+
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reloads the model if the production version in the registry has changed since it was cached,
+        or unconditionally with force. Returns True when a new model was swapped in.
+        """
+        try:
+            with self._reload_lock:
+                metadata = self.estimator.get_model_metadata()
+                current = self._current
+                if not force and current is not None and current.version == metadata["version"]:
+                    return False
+                self._load(metadata)
+                return True
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def get_status(self) -> dict:
+        """
+        Returns the version and load details of the model currently served, without loading it
+        """
+        current = self._current
+        refresh_thread = self._refresh_thread
+        status = {"loaded": current is not None,
+                  "background_refresh": refresh_thread is not None and refresh_thread.is_alive(),
+                  "refresh_interval_seconds": self.prediction_pipeline_config.model_refresh_interval_seconds}
+        if current is not None:
+            status.update(version=current.version, last_modified=current.last_modified,
+                          loaded_at=current.loaded_at, warmup_seconds=current.warmup_seconds)
+            table = current.prediction_table
+            status["prediction_table"] = (None if table is None else
+                                          {"entries": table.n_entries, "bytes": table.nbytes,
+                                           "build_seconds": table.build_seconds})
+        return status
+
+
+    def _refresh_loop(self) -> None:
+        interval = self.prediction_pipeline_config.model_refresh_interval_seconds
+        while not self._stop_event.wait(interval):
+            try:
+                self.refresh()
+            except Exception:
+                # Keep serving the cached model; the next tick retries
+                logging.warning("Model cache refresh failed, keeping the current model", exc_info=True)
+
+
+    def start_background_refresh(self) -> None:
+        """
+        Starts the daemon thread that polls the model registry for a new production version
+        """
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="model-cache-refresh", daemon=True)
+        self._refresh_thread.start()
+        logging.info("Model cache background refresh started")
+
+
+    def stop_background_refresh(self) -> None:
+        """
+        Stops the background refresh thread
+        """
+        self._stop_event.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join()
+            self._refresh_thread = None
+
+
+_model_caches: Dict[Tuple[str, str, str], ModelCache] = {}
+_model_caches_lock = threading.Lock()
+
+
+def get_model_cache(prediction_pipeline_config: AdPredictorConfig = AdPredictorConfig()) -> ModelCache:
+    """
+    Returns the process-wide cache for the configured bucket and model key, creating it on first use
+    """
+    key = (prediction_pipeline_config.model_bucket_name, prediction_pipeline_config.model_file_path,
+           prediction_pipeline_config.model_format)
+    model_cache = _model_caches.get(key)
+    if model_cache is None:
+        with _model_caches_lock:
+            model_cache = _model_caches.get(key)
+            if model_cache is None:
+                model_cache = ModelCache(prediction_pipeline_config=prediction_pipeline_config)
+                _model_caches[key] = model_cache
+    return model_cache
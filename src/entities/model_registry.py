@@ -0,0 +1,363 @@
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from src.cloud.aws_storage import SimpleStorageService
+from src.cloud.s3_transfer import DOWNLOAD_PART_SUFFIX, DOWNLOAD_STATE_SUFFIX
+from src.constants import (MODEL_PUSHER_S3_KEY, MODEL_REGISTRY_CACHE_DIR, MODEL_REGISTRY_CACHE_MAX_VERSIONS,
+                           MODEL_REGISTRY_HISTORY_SIZE, MODEL_REGISTRY_LEGACY_FILE_NAMES, MODEL_REGISTRY_MANIFEST_NAME,
+                           MODEL_REGISTRY_VERSION_INFO_NAME, MODEL_REGISTRY_VERSIONS_DIR)
+from src.exceptions import MyException
+from src.logging import logging
+from src.utils.helpers import hash_file
+
+MANIFEST_UPDATE_ATTEMPTS = 5
+CACHE_LOCK_FILE_NAME = "cache.lock"
+
+
+def _write_json_atomically(file_path: str, content: dict) -> None:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(content, file, indent=4)
+    os.replace(tmp_path, file_path)
+
+
+class ModelRegistry:
+    """
+    Versioned model registry in an S3 bucket, with a local content-addressed cache of the versions.
+
+    Layout under the registry prefix:
+        versions/<version>/<file>        model files of a version, never overwritten
+        versions/<version>/version.json  sha256 and size of each file plus metadata; written last, so a
+                                         version without it is incomplete and cannot be promoted
+        manifest.json                    the production version and the versions it replaced
+
+    Promotion and rollback rewrite only the manifest, with a conditional PUT on its ETag: the switch
+    is a single atomic write, and two concurrent promotions cannot silently overwrite each other (the
+    loser re-reads the manifest and applies its change again).
+
+    Fetched files are stored under the sha256 of their content in the local cache directory, so a
+    restart or a rollback to a recently used version loads from disk without downloading anything;
+    the least recently used versions beyond max_cached_versions are evicted. The cache directory can be
+    shared by several processes (the serve.py workers): fetches and evictions hold a lock file, and each
+    download goes to a file of its own before it is renamed into place.
+    """
+
+    def __init__(self, bucket_name: str, registry_prefix: str = MODEL_PUSHER_S3_KEY,
+                 cache_dir: str = MODEL_REGISTRY_CACHE_DIR,
+                 max_cached_versions: int = MODEL_REGISTRY_CACHE_MAX_VERSIONS,
+                 s3: SimpleStorageService = None):
+        """
+        :param bucket_name: Name of the model bucket
+        :param registry_prefix: Key prefix of the registry in the bucket
+        :param cache_dir: Local directory of the content-addressed model cache
+        :param max_cached_versions: Number of most recently used versions kept in the local cache
+        :param s3: Storage service to use, created if not given
+        """
+        self.bucket_name = bucket_name
+        self.registry_prefix = registry_prefix.rstrip("/")
+        self.cache_dir = cache_dir
+        self.max_cached_versions = max_cached_versions
+        self.s3 = s3 or SimpleStorageService()
+        self.manifest_key = f"{self.registry_prefix}/{MODEL_REGISTRY_MANIFEST_NAME}"
+
+
+    def version_key(self, version: str, file_name: str) -> str:
+        """
+        Returns the S3 key of a file of a version
+        """
+        return f"{self.registry_prefix}/{MODEL_REGISTRY_VERSIONS_DIR}/{version}/{file_name}"
+
+
+    def _version_info_path(self, version: str) -> str:
+        return os.path.join(self.cache_dir, MODEL_REGISTRY_VERSIONS_DIR, f"{version}.json")
+
+
+    def _object_path(self, sha256: str, file_name: str) -> str:
+        return os.path.join(self.cache_dir, "objects", sha256[:2], sha256 + os.path.splitext(file_name)[1])
+
+
+    #Versions
+    def publish_version(self, files: Dict[str, str], metadata: dict = None) -> str:
+        """
+        Uploads the files as a new immutable version; the version is not promoted
+        :param files: File name in the version -> local path
+        :param metadata: JSON-serialisable details recorded with the version, e.g. its scores
+        :return: The version id
+        """
+        try:
+            hashes = {name: {"sha256": hash_file(path), "size": os.path.getsize(path)}
+                      for name, path in files.items()}
+            digest = hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()
+            created_at = datetime.now(timezone.utc)
+            version = f"{created_at:%Y%m%dT%H%M%SZ}-{digest[:12]}"
+
+            for name, path in files.items():
+                self.s3.upload_file(path, to_filename=self.version_key(version, name),
+                                    bucket_name=self.bucket_name, remove=False)
+            info = {"version": version, "created_at": created_at.isoformat(), "files": hashes,
+                    "metadata": metadata or {}}
+            # IfNoneMatch: an existing version is never replaced
+            self.s3.s3_client.put_object(Bucket=self.bucket_name,
+                                         Key=self.version_key(version, MODEL_REGISTRY_VERSION_INFO_NAME),
+                                         Body=json.dumps(info, indent=4).encode(), ContentType="application/json",
+                                         IfNoneMatch="*")
+            self.s3.metadata_cache.invalidate(self.bucket_name, self.version_key(version, MODEL_REGISTRY_VERSION_INFO_NAME))
+            logging.info(f"Published model version {version} to s3://{self.bucket_name}/{self.registry_prefix}")
+            return version
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def version_exists(self, version: str) -> bool:
+        """
+        Returns True if the version was completely published
+        """
+        return self.s3.s3_key_path_available(self.bucket_name, self.version_key(version, MODEL_REGISTRY_VERSION_INFO_NAME))
+
+
+    def get_version_info(self, version: str) -> dict:
+        """
+        Returns the version.json of a version; versions are immutable, so it is read from the local cache when there
+        """
+        try:
+            info_path = self._version_info_path(version)
+            if os.path.exists(info_path):
+                with open(info_path, "r") as info_file:
+                    return json.load(info_file)
+            info_key = self.version_key(version, MODEL_REGISTRY_VERSION_INFO_NAME)
+            info = json.loads(self.s3.read_object(self.s3.get_file_object(info_key, self.bucket_name)))
+            _write_json_atomically(info_path, info)
+            return info
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def list_versions(self) -> List[str]:
+        """
+        Returns the ids of all completely published versions, oldest first
+        """
+        try:
+            prefix = f"{self.registry_prefix}/{MODEL_REGISTRY_VERSIONS_DIR}/"
+            return sorted(item["key"][len(prefix):].split("/")[0]
+                          for item in self.s3.iter_objects(self.bucket_name, prefix=prefix)
+                          if item["key"].endswith(f"/{MODEL_REGISTRY_VERSION_INFO_NAME}"))
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    #Manifest
+    def get_manifest(self) -> Tuple[Optional[dict], Optional[str]]:
+        """
+        Returns the manifest and its ETag, or (None, None) before the first promotion
+        """
+        try:
+            response = self.s3.s3_client.get_object(Bucket=self.bucket_name, Key=self.manifest_key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None, None
+            raise MyException(e, sys) from e
+        return json.loads(response["Body"].read()), response["ETag"]
+
+
+    def get_production_version(self) -> Optional[str]:
+        """
+        Returns the version the manifest points at, or None if nothing was promoted yet
+        """
+        manifest, _ = self.get_manifest()
+        return manifest["production"] if manifest else None
+
+
+    def _update_manifest(self, change: Callable[[dict], dict]) -> dict:
+        # Read-modify-write with a conditional PUT; a concurrent update makes the PUT fail and the change is
+        # applied again to the newer manifest
+        for attempt in range(1, MANIFEST_UPDATE_ATTEMPTS + 1):
+            manifest, etag = self.get_manifest()
+            updated = change(manifest or {"production": None, "history": []})
+            updated["updated_at"] = datetime.now(timezone.utc).isoformat()
+            condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+            try:
+                self.s3.s3_client.put_object(Bucket=self.bucket_name, Key=self.manifest_key,
+                                             Body=json.dumps(updated, indent=4).encode(),
+                                             ContentType="application/json", **condition)
+                self.s3.metadata_cache.invalidate(self.bucket_name, self.manifest_key)
+                return updated
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in ("PreconditionFailed", "ConditionalRequestConflict"):
+                    raise
+                logging.info(f"Model registry manifest changed concurrently (attempt {attempt}), retrying")
+        raise RuntimeError(f"Could not update {self.manifest_key} after {MANIFEST_UPDATE_ATTEMPTS} attempts")
+
+
+    def promote(self, version: str) -> dict:
+        """
+        Points the manifest at the version; the replaced production version goes to the top of the history
+        :return: The new manifest
+        """
+        try:
+            if not self.version_exists(version):
+                raise ValueError(f"Model version {version} does not exist or was not completely published")
+
+            def change(manifest: dict) -> dict:
+                if manifest["production"] == version:
+                    return manifest
+                history = ([manifest["production"]] if manifest["production"] else []) + manifest["history"]
+                return {"production": version,
+                        "history": [v for v in history if v != version][:MODEL_REGISTRY_HISTORY_SIZE]}
+
+            manifest = self._update_manifest(change)
+            logging.info(f"Promoted model version {version} to production")
+            return manifest
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def rollback(self, to_version: str = None) -> dict:
+        """
+        Points the manifest back at the previous production version, or at to_version. The version rolled
+        back from is dropped from the history, so repeated rollbacks keep walking back.
+        :return: The new manifest
+        """
+        try:
+            if to_version is not None and not self.version_exists(to_version):
+                raise ValueError(f"Model version {to_version} does not exist or was not completely published")
+
+            def change(manifest: dict) -> dict:
+                target = to_version or (manifest["history"][0] if manifest["history"] else None)
+                if target is None:
+                    raise ValueError("There is no earlier model version to roll back to")
+                return {"production": target, "history": [v for v in manifest["history"] if v != target]}
+
+            manifest = self._update_manifest(change)
+            logging.info(f"Rolled back production model to version {manifest['production']}")
+            return manifest
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def bootstrap_from_legacy(self, legacy_file_names: List[str] = None) -> Optional[str]:
+        """
+        One-time migration of a model pushed before the registry existed: when nothing was promoted yet and
+        the legacy model file is at the bucket root, it is published (with whichever of the other legacy
+        files exist) as the first version and promoted
+        :param legacy_file_names: Keys of the legacy files in the bucket root; the first one is required
+        :return: The production version afterwards, or None if there is neither a manifest nor a legacy model
+        """
+        try:
+            production_version = self.get_production_version()
+            legacy_file_names = legacy_file_names or MODEL_REGISTRY_LEGACY_FILE_NAMES
+            if production_version is not None or not self.s3.s3_key_path_available(self.bucket_name,
+                                                                                   legacy_file_names[0]):
+                return production_version
+
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                files = {}
+                for name in legacy_file_names:
+                    if name == legacy_file_names[0] or self.s3.s3_key_path_available(self.bucket_name, name):
+                        files[name] = self.s3.download_file(name, self.bucket_name, os.path.join(tmp_dir, name))
+                version = self.publish_version(files, metadata={"migrated_from": "bucket root"})
+
+            def change(manifest: dict) -> dict:
+                # Another process may have migrated (or pushed) first: its version stays in production
+                return manifest if manifest["production"] else {"production": version, "history": []}
+
+            manifest = self._update_manifest(change)
+            logging.info(f"Migrated the model at s3://{self.bucket_name}/{legacy_file_names[0]} to the model "
+                         f"registry; production version is {manifest['production']}")
+            return manifest["production"]
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    #Local cache
+    @contextmanager
+    def _cache_lock(self):
+        # Serialises fetches and evictions across the processes sharing the cache directory, so an eviction
+        # never removes a file another process is about to return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, CACHE_LOCK_FILE_NAME), "a+") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+    def _download_object(self, version: str, name: str, sha256: str, object_path: str) -> None:
+        # Downloads to a name of this process's own, so concurrent downloads never share part or state files
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        fd, download_path = tempfile.mkstemp(dir=os.path.dirname(object_path),
+                                             prefix=f"{os.path.basename(object_path)}.", suffix=".download")
+        os.close(fd)
+        try:
+            self.s3.download_file(self.version_key(version, name), self.bucket_name, download_path)
+            if hash_file(download_path) != sha256:
+                raise ValueError(f"Checksum mismatch for {name} of model version {version}")
+            if not os.path.exists(object_path):
+                os.replace(download_path, object_path)
+        finally:
+            # Also covers the object having appeared meanwhile: it has the same content, so that is a success
+            for leftover_path in (download_path, f"{download_path}{DOWNLOAD_PART_SUFFIX}",
+                                  f"{download_path}{DOWNLOAD_STATE_SUFFIX}"):
+                if os.path.exists(leftover_path):
+                    os.remove(leftover_path)
+
+
+    def fetch_version(self, version: str) -> Dict[str, str]:
+        """
+        Makes every file of the version available in the local cache, downloading only the missing ones
+        :return: File name in the version -> local path
+        """
+        try:
+            with self._cache_lock():
+                info = self.get_version_info(version)
+                local_paths = {}
+                for name, file_info in info["files"].items():
+                    object_path = self._object_path(file_info["sha256"], name)
+                    if not os.path.exists(object_path):
+                        self._download_object(version, name, file_info["sha256"], object_path)
+                    local_paths[name] = object_path
+
+                # The info file's mtime records when the version was last used
+                os.utime(self._version_info_path(version))
+                self._evict()
+            return local_paths
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def _evict(self) -> None:
+        versions_dir = os.path.join(self.cache_dir, MODEL_REGISTRY_VERSIONS_DIR)
+        info_paths = sorted((os.path.join(versions_dir, name) for name in os.listdir(versions_dir)
+                             if name.endswith(".json")), key=os.path.getmtime, reverse=True)
+        if len(info_paths) <= self.max_cached_versions:
+            return
+        kept = set()
+        for info_path in info_paths[:self.max_cached_versions]:
+            with open(info_path, "r") as info_file:
+                kept.update(self._object_path(file_info["sha256"], name)
+                            for name, file_info in json.load(info_file)["files"].items())
+        for info_path in info_paths[self.max_cached_versions:]:
+            with open(info_path, "r") as info_file:
+                files = json.load(info_file)["files"]
+            for name, file_info in files.items():
+                object_path = self._object_path(file_info["sha256"], name)
+                if object_path not in kept and os.path.exists(object_path):
+                    os.remove(object_path)
+            os.remove(info_path)
+            logging.info(f"Evicted model version {os.path.basename(info_path)[:-5]} from the local model cache")
@@ -0,0 +1,119 @@
+import json
+import sys
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import numpy as np
+
+from src.exceptions import MyException
+from src.utils.feature_encoder import FeatureEncoder
+
+if TYPE_CHECKING:
+    import xgboost as xgb
+
+
+class NativeModel:
+    """
+    Predict-only model rebuilt from the XGBoost native booster file and its JSON sidecar.
+
+    Loading needs neither pickle nor sklearn: the booster is read with XGBoost's own loader and the
+    preprocessing is replaced by the FeatureEncoder described in the sidecar. Exposes the same
+    prediction methods as MyModel.
+    """
+
+    def __init__(self, booster: "xgb.Booster", encoder: FeatureEncoder, classes: np.ndarray,
+                 best_iteration: Optional[int] = None):
+        """
+        :param booster: Trained XGBoost booster
+        :param encoder: Encoder producing the booster's input matrix
+        :param classes: Class labels, in predict_proba column order
+        :param best_iteration: Last boosting round to use when early stopping was applied
+        """
+        self.booster = booster
+        self.encoder = encoder
+        self.classes_ = classes
+        self.iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+
+
+    @classmethod
+    def from_bytes(cls, model_bytes: bytes, spec: dict) -> "NativeModel":
+        """
+        Builds the model from the raw booster bytes and the parsed sidecar
+        """
+        try:
+            # Imported on first load, so serving starts without XGBoost (and the sklearn it pulls in)
+            import xgboost as xgb
+            booster = xgb.Booster()
+            booster.load_model(model_bytes if isinstance(model_bytes, bytearray) else bytearray(model_bytes))
+            return cls(booster=booster,
+                       encoder=FeatureEncoder.from_dict(spec["encoder"]),
+                       classes=np.asarray(spec["classes"]),
+                       best_iteration=spec.get("best_iteration"))
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    @classmethod
+    def from_files(cls, model_file_path: str, spec_file_path: str) -> "NativeModel":
+        """
+        Builds the model from a local booster file and sidecar
+        """
+        try:
+            with open(model_file_path, "rb") as model_file:
+                model_bytes = model_file.read()
+            with open(spec_file_path, "r") as spec_file:
+                spec = json.load(spec_file)
+            return cls.from_bytes(model_bytes, spec)
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def limit_threads(self, n_threads: int) -> None:
+        """
+        Limits the threads the booster predicts with
+        """
+        self.booster.set_param("nthread", n_threads)
+
+
+    def predict_encoded(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores features already in the model's input layout.
+        Returns the predicted labels and the probability of the positive class.
+        """
+        try:
+            positive_probabilities = self.booster.inplace_predict(features, iteration_range=self.iteration_range)
+            probabilities = np.vstack((1 - positive_probabilities, positive_probabilities)).T
+            predictions = self.classes_[np.argmax(probabilities, axis=1)]
+            return predictions, probabilities[:, 1]
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def predict_records(self, records: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores raw feature records (age, gender, device_type, ...)
+        """
+        return self.predict_encoded(self.encoder.encode_records(records))
+
+
+    def predict_with_proba(self, dataframe) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores a frame of raw features, like MyModel.predict_with_proba.
+        Missing numbers are passed to the booster as NaN, where MyModel KNN-imputes them: the imputer is not
+        part of the sidecar, so only rows with every number present score as MyModel does. Serving refuses
+        the others (CachedModel.check_records).
+        """
+        return self.predict_records(dataframe.to_dict(orient="records"))
+
+
+    def predict(self, dataframe) -> np.ndarray:
+        """
+        Returns the predicted labels for a frame of raw features
+        """
+        return self.predict_with_proba(dataframe)[0]
+
+
+    def __repr__(self):
+        return "NativeModel()"
+
+    def __str__(self):
+        return "NativeModel()"
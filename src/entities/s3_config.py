@@ -1,54 +1,96 @@
 from src.cloud.aws_storage import SimpleStorageService
+from src.constants import MODEL_PUSHER_S3_KEY, MODEL_REGISTRY_CACHE_DIR
 from src.exceptions import MyException
+from src.logging import logging
 from src.entities.estimator_config import MyModel
+from src.entities.model_registry import ModelRegistry
+from src.entities.native_estimator import NativeModel
+from src.utils.helpers import load_object
 import sys
 from pandas import DataFrame
 
 
 class CloudModelEstimator:
     """
-    This class is used to save and retrieve our model from s3 bucket and to do prediction
+    This class is used to retrieve the production model from the model registry in the s3 bucket and to do prediction.
+    Model files are served from the registry's local disk cache, so only versions not seen before are downloaded.
     """
 
-    def __init__(self,bucket_name,model_path,):
+    def __init__(self,bucket_name,model_path,registry_prefix:str=MODEL_PUSHER_S3_KEY,
+                 cache_dir:str=MODEL_REGISTRY_CACHE_DIR):
         """
         :param bucket_name: Name of your model bucket
-        :param model_path: Location of your model in bucket
+        :param model_path: Name of the model file within a registry version
+        :param registry_prefix: Key prefix of the model registry in bucket
+        :param cache_dir: Local directory of the registry's model cache
         """
         self.bucket_name = bucket_name
         self.s3 = SimpleStorageService()
+        self.registry = ModelRegistry(bucket_name=bucket_name, registry_prefix=registry_prefix,
+                                      cache_dir=cache_dir, s3=self.s3)
         self.model_path = model_path
         self.loaded_model:MyModel=None
 
 
+    def get_production_version(self):
+        """
+        Get the production version, migrating a model pushed to the bucket root before the registry existed
+        :return: version id, or None if no model was pushed yet
+        """
+        return self.registry.bootstrap_from_legacy()
+
     def is_model_present(self,model_path):
         try:
-            return self.s3.s3_key_path_available(bucket_name=self.bucket_name, s3_key=model_path)
+            version = self.get_production_version()
+            return version is not None and model_path in self.registry.get_version_info(version)["files"]
         except MyException as e:
             print(e)
             return False
 
-    def load_model(self,)->MyModel:
+    def _fetch(self,version:str=None)->dict:
+        version = version or self.get_production_version()
+        if version is None:
+            raise FileNotFoundError(f"No model version has been promoted in s3://{self.bucket_name}/{self.registry.registry_prefix}")
+        return self.registry.fetch_version(version)
+
+    def load_model(self,version:str=None)->MyModel:
         """
-        Load the model from the model_path
-        :return:
+        Load the model from the model_path of a registry version
+        :param version: Registry version to load, the production version by default
+        :return: MyModel
         """
+        try:
+            model = load_object(self._fetch(version)[self.model_path])
+            logging.info("Production model loaded from the model registry.")
+            return model
+        except Exception as e:
+            raise MyException(e, sys)
 
-        return self.s3.load_model(self.model_path,bucket_name=self.bucket_name)
+    def load_native_model(self,spec_path,version:str=None)->NativeModel:
+        """
+        Load the predict-only model from the native booster at model_path and its JSON sidecar
+        :param spec_path: Name of the model spec sidecar within a registry version
+        :param version: Registry version to load, the production version by default
+        :return: NativeModel
+        """
+        try:
+            local_paths = self._fetch(version)
+            return NativeModel.from_files(local_paths[self.model_path], local_paths[spec_path])
+        except Exception as e:
+            raise MyException(e, sys)
 
-    def save_model(self,from_file,remove:bool=False)->None:
+    def get_model_metadata(self)->dict:
         """
-        Save the model to the model_path
-        :param from_file: Your local system model path
-        :param remove: By default it is false that mean you will have your model locally available in your system folder
-        :return:
+        Get the production version and the time it was promoted, without downloading the model
+        :return: metadata dictionary
         """
         try:
-            self.s3.upload_file(from_file,
-                                to_filename=self.model_path,
-                                bucket_name=self.bucket_name,
-                                remove=remove
-                                )
+            manifest, _ = self.registry.get_manifest()
+            if manifest is None and self.get_production_version() is not None:
+                manifest, _ = self.registry.get_manifest()
+            if manifest is None:
+                raise FileNotFoundError(f"No model version has been promoted in s3://{self.bucket_name}/{self.registry.registry_prefix}")
+            return {"version": manifest["production"], "last_modified": manifest["updated_at"]}
         except Exception as e:
             raise MyException(e, sys)
 
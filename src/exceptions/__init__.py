@@ -19,8 +19,9 @@ def error_message_detail(error: Exception, error_detail: sys) -> str:
     line_number = exc_tb.tb_lineno
     error_message = f"Error occurred in python script: [{file_name}] at line number [{line_number}]: {str(error)}"
     
-    # Log the error for better tracking
-    logging.error(error_message)
+    # Log the error for better tracking, once: re-wrapping an already logged MyException does not log it again
+    if not isinstance(error, MyException):
+        logging.error(error_message)
     
     return error_message
 
@@ -45,4 +46,32 @@ class MyException(Exception):
         """
         Returns the string representation of the error message.
         """
-        return self.error_message
\ No newline at end of file
+        return self.error_message
+
+class InferenceOverloadedError(Exception):
+    """
+    Raised instead of queueing more inference work when the serving queue is full.
+    """
+    def __init__(self, retry_after_seconds: int):
+        """
+        :param retry_after_seconds: How long the client should wait before retrying.
+        """
+        super().__init__(f"Inference queue is full, retry in {retry_after_seconds}s")
+        self.retry_after_seconds = retry_after_seconds
+
+class InvalidRecordError(ValueError):
+    """
+    Raised for a prediction request whose records cannot be scored: a feature is missing, a number does
+    not parse, or the body is not valid JSON. The request gets 400, unlike failures on the server side.
+    """
+
+class BatchTooLargeError(InvalidRecordError):
+    """
+    Raised for a batch prediction request with more records than one request may hold. The request gets 413.
+    """
+    def __init__(self, max_records: int):
+        """
+        :param max_records: Largest number of records a request may hold.
+        """
+        super().__init__(f"Batch holds more than {max_records} records; split it into smaller requests")
+        self.max_records = max_records
@@ -1,44 +1,238 @@
+import atexit
+import copy
+import itertools
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
 from from_root import from_root
 from datetime import datetime
 
+from src.constants import (LOG_ASYNC, LOG_FORMAT, LOG_HOT_PATH_SAMPLE_RATE, LOG_LEVEL, LOG_MODULE_LEVELS,
+                           LOG_QUEUE_SIZE)
+
 # Constants for log configuration
 LOG_DIR = 'logs'
 LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
 MAX_LOG_SIZE = 5 * 1024 * 1024  # 5 MB
 BACKUP_COUNT = 3  # Number of backup log files to keep
 
-# Construct log file path
+# Construct log file path; the directory and the file are created when the first record is written
 log_dir_path = os.path.join(from_root(), LOG_DIR)
-os.makedirs(log_dir_path, exist_ok=True)
 log_file_path = os.path.join(log_dir_path, LOG_FILE)
 
+# Attributes every LogRecord has; anything else on a record came from `extra=` and goes into the JSON output
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+# Project modules log to the root logger; their dotted names are derived from their path under the project root
+project_root_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_module_names: Dict[str, str] = {}
+
+
+def get_module_name(record: logging.LogRecord) -> str:
+    """
+    Dotted name of the module a record comes from: the logger name for named loggers (botocore, uvicorn, ...)
+    and the module path for the root logger, which this project logs to
+    """
+    if record.name != "root":
+        return record.name
+    module_name = _module_names.get(record.pathname)
+    if module_name is None:
+        path = os.path.splitext(record.pathname)[0]
+        if path.startswith(project_root_path + os.sep):
+            path = path[len(project_root_path) + 1:]
+        module_name = _module_names[record.pathname] = path.replace(os.sep, ".")
+    return module_name
+
+
+def parse_module_levels(value: str) -> Dict[str, str]:
+    """
+    Parses "module=LEVEL,module=LEVEL" (the LOG_MODULE_LEVELS environment variable)
+    """
+    return {module.strip(): level.strip().upper()
+            for module, _, level in (item.partition("=") for item in value.split(",") if "=" in item)}
+
+
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """
+    Rotating file handler that creates its log directory and file on the first record instead of at import.
+    """
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class ModuleLevelFilter(logging.Filter):
+    """
+    Drops records below the level configured for their module (longest matching module prefix),
+    or below the default level when no prefix matches.
+    """
+    def __init__(self, default_level: int, module_levels: Dict[str, str]):
+        super().__init__()
+        self.default_level = default_level
+        self.module_levels = {module: logging.getLevelName(level) for module, level in module_levels.items()}
+        self._levels: Dict[str, int] = {}
+
+    def get_level(self, module_name: str) -> int:
+        level = self._levels.get(module_name)
+        if level is None:
+            prefixes = [module for module in self.module_levels
+                        if module_name == module or module_name.startswith(module + ".")]
+            level = self.module_levels[max(prefixes, key=len)] if prefixes else self.default_level
+            self._levels[module_name] = level
+        return level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.get_level(get_module_name(record))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line, with any `extra=` fields as keys.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "module": get_module_name(record),
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        payload.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(payload, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the background log writer. It never waits: when the bounded queue is full
+    the record is dropped and counted instead.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the arguments here; formatting happens on the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogSampler:
+    """
+    Logs one in every `rate` messages, for debug messages on the request hot path.
+    """
+    def __init__(self, rate: Optional[int] = None):
+        self.rate = max(1, rate or int(os.getenv("LOG_HOT_PATH_SAMPLE_RATE", LOG_HOT_PATH_SAMPLE_RATE)))
+        self._calls = itertools.count()
+
+    def log(self, level: int, message: str, *args, **kwargs) -> None:
+        logger = logging.getLogger()
+        if logger.isEnabledFor(level) and next(self._calls) % self.rate == 0:
+            kwargs.setdefault("extra", {})["sample_rate"] = self.rate
+            logger.log(level, message, *args, stacklevel=kwargs.pop("stacklevel", 1) + 1, **kwargs)
+
+    def debug(self, message: str, *args, **kwargs) -> None:
+        self.log(logging.DEBUG, message, *args, stacklevel=2, **kwargs)
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def start_log_listener(new_queue: bool = False) -> None:
+    """
+    Starts the background thread that writes queued records; `new_queue` gives a forked child its own queue
+    """
+    if _listener is None or _listener._thread is not None:
+        return
+    if new_queue:
+        _queue_handler.queue = _listener.queue = queue.Queue(_queue_handler.queue.maxsize)
+    _listener.start()
+
+
+def stop_log_listener() -> None:
+    """
+    Writes every queued record and stops the background thread (at exit, and around forks)
+    """
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
 def configure_logger():
     """
-    Configures logging with a rotating file handler and a console handler.
+    Configures logging with a rotating file handler and a console handler, with per-module levels.
+    With LOG_ASYNC the handlers write on a background thread fed by a queue, so logging calls never wait on I/O.
     """
-    # Create a custom logger
+    global _listener, _queue_handler
+    level = logging.getLevelName(os.getenv("LOG_LEVEL", LOG_LEVEL).upper())
+    module_levels = dict(LOG_MODULE_LEVELS)
+    module_levels.update(parse_module_levels(os.getenv("LOG_MODULE_LEVELS", "")))
+    log_format = os.getenv("LOG_FORMAT", LOG_FORMAT).lower()
+    use_queue = os.getenv("LOG_ASYNC", str(LOG_ASYNC)).lower() in ("1", "true", "yes")
+
+    # Create a custom logger; it lets through the most verbose configured level and the filter does the rest
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
-    
+    logger.setLevel(min([level, *(logging.getLevelName(module_level) for module_level in module_levels.values())]))
+    # Named loggers (botocore, uvicorn, ...) skip building records below their level altogether
+    for module, module_level in module_levels.items():
+        if not module.startswith("src."):
+            logging.getLogger(module).setLevel(module_level)
+    module_filter = ModuleLevelFilter(level, module_levels)
+
     # Define formatter
-    formatter = logging.Formatter("[ %(asctime)s ] %(name)s - %(levelname)s - %(message)s")
+    if log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("[ %(asctime)s ] %(name)s - %(levelname)s - %(message)s")
 
     # File handler with rotation
-    file_handler = RotatingFileHandler(log_file_path, maxBytes=MAX_LOG_SIZE, backupCount=BACKUP_COUNT)
+    file_handler = LazyRotatingFileHandler(log_file_path, maxBytes=MAX_LOG_SIZE, backupCount=BACKUP_COUNT)
     file_handler.setFormatter(formatter)
     file_handler.setLevel(logging.DEBUG)
-    
+
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
     console_handler.setLevel(logging.INFO)
-    
-    # Add handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+
+    # Add handlers to the logger, or to the background writer behind a queue
+    if use_queue:
+        _queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _queue_handler.addFilter(module_filter)
+        _listener = QueueListener(_queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+        logger.addHandler(_queue_handler)
+        start_log_listener()
+        atexit.register(stop_log_listener)
+        # The writer thread does not survive a fork (serve.py): drain it before, restart it on both sides
+        os.register_at_fork(before=stop_log_listener, after_in_parent=start_log_listener,
+                            after_in_child=lambda: start_log_listener(new_queue=True))
+    else:
+        for handler in (file_handler, console_handler):
+            handler.addFilter(module_filter)
+            logger.addHandler(handler)
 
 # Configure the logger
-configure_logger()
\ No newline at end of file
+configure_logger()
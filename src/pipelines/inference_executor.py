@@ -0,0 +1,118 @@
+import asyncio
+import functools
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from src.exceptions import InferenceOverloadedError, MyException
+from src.logging import logging
+
+
+class InferenceExecutor:
+    """
+    Runs blocking model calls on a dedicated, bounded thread pool, so the event loop keeps accepting
+    and answering requests while a batch is scored.
+
+    XGBoost, numpy and the BLAS libraries release the GIL while they compute, so max_workers batches
+    are scored in parallel. Each of them is limited to threads_per_worker native threads (the model's
+    nthread and the BLAS/OpenMP pools), so the pool as a whole does not oversubscribe the cores.
+
+    At most max_pending calls are running or queued. Past that, run raises InferenceOverloadedError
+    with a Retry-After estimate instead of queueing more work, so an overloaded worker sheds load
+    rather than letting every request time out.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, threads_per_worker: int):
+        """
+        :param max_workers: Number of threads scoring at the same time
+        :param max_pending: Maximum number of running and queued calls
+        :param threads_per_worker: Native threads each scoring call may use
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.threads_per_worker = threads_per_worker
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread_limits = None
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._mean_service_seconds = 0.0
+
+
+    def start(self) -> None:
+        """
+        Creates the thread pool and limits the BLAS and OpenMP thread pools of the process
+        """
+        if self._executor is not None:
+            return
+        from threadpoolctl import threadpool_limits
+
+        self._thread_limits = threadpool_limits(limits=self.threads_per_worker)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        logging.info(f"Inference executor started (max_workers={self.max_workers}, max_pending={self.max_pending}, "
+                     f"threads_per_worker={self.threads_per_worker})")
+
+
+    def stop(self) -> None:
+        """
+        Shuts the thread pool down; queued calls are cancelled, running ones finish
+        """
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._thread_limits.restore_original_limits()
+        self._thread_limits = None
+
+
+    def retry_after_seconds(self) -> int:
+        """
+        Estimates how long the calls already pending take to drain, in whole seconds (at least 1)
+        """
+        return max(1, math.ceil(self._pending * self._mean_service_seconds / self.max_workers))
+
+
+    def _timed_call(self, func: Callable, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            # Exponentially weighted, so the Retry-After estimate follows the current batch sizes
+            self._mean_service_seconds += 0.1 * (time.perf_counter() - start - self._mean_service_seconds)
+
+
+    async def run(self, func: Callable, *args):
+        """
+        Runs func(*args) on the pool and waits for its result.
+        Raises InferenceOverloadedError at once if max_pending calls are already running or queued.
+        """
+        if self._executor is None:
+            raise MyException("Inference executor is not running", sys)
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise InferenceOverloadedError(self.retry_after_seconds())
+        self._pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(self._timed_call, func, *args))
+            self._completed += 1
+            return result
+        finally:
+            self._pending -= 1
+
+
+    def get_metrics(self) -> dict:
+        """
+        Returns the pool size, the pending calls and the completed and rejected counts
+        """
+        return {
+            "max_workers": self.max_workers,
+            "threads_per_worker": self.threads_per_worker,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "mean_service_ms": self._mean_service_seconds * 1000,
+        }
@@ -0,0 +1,196 @@
+import asyncio
+import sys
+from collections import Counter
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from src.exceptions import InferenceOverloadedError, MyException
+from src.logging import logging
+from src.pipelines.inference_executor import InferenceExecutor
+
+
+class BatchedPrediction(NamedTuple):
+    prediction: object
+    probability: float
+    model_version: str
+
+
+class MicroBatcher:
+    """
+    Collects single-row prediction requests from concurrent handlers and scores them as one matrix.
+
+    A batch is closed when it reaches max_batch_size rows or when max_wait_ms has passed since
+    its first row arrived, whichever comes first. Each caller awaits a future that resolves to
+    the prediction for its own row, with the version of the model that scored the batch. When a
+    batch fails, its rows are scored again one at a time, so a bad row only fails its own caller.
+
+    With an executor, batches are scored on its thread pool, up to one batch per pool thread at a
+    time, and rows keep queueing (into larger batches) meanwhile. Rows beyond max_queue_size are
+    rejected with InferenceOverloadedError. Without one, batches are scored on the event loop.
+    """
+
+    def __init__(self, score_batch: Callable[[List[dict]], Tuple[np.ndarray, np.ndarray, str]],
+                 max_batch_size: int, max_wait_ms: float, executor: Optional[InferenceExecutor] = None,
+                 max_queue_size: Optional[int] = None):
+        """
+        :param score_batch: Callable returning (predictions, probabilities, model version) for a list of records
+        :param max_batch_size: Maximum number of rows scored together
+        :param max_wait_ms: Maximum time the first row of a batch waits for more rows
+        :param executor: Thread pool the batches are scored on
+        :param max_queue_size: Maximum number of rows waiting for a batch
+        """
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000.0
+        self.executor = executor
+        self.max_queue_size = max_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batch_slots: Optional[asyncio.Semaphore] = None
+        self._scoring_tasks: set = set()
+        self._batch_size_counts: Counter = Counter()
+        self._batches_scored = 0
+        self._rows_scored = 0
+        self._last_batch_size = 0
+        self._rejected = 0
+
+
+    async def start(self) -> None:
+        """
+        Starts the batching task on the running event loop
+        """
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._batch_slots = asyncio.Semaphore(self.executor.max_workers if self.executor is not None else 1)
+        self._worker = asyncio.create_task(self._run(), name="micro-batcher")
+        logging.info(f"Micro-batcher started (max_batch_size={self.max_batch_size}, "
+                     f"max_wait_ms={self.max_wait_seconds * 1000})")
+
+
+    async def stop(self) -> None:
+        """
+        Cancels the batching task; requests still queued are cancelled with it
+        """
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        for task in list(self._scoring_tasks):
+            task.cancel()
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+
+
+    async def submit(self, record: dict) -> BatchedPrediction:
+        """
+        Queues one feature record and waits for its prediction
+        """
+        if self._worker is None:
+            raise MyException("Micro-batcher is not running", sys)
+        if self.max_queue_size is not None and self._queue.qsize() >= self.max_queue_size:
+            self._rejected += 1
+            raise InferenceOverloadedError(self.executor.retry_after_seconds() if self.executor is not None else 1)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future))
+        return await future
+
+
+    async def _collect_batch(self) -> List[tuple]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+
+    def _resolve(self, batch: List[tuple], result: Optional[tuple], error: Optional[BaseException]) -> None:
+        if error is not None:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        predictions, probabilities, model_version = result
+        for (_, future), prediction, probability in zip(batch, predictions, probabilities):
+            if not future.done():
+                future.set_result(BatchedPrediction(prediction, float(probability), model_version))
+
+        self._batches_scored += 1
+        self._rows_scored += len(batch)
+        self._last_batch_size = len(batch)
+        self._batch_size_counts[len(batch)] += 1
+
+
+    async def _score(self, batch: List[tuple]) -> None:
+        # Callers that went away (client disconnects) are dropped before scoring
+        batch = [(record, future) for record, future in batch if not future.done()]
+        if not batch:
+            return
+        records = [record for record, _ in batch]
+        try:
+            if self.executor is None:
+                result = self.score_batch(records)
+            else:
+                result = await self.executor.run(self.score_batch, records)
+        except InferenceOverloadedError as e:
+            self._resolve(batch, None, e)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                self._resolve(batch, None, e)
+                return
+            # One bad row fails the whole batch: score the rows one at a time, so that only it fails
+            logging.warning(f"Scoring a batch of {len(batch)} rows failed ({e}); scoring its rows one at a time")
+            for row in batch:
+                await self._score([row])
+            return
+        self._resolve(batch, result, None)
+
+
+    async def _score_and_release(self, batch: List[tuple]) -> None:
+        try:
+            await self._score(batch)
+        finally:
+            self._batch_slots.release()
+
+
+    async def _run(self) -> None:
+        while True:
+            # Wait for a free pool thread before closing a batch, so rows arriving meanwhile join it
+            await self._batch_slots.acquire()
+            batch = await self._collect_batch()
+            task = asyncio.create_task(self._score_and_release(batch))
+            self._scoring_tasks.add(task)
+            task.add_done_callback(self._scoring_tasks.discard)
+
+
+    def get_metrics(self) -> dict:
+        """
+        Returns queue depth, rejected rows and batch size statistics
+        """
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches_scored": self._batches_scored,
+            "rows_scored": self._rows_scored,
+            "last_batch_size": self._last_batch_size,
+            "rejected": self._rejected,
+            "mean_batch_size": self._rows_scored / self._batches_scored if self._batches_scored else 0.0,
+            "batch_size_counts": {str(size): count for size, count in sorted(self._batch_size_counts.items())},
+        }
@@ -1,96 +1,89 @@
 import sys
+import json
+import math
+from typing import List, Tuple
+
+import numpy as np
+from src.constants import AD_INPUT_FEATURE_COLUMNS, AD_NUMERIC_FEATURE_COLUMNS
 from src.entities.config_entity import AdPredictorConfig
-from src.entities.s3_config import CloudModelEstimator
-from src.exceptions import MyException
-from src.logging import logging
-from pandas import DataFrame
+from src.entities.model_cache import get_model_cache
+from src.exceptions import BatchTooLargeError, InvalidRecordError, MyException
+from src.logging import LogSampler
 
+# Per-prediction debug messages are sampled so they stay off the request hot path
+sampled_log = LogSampler()
 
-class AdData:
-    def __init__(self,
-                gender_Male,
-                gender_Non_Binary,
-                age,
-                device_type_Mobile,
-                device_type_Tablet,
-                ad_position_Side,
-                ad_position_Top,
-                browsing_history_Entertainment,
-                browsing_history_News,
-                browsing_history_Shopping,
-                browsing_history_Social_Media,
-                time_of_day_Evening,
-                time_of_day_Morning,
-                time_of_day_Night):
-        """
-        Ad Data constructor
-        Input: all features of the trained model for prediction
-        """
+
+def validate_record(record: dict) -> dict:
+    """
+    Checks that a raw record has every feature field and converts its numbers, so that a bad record is
+    rejected on its own instead of failing the batch it is scored in
+    Returns: the record with its numeric fields as float, or None where missing
+    Raises: InvalidRecordError
+    """
+    if not isinstance(record, dict):
+        raise InvalidRecordError(f"Record must be an object, got {type(record).__name__}")
+    missing_fields = [field for field in AD_INPUT_FEATURE_COLUMNS if field not in record]
+    if missing_fields:
+        raise InvalidRecordError(f"Record is missing feature {missing_fields}")
+    validated = dict(record)
+    for field in AD_NUMERIC_FEATURE_COLUMNS:
+        value = record[field]
+        if value is None or (isinstance(value, str) and not value.strip()):
+            validated[field] = None
+            continue
         try:
-            self.gender_Male = gender_Male
-            self.gender_Non_Binary = gender_Non_Binary
-            self.age = age
-            self.device_type_Mobile = device_type_Mobile
-            self.device_type_Tablet = device_type_Tablet
-            self.ad_position_Side = ad_position_Side
-            self.ad_position_Top = ad_position_Top
-            self.browsing_history_Entertainment = browsing_history_Entertainment
-            self.browsing_history_News = browsing_history_News
-            self.browsing_history_Shopping = browsing_history_Shopping
-            self.browsing_history_Social_Media = browsing_history_Social_Media
-            self.time_of_day_Evening = time_of_day_Evening
-            self.time_of_day_Morning = time_of_day_Morning
-            self.time_of_day_Night = time_of_day_Night
+            number = float(value)
+        except (TypeError, ValueError):
+            raise InvalidRecordError(f"Feature {field} must be a number, got {value!r}") from None
+        if isinstance(value, bool) or math.isinf(number):
+            raise InvalidRecordError(f"Feature {field} must be a finite number, got {value!r}")
+        validated[field] = None if math.isnan(number) else number
+    return validated
 
-        except Exception as e:
-            raise MyException(e, sys) from e
-        
 
-    def get_ad_input_data_frame(self)-> DataFrame:
+class AdBatchData:
+    def __init__(self, records: List[dict], max_records: int = None):
         """
-        This function returns a DataFrame from AdData class input
+        Ad Batch Data constructor
+        Input: list of feature records, each keyed by the raw feature fields (values may be null)
+        Raises: InvalidRecordError for a bad record, BatchTooLargeError for more than max_records records
         """
-        try:
-            logging.info("Entered Get Ad Input Dataframe function")
-            ad_input_dict = self.get_ad_data_as_dict()
-            df = DataFrame(ad_input_dict)
-            logging.info("Exited Get Ad Input Dataframe function")
-            return df
-        
-        except Exception as e:
-            raise MyException(e, sys) from e
+        if not isinstance(records, list) or not records:
+            raise InvalidRecordError("No records supplied for batch prediction")
+        if max_records is not None and len(records) > max_records:
+            raise BatchTooLargeError(max_records)
+        validated = []
+        for position, record in enumerate(records):
+            try:
+                validated.append(validate_record(record))
+            except InvalidRecordError as e:
+                raise InvalidRecordError(f"Record {position}: {e}") from None
+        self.records = validated
 
 
-    def get_ad_data_as_dict(self):
+    @classmethod
+    def from_request_body(cls, body: bytes, content_type: str = "application/json",
+                          max_records: int = None) -> "AdBatchData":
         """
-        This function returns a dictionary from AdData class input
+        Builds the batch from a JSON body (a list of records or {"records": [...]})
+        or from JSON Lines with one record per line
+        Raises: InvalidRecordError for a body that does not decode, BatchTooLargeError for more than max_records records
         """
-        logging.info("Entered get_ad_data_as_dict method as AdData class")
-
         try:
-            input_data = {
-                    "gender_Male": [self.gender_Male],
-                    "gender_Non-Binary": [self.gender_Non_Binary],
-                    "age": [self.age],
-                    "device_type_Mobile": [self.device_type_Mobile],
-                    "device_type_Tablet": [self.device_type_Tablet],
-                    "ad_position_Side": [self.ad_position_Side],
-                    "ad_position_Top": [self.ad_position_Top],
-                    "browsing_history_Entertainment": [self.browsing_history_Entertainment],
-                    "browsing_history_News": [self.browsing_history_News],
-                    "browsing_history_Shopping": [self.browsing_history_Shopping],
-                    "browsing_history_Social Media": [self.browsing_history_Social_Media],
-                    "time_of_day_Evening": [self.time_of_day_Evening],
-                    "time_of_day_Morning": [self.time_of_day_Morning],
-                    "time_of_day_Night": [self.time_of_day_Night]
-                }
-
-            logging.info("Created Ad data dict")
-            logging.info("Exited get_ad_data_as_dict method as AdData class")
-            return input_data
-
-        except Exception as e:
-            raise MyException(e, sys) from e
+            text = body.decode("utf-8")
+            if "ndjson" in content_type or "jsonl" in content_type or "json-lines" in content_type:
+                lines = [line for line in text.splitlines() if line.strip()]
+                # Counted before parsing, so an oversized body is refused without decoding every line
+                if max_records is not None and len(lines) > max_records:
+                    raise BatchTooLargeError(max_records)
+                records = [json.loads(line) for line in lines]
+            else:
+                payload = json.loads(text)
+                records = payload.get("records") if isinstance(payload, dict) else payload
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise InvalidRecordError(f"Request body is not valid JSON: {e}") from None
+        return cls(records=records, max_records=max_records)
 
 
 
@@ -105,20 +98,20 @@ class AdDataClassifier:
             raise MyException(e, sys)
         
 
-    def predict(self, dataframe) -> str:
+    def predict_records(self, records: List[dict]) -> Tuple[np.ndarray, np.ndarray, str]:
         """
         This is the method of AdDataClassifier
-        Returns: Prediction in string format
+        Scores raw records (age, gender, device_type, ad_position, browsing_history, time_of_day)
+        through the fast-path feature encoder, without building a DataFrame. Batches with a missing
+        number go through the model's fitted pipeline instead, so they are KNN-imputed as in training.
+        The whole batch is scored by one model, even if a reload swaps in another one meanwhile.
+        Returns: predicted labels and click probabilities for every record, and the model version
         """
         try:
-            logging.info("Entered predict method of AdDataClassifier class")
-            model = CloudModelEstimator(
-                bucket_name=self.prediction_pipeline_config.model_bucket_name,
-                model_path=self.prediction_pipeline_config.model_file_path,
-            )
-            result = model.predict(dataframe)
-            
-            return result
-        
+            cached_model = get_model_cache(self.prediction_pipeline_config).get()
+            predictions, probabilities = cached_model.predict_records(records)
+            sampled_log.debug("Scored %d records with model version %s", len(records), cached_model.version)
+            return predictions, probabilities, cached_model.version
+
         except Exception as e:
             raise MyException(e, sys)
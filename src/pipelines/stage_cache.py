@@ -0,0 +1,177 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+from dataclasses import asdict, fields, is_dataclass
+from types import ModuleType
+from typing import Callable, Iterable, Optional, Type, TypeVar
+
+from src.exceptions import MyException
+from src.logging import logging
+from src.utils.helpers import hash_file
+
+Artifact = TypeVar("Artifact")
+
+
+def _module_version(module: ModuleType) -> str:
+    # Project modules are versioned by their source, installed libraries by their release
+    version = getattr(module, "__version__", None)
+    if version is not None:
+        return f"{module.__name__}=={version}"
+    return f"{module.__name__}:{hashlib.sha256(inspect.getsource(module).encode()).hexdigest()}"
+
+
+class StageCache:
+    """
+    Content-addressed cache of pipeline stage artifacts.
+
+    A stage's fingerprint hashes the content of its input files, the values of its config dataclass
+    (except the per-run artifact paths), the source of the modules that implement it and any extra
+    inputs such as the Mongo collection fingerprint. Each completed stage records its artifact and the
+    hashes of the files it points to under that fingerprint; a later run with the same fingerprint reuses
+    the artifact instead of running the stage, as long as those files are still there and unchanged.
+    """
+
+    def __init__(self, cache_dir: str, artifact_root: str):
+        """
+        :param cache_dir: Directory holding one <stage>/<fingerprint>.json record per completed stage
+        :param artifact_root: Root of the per-run artifact directories; config paths under it are ignored
+        """
+        self.cache_dir = cache_dir
+        self.artifact_root = os.path.normpath(artifact_root)
+        self._file_hashes = {}
+
+
+    def _hash_path(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._file_hashes:
+            self._file_hashes[key] = hash_file(file_path)
+        return self._file_hashes[key]
+
+
+    def _describe_config(self, config) -> dict:
+        description = {}
+        for name, value in asdict(config).items():
+            if isinstance(value, str) and os.path.normpath(value).startswith(self.artifact_root + os.sep):
+                continue
+            if isinstance(value, str) and os.path.isfile(value):
+                value = {"path": value, "sha256": self._hash_path(value)}
+            description[name] = value
+        return description
+
+
+    def _describe_artifact(self, artifact) -> dict:
+        description = {}
+        for name, value in asdict(artifact).items():
+            if isinstance(value, str) and os.path.isfile(value):
+                value = {"sha256": self._hash_path(value)}
+            description[name] = value
+        return description
+
+
+    def _hash_artifact_files(self, values: dict) -> dict:
+        file_hashes = {}
+        for value in values.values():
+            if isinstance(value, dict):
+                file_hashes.update(self._hash_artifact_files(value))
+            elif isinstance(value, str) and os.path.isfile(value):
+                file_hashes[value] = self._hash_path(value)
+        return file_hashes
+
+
+    def compute_fingerprint(self, stage_name: str, config=None, input_artifacts: Iterable = (),
+                            input_files: Iterable[str] = (), code_modules: Iterable[ModuleType] = (),
+                            extra: Optional[dict] = None) -> str:
+        """
+        Returns the sha256 fingerprint of everything a stage's output depends on
+        :param stage_name: Name of the stage
+        :param config: Config dataclass of the stage
+        :param input_artifacts: Artifacts of upstream stages; the files they point to are hashed by content
+        :param input_files: Other files the stage reads, e.g. configs/schema.yaml
+        :param code_modules: Modules implementing the stage
+        :param extra: Any other JSON-serialisable inputs
+        """
+        try:
+            description = {
+                "stage": stage_name,
+                "config": self._describe_config(config) if config is not None else None,
+                "input_artifacts": [self._describe_artifact(artifact) for artifact in input_artifacts],
+                "input_files": {file_path: self._hash_path(file_path) for file_path in input_files},
+                "code": sorted(_module_version(module) for module in code_modules),
+                "extra": extra or {},
+            }
+            encoded = json.dumps(description, sort_keys=True, default=str).encode()
+            return hashlib.sha256(encoded).hexdigest()
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def _record_path(self, stage_name: str, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, stage_name, f"{fingerprint}.json")
+
+
+    @staticmethod
+    def _artifact_from_dict(artifact_cls: Type[Artifact], values: dict) -> Artifact:
+        kwargs = {}
+        for field in fields(artifact_cls):
+            value = values[field.name]
+            kwargs[field.name] = (StageCache._artifact_from_dict(field.type, value)
+                                  if is_dataclass(field.type) else value)
+        return artifact_cls(**kwargs)
+
+
+    def lookup(self, stage_name: str, fingerprint: str, artifact_cls: Type[Artifact]) -> Optional[Artifact]:
+        """
+        Returns the artifact recorded under the fingerprint, or None if there is none or its files
+        were deleted or overwritten since
+        """
+        record_path = self._record_path(stage_name, fingerprint)
+        if not os.path.exists(record_path):
+            return None
+        try:
+            with open(record_path, "r") as record_file:
+                record = json.load(record_file)
+            for file_path, file_hash in record["files"].items():
+                if not os.path.isfile(file_path) or self._hash_path(file_path) != file_hash:
+                    logging.info(f"Stage cache record for {stage_name} points to a missing or changed file "
+                                 f"{file_path}, ignoring it")
+                    return None
+            return self._artifact_from_dict(artifact_cls, record["artifact"])
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable stage cache record {record_path}: {e}")
+            return None
+
+
+    def record(self, stage_name: str, fingerprint: str, artifact) -> None:
+        """
+        Records a stage's artifact under its fingerprint
+        """
+        try:
+            record_path = self._record_path(stage_name, fingerprint)
+            os.makedirs(os.path.dirname(record_path), exist_ok=True)
+            tmp_path = f"{record_path}.tmp"
+            values = asdict(artifact)
+            with open(tmp_path, "w") as record_file:
+                json.dump({"stage": stage_name, "fingerprint": fingerprint, "artifact": values,
+                           "files": self._hash_artifact_files(values)}, record_file, indent=4)
+            os.replace(tmp_path, record_path)
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def run(self, stage_name: str, fingerprint: str, artifact_cls: Type[Artifact],
+            run_stage: Callable[[], Artifact]) -> Artifact:
+        """
+        Returns the cached artifact for the fingerprint, or runs the stage and records its artifact
+        """
+        artifact = self.lookup(stage_name, fingerprint, artifact_cls)
+        if artifact is not None:
+            logging.info(f"Skipping {stage_name}: reusing cached artifact (fingerprint {fingerprint[:12]})")
+            return artifact
+        artifact = run_stage()
+        self.record(stage_name, fingerprint, artifact)
+        return artifact
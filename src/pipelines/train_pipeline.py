@@ -1,19 +1,39 @@
 import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Optional
+
+import imblearn
+import optuna
+import pandas
+import sklearn
+import xgboost
+
 from src.exceptions import MyException
 from src.logging import logging
+from src.constants import ARTIFACT_DIR, MODEL_HYPERPARAMETERS_FILE_PATH, SCHEMA_FILE_PATH
+from src.data import proj_data_handler
+from src.data.proj_data_handler import GetData
+from src.entities import estimator_config
+from src.pipelines.stage_cache import StageCache
+from src.utils import feature_encoder, helpers, knn_imputer, rebalancing, transformation_utils
+from src.utils.instrumentation import RunReport, get_active_report, instrumented
 
 from src.components.data_ingestion import DataIngestion
 from src.components.data_validation import DataValidation
 from src.components.data_transformation import DataTransformation
+from src.components.model_tuner import ModelTuner
 from src.components.model_trainer import ModelTrainer
 from src.components.model_evaluator import ModelEvaluation
 from src.components.model_deployment import ModelPusher
 
 
 
-from src.entities.config_entity import (DataIngestionConfig,
+from src.entities.config_entity import (training_pipeline_config,
+                                        DataIngestionConfig,
                                         DataValidationConfig,
                                         DataTransformationConfig,
+                                        ModelTunerConfig,
                                         ModelTrainerConfig,
                                         ModelEvaluationConfig,
                                         ModelPusherConfig)
@@ -21,6 +41,7 @@ from src.entities.config_entity import (DataIngestionConfig,
 from src.entities.artifact_entity import (DataIngestionArtifact,
                                           DataValidationArtifact,
                                           DataTransformationArtifact,
+                                          ModelTunerArtifact,
                                           ModelTrainerArtifact,
                                           ModelEvaluationArtifact,
                                           ModelPusherArtifact)
@@ -30,17 +51,27 @@ from src.entities.artifact_entity import (DataIngestionArtifact,
 # Defining Training Pipeline class
 
 class TrainPipeline:
-    def __init__(self):
+    def __init__(self, stage_callback: Optional[Callable[[str, str, dict], None]] = None):
+        """
+        :param stage_callback: Called with (stage name, "running" | "completed" | "failed" | "skipped", details)
+                               as the pipeline progresses; details carry the duration and whether the stage
+                               was served from the stage cache
+        """
         self.data_ingestion_config = DataIngestionConfig()
         self.data_validation_config = DataValidationConfig()
         self.data_transformation_config = DataTransformationConfig()
+        self.model_tuner_config = ModelTunerConfig()
         self.model_trainer_config = ModelTrainerConfig()
         self.model_evaluation_config = ModelEvaluationConfig()
         self.model_pusher_config = ModelPusherConfig()
+        self.stage_cache = (StageCache(cache_dir=training_pipeline_config.stage_cache_dir, artifact_root=ARTIFACT_DIR)
+                            if training_pipeline_config.stage_cache_enabled else None)
+        self.stage_callback = stage_callback
 
 
     #For Initiating Ingestion
 
+    @instrumented
     def start_data_ingestion(self) -> DataIngestionArtifact:
         """
         This method of TrainPipeline class is responsible for starting data ingestion component
@@ -59,6 +90,7 @@ class TrainPipeline:
 
     #For Initiating Validation    
 
+    @instrumented
     def start_data_validation(self, data_ingestion_artifact: DataIngestionArtifact) -> DataValidationArtifact:
         """
         This method of TrainPipeline class is responsible for starting data validation component
@@ -82,6 +114,7 @@ class TrainPipeline:
 
     #For Initiating Transformation
         
+    @instrumented
     def start_data_transformation(self, data_ingestion_artifact: DataIngestionArtifact, 
                                   data_validation_artifact: DataValidationArtifact) -> DataTransformationArtifact:
         """
@@ -97,15 +130,35 @@ class TrainPipeline:
             raise MyException(e, sys)
 
 
+    #For Initiating Model Tuning
+
+    @instrumented
+    def start_model_tuner(self, data_transformation_artifact: DataTransformationArtifact) -> ModelTunerArtifact:
+        """
+        This method of TrainPipeline class is responsible for starting the hyperparameter search
+        """
+        try:
+            model_tuner = ModelTuner(data_transformation_artifact=data_transformation_artifact,
+                                     model_tuner_config=self.model_tuner_config)
+            model_tuner_artifact = model_tuner.initiate_model_tuner()
+            return model_tuner_artifact
+
+        except Exception as e:
+            raise MyException(e, sys)
+
+
     #For Initiating Model Training
 
-    def start_model_trainer(self, data_transformation_artifact: DataTransformationArtifact) -> ModelTrainerArtifact:
+    @instrumented
+    def start_model_trainer(self, data_transformation_artifact: DataTransformationArtifact,
+                            model_tuner_artifact: Optional[ModelTunerArtifact] = None) -> ModelTrainerArtifact:
         """
         This method of TrainPipeline class is responsible for starting model training
         """
         try:
             model_trainer = ModelTrainer(data_transformation_artifact=data_transformation_artifact,
-                                         model_training_config=self.model_trainer_config
+                                         model_training_config=self.model_trainer_config,
+                                         model_tuner_artifact=model_tuner_artifact
                                          )
             model_trainer_artifact = model_trainer.initiate_model_trainer()
             return model_trainer_artifact
@@ -116,6 +169,7 @@ class TrainPipeline:
 
     #For Initating Evaluation    
 
+    @instrumented
     def start_model_evaluation(self, data_ingestion_artifact: DataIngestionArtifact,
                                model_trainer_artifact: ModelTrainerArtifact) -> ModelEvaluationArtifact:
         """
@@ -135,6 +189,7 @@ class TrainPipeline:
 
     #For Initating Model Push   
 
+    @instrumented
     def start_model_pusher(self, model_evaluation_artifact: ModelEvaluationArtifact) -> ModelPusherArtifact:
         """
         This method of TrainPipeline class is responsible for starting model pushing
@@ -150,22 +205,129 @@ class TrainPipeline:
 
 
 
-    def run_pipeline(self) -> None:
+    #For reporting stage progress
+
+    def _notify_stage(self, stage_name: str, status: str, details: dict) -> None:
+        if self.stage_callback is None:
+            return
+        try:
+            self.stage_callback(stage_name, status, details)
+        except Exception:
+            logging.warning(f"Stage callback failed for {stage_name} ({status})", exc_info=True)
+
+
+    @contextmanager
+    def report_stage(self, stage_name: str):
+        """
+        Reports the stage as running, then as completed or failed with its duration, and measures it
+        in the run report when one is active.
+        Yields a dictionary the stage can add details to.
+        """
+        details = {}
+        report = get_active_report()
+        self._notify_stage(stage_name, "running", {})
+        start = time.perf_counter()
+        with (report.measure(stage_name, stage=True) if report is not None else nullcontext({})) as record:
+            try:
+                yield details
+            except BaseException as e:
+                details.update(duration_seconds=time.perf_counter() - start, error=str(e))
+                self._notify_stage(stage_name, "failed", details)
+                raise
+            finally:
+                record.update((key, value) for key, value in details.items()
+                              if key not in ("duration_seconds", "error"))
+            details["duration_seconds"] = time.perf_counter() - start
+            self._notify_stage(stage_name, "completed", details)
+
+
+
+    #For running a stage through the stage cache
+
+    def run_cached_stage(self, stage_name: str, artifact_cls: type, run_stage: Callable, **fingerprint_inputs):
+        """
+        Runs the stage, or reuses the artifact of an earlier run whose fingerprint is the same.
+        fingerprint_inputs are passed to StageCache.compute_fingerprint
+        """
+        with self.report_stage(stage_name) as details:
+            if self.stage_cache is None:
+                return run_stage()
+            ran = []
+            fingerprint = self.stage_cache.compute_fingerprint(stage_name, **fingerprint_inputs)
+            artifact = self.stage_cache.run(stage_name, fingerprint, artifact_cls,
+                                            lambda: ran.append(True) or run_stage())
+            details["cached"] = not ran
+            return artifact
+
+
+
+    def run_pipeline(self) -> Optional[ModelPusherArtifact]:
         """
-        This method of TrainPipeline class is responsible for running complete pipeline
+        This method of TrainPipeline class is responsible for running complete pipeline.
+        With model tuning enabled, the hyperparameter search runs before training and the model is trained
+        with its best parameters.
+        Ingestion, validation, transformation, tuning and training are skipped when their inputs, config and code
+        match an earlier run; evaluation and push always run since they depend on the model in S3.
+        The wall time, CPU time, peak memory and artifact shapes of every stage are written to
+        training_pipeline_config.run_report_file_path, also when the run fails.
+        Returns the model pusher artifact, or None when the new model was not accepted.
         """
         try:
-            data_ingestion_artifact = self.start_data_ingestion()
-            data_validation_artifact = self.start_data_validation(data_ingestion_artifact=data_ingestion_artifact)
-            data_transformation_artifact = self.start_data_transformation(
-                 data_ingestion_artifact=data_ingestion_artifact, data_validation_artifact=data_validation_artifact)
-            model_trainer_artifact = self.start_model_trainer(data_transformation_artifact=data_transformation_artifact)
-            model_evaluation_artifact = self.start_model_evaluation(data_ingestion_artifact=data_ingestion_artifact,
-                                                                    model_trainer_artifact=model_trainer_artifact,)
-            if not model_evaluation_artifact.is_model_accepted:
-                logging.info(f"Model not accepted.")
-                return None
-            model_pusher_artifact = self.start_model_pusher(model_evaluation_artifact=model_evaluation_artifact)
+            run_report = RunReport(training_pipeline_config.run_report_file_path,
+                                   sample_interval=training_pipeline_config.instrumentation_sample_interval)
+            with run_report.activate():
+                collection_fingerprint = (GetData().get_collection_fingerprint(self.data_ingestion_config.collection_name)
+                                          if self.stage_cache is not None else None)
+                data_ingestion_artifact = self.run_cached_stage(
+                    "data_ingestion", DataIngestionArtifact, self.start_data_ingestion,
+                    config=self.data_ingestion_config, input_files=[SCHEMA_FILE_PATH],
+                    code_modules=[sys.modules[DataIngestion.__module__], proj_data_handler, helpers, pandas],
+                    extra={"collection": collection_fingerprint})
+
+                data_validation_artifact = self.run_cached_stage(
+                    "data_validation", DataValidationArtifact,
+                    lambda: self.start_data_validation(data_ingestion_artifact=data_ingestion_artifact),
+                    config=self.data_validation_config, input_artifacts=[data_ingestion_artifact],
+                    input_files=[SCHEMA_FILE_PATH], code_modules=[sys.modules[DataValidation.__module__], helpers])
+
+                data_transformation_artifact = self.run_cached_stage(
+                    "data_transformation", DataTransformationArtifact,
+                    lambda: self.start_data_transformation(data_ingestion_artifact=data_ingestion_artifact,
+                                                           data_validation_artifact=data_validation_artifact),
+                    config=self.data_transformation_config,
+                    input_artifacts=[data_ingestion_artifact, data_validation_artifact], input_files=[SCHEMA_FILE_PATH],
+                    code_modules=[sys.modules[DataTransformation.__module__], transformation_utils, knn_imputer, rebalancing,
+                                  helpers, sklearn, imblearn])
+
+                model_tuner_artifact = None
+                if training_pipeline_config.model_tuning_enabled:
+                    model_tuner_artifact = self.run_cached_stage(
+                        "model_tuner", ModelTunerArtifact,
+                        lambda: self.start_model_tuner(data_transformation_artifact=data_transformation_artifact),
+                        config=self.model_tuner_config, input_artifacts=[data_transformation_artifact],
+                        input_files=[MODEL_HYPERPARAMETERS_FILE_PATH],
+                        code_modules=[sys.modules[ModelTuner.__module__], helpers, xgboost, sklearn, optuna])
+
+                model_trainer_artifact = self.run_cached_stage(
+                    "model_trainer", ModelTrainerArtifact,
+                    lambda: self.start_model_trainer(data_transformation_artifact=data_transformation_artifact,
+                                                     model_tuner_artifact=model_tuner_artifact),
+                    config=self.model_trainer_config,
+                    input_artifacts=[data_transformation_artifact] + ([model_tuner_artifact] if model_tuner_artifact else []),
+                    input_files=[SCHEMA_FILE_PATH, MODEL_HYPERPARAMETERS_FILE_PATH],
+                    code_modules=[sys.modules[ModelTrainer.__module__], estimator_config, feature_encoder, helpers,
+                                  xgboost, sklearn])
+
+                with self.report_stage("model_evaluation"):
+                    model_evaluation_artifact = self.start_model_evaluation(data_ingestion_artifact=data_ingestion_artifact,
+                                                                            model_trainer_artifact=model_trainer_artifact,)
+                if not model_evaluation_artifact.is_model_accepted:
+                    logging.info(f"Model not accepted.")
+                    self._notify_stage("model_pusher", "skipped", {"reason": "model not accepted"})
+                    return None
+                with self.report_stage("model_pusher"):
+                    model_pusher_artifact = self.start_model_pusher(model_evaluation_artifact=model_evaluation_artifact)
+                return model_pusher_artifact
             
         except Exception as e:
             raise MyException(e, sys)    
@@ -0,0 +1,270 @@
+import fcntl
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Optional, Tuple
+
+from src.constants import TRAINING_JOB_NICENESS, TRAINING_JOBS_DIR
+from src.entities.config_entity import training_pipeline_config
+from src.exceptions import MyException
+from src.logging import logging
+
+TRAINING_STAGES = ("data_ingestion", "data_validation", "data_transformation", "model_trainer",
+                   "model_evaluation", "model_pusher")
+TERMINAL_STATES = ("succeeded", "failed")
+LOCK_FILE_NAME = "training.lock"
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _status_path(jobs_dir: str, job_id: str) -> str:
+    return os.path.join(jobs_dir, f"{job_id}.json")
+
+
+def _write_status(jobs_dir: str, status: dict) -> None:
+    os.makedirs(jobs_dir, exist_ok=True)
+    status_path = _status_path(jobs_dir, status["job_id"])
+    tmp_path = f"{status_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as status_file:
+        json.dump(status, status_file, indent=4, default=str)
+    os.replace(tmp_path, status_path)
+
+
+def _read_status(jobs_dir: str, job_id: str) -> Optional[dict]:
+    try:
+        with open(_status_path(jobs_dir, job_id), "r") as status_file:
+            return json.load(status_file)
+    except FileNotFoundError:
+        return None
+
+
+def get_training_stages(model_tuning_enabled: bool) -> Tuple[str, ...]:
+    """
+    Stages TrainPipeline runs, in order: model_tuner runs before model_trainer when tuning is enabled
+    """
+    if not model_tuning_enabled:
+        return TRAINING_STAGES
+    trainer_index = TRAINING_STAGES.index("model_trainer")
+    return TRAINING_STAGES[:trainer_index] + ("model_tuner",) + TRAINING_STAGES[trainer_index:]
+
+
+def run_training_pipeline(stage_callback: Callable[[str, str, dict], None]) -> dict:
+    """
+    Default job target: runs the full training pipeline and summarises its outcome
+    """
+    # Imported here so that only the training process loads the pipeline and its dependencies
+    from src.pipelines.train_pipeline import TrainPipeline
+
+    model_pusher_artifact = TrainPipeline(stage_callback=stage_callback).run_pipeline()
+    return {"model_accepted": model_pusher_artifact is not None,
+            "model_version": model_pusher_artifact.model_version if model_pusher_artifact else None,
+            "run_report": training_pipeline_config.run_report_file_path}
+
+
+class TrainingJobProgress:
+    """
+    Status of one training job, kept in <jobs_dir>/<job_id>.json and rewritten atomically on every change,
+    so any serving process can report it
+    """
+
+    def __init__(self, jobs_dir: str, job_id: str):
+        self.jobs_dir = jobs_dir
+        self.status = _read_status(jobs_dir, job_id)
+
+
+    def _save(self) -> None:
+        completed = [stage for stage in self.status["stages"] if stage["state"] in ("completed", "skipped")]
+        self.status["progress"] = f"{len(completed)}/{len(self.status['stages'])}"
+        _write_status(self.jobs_dir, self.status)
+
+
+    def set_state(self, state: str, **fields) -> None:
+        self.status.update(state=state, **fields)
+        if state == "running":
+            self.status["started_at"] = _now()
+        if state in TERMINAL_STATES:
+            self.status["finished_at"] = _now()
+            if self.status.get("started_at"):
+                self.status["duration_seconds"] = (datetime.fromisoformat(self.status["finished_at"])
+                                                   - datetime.fromisoformat(self.status["started_at"])).total_seconds()
+        self._save()
+
+
+    def on_stage(self, stage_name: str, state: str, details: dict) -> None:
+        """
+        TrainPipeline stage callback
+        """
+        stage = next((stage for stage in self.status["stages"] if stage["name"] == stage_name), None)
+        if stage is None:
+            stage = {"name": stage_name}
+            self.status["stages"].append(stage)
+        stage.update(state=state, **details)
+        if state == "running":
+            stage["started_at"] = _now()
+            self.status["current_stage"] = stage_name
+        else:
+            stage["finished_at"] = _now()
+        self._save()
+
+
+def _run_job(job_id: str, jobs_dir: str, target: Callable, niceness: int) -> None:
+    # Runs in the training process. The lock serialises training across every serving process on the host.
+    progress = TrainingJobProgress(jobs_dir, job_id)
+    with open(os.path.join(jobs_dir, LOCK_FILE_NAME), "a+") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            progress.set_state("failed", error="Another training run is already in progress")
+            return
+        try:
+            lock_file.truncate(0)
+            lock_file.write(job_id)
+            lock_file.flush()
+            if niceness:
+                os.nice(niceness)
+            progress.set_state("running", pid=os.getpid())
+            result = target(progress.on_stage)
+            progress.set_state("succeeded", result=result, current_stage=None)
+        except Exception as e:
+            logging.error(f"Training job {job_id} failed", exc_info=True)
+            progress.set_state("failed", error=str(e), traceback=traceback.format_exc())
+        finally:
+            lock_file.truncate(0)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class TrainingJobManager:
+    """
+    Runs training pipeline jobs in a separate process, one at a time.
+
+    submit() returns as soon as the job is queued: the pipeline runs in a single-worker process pool
+    (spawned, so it does not inherit the server's threads, and discarded after the job so the memory
+    of the run is returned), at a lower CPU priority than serving. The job writes its state, per-stage
+    progress and timings to <jobs_dir>/<job_id>.json, which get_status() reads, so the status of a job
+    is available from every serving process. A job is refused while another one runs, in this process
+    or, through a lock file held by the training process, in any other process on the host.
+    """
+
+    def __init__(self, jobs_dir: str = TRAINING_JOBS_DIR, target: Callable = run_training_pipeline,
+                 niceness: int = TRAINING_JOB_NICENESS, model_tuning_enabled: Optional[bool] = None):
+        """
+        :param jobs_dir: Directory of the job status files and the training lock
+        :param target: Top-level function running the pipeline; called with the stage callback, returns a summary
+        :param niceness: Niceness added to the training process
+        :param model_tuning_enabled: Whether the pipeline runs the model_tuner stage, from the pipeline config by default
+        """
+        self.jobs_dir = jobs_dir
+        self.target = target
+        self.niceness = niceness
+        if model_tuning_enabled is None:
+            model_tuning_enabled = training_pipeline_config.model_tuning_enabled
+        self.stages = get_training_stages(model_tuning_enabled)
+        self._lock = threading.Lock()
+        self._active: Optional[Tuple[str, Future]] = None
+
+
+    def _locked_job_id(self) -> Optional[str]:
+        # Id of the job holding the training lock ("" until it is written), or None when no training process runs
+        lock_path = os.path.join(self.jobs_dir, LOCK_FILE_NAME)
+        if not os.path.exists(lock_path):
+            return None
+        with open(lock_path, "r") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except OSError:
+                return lock_file.read().strip()
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return None
+
+
+    def _on_done(self, job_id: str, future: Future, executor: ProcessPoolExecutor) -> None:
+        # The training process crashed (e.g. killed for memory) before it could record the outcome
+        if future.exception() is not None:
+            status = _read_status(self.jobs_dir, job_id)
+            if status is not None and status["state"] not in TERMINAL_STATES:
+                progress = TrainingJobProgress(self.jobs_dir, job_id)
+                progress.set_state("failed", error=f"Training process exited unexpectedly: {future.exception()!r}")
+        executor.shutdown(wait=False)
+
+
+    def _running_job(self) -> Optional[dict]:
+        # The job started by this process or holding the training lock, unless it has already recorded its
+        # outcome (the training process writes it just before releasing the lock and exiting)
+        job_ids = [self._active[0]] if self._active is not None and not self._active[1].done() else []
+        locked_job_id = self._locked_job_id()
+        if locked_job_id is not None:
+            job_ids.append(locked_job_id)
+        for job_id in job_ids:
+            status = self.get_status(job_id) or {"job_id": job_id, "state": "running"}
+            if status["state"] not in TERMINAL_STATES:
+                return status
+        return None
+
+
+    def submit(self) -> Tuple[dict, bool]:
+        """
+        Queues a training job unless one is already running
+        :return: The status of the new job and True, or the status of the running job and False
+        """
+        try:
+            with self._lock:
+                running_job = self._running_job()
+                if running_job is not None:
+                    return running_job, False
+
+                job_id = uuid.uuid4().hex
+                status = {"job_id": job_id, "state": "queued", "submitted_at": _now(), "started_at": None,
+                          "finished_at": None, "duration_seconds": None, "current_stage": None,
+                          "progress": f"0/{len(self.stages)}", "error": None, "result": None,
+                          "stages": [{"name": stage_name, "state": "pending"} for stage_name in self.stages]}
+                _write_status(self.jobs_dir, status)
+
+                executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+                future = executor.submit(_run_job, job_id, self.jobs_dir, self.target, self.niceness)
+                future.add_done_callback(lambda done: self._on_done(job_id, done, executor))
+                self._active = (job_id, future)
+                logging.info(f"Submitted training job {job_id}")
+                return status, True
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def get_status(self, job_id: str) -> Optional[dict]:
+        """
+        Returns the status of a job, or None if there is no such job
+        """
+        if not JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        status = _read_status(self.jobs_dir, job_id)
+        # A job left "running" by a training process that no longer holds the lock was interrupted
+        if status is not None and status["state"] == "running" and self._locked_job_id() != job_id:
+            status = _read_status(self.jobs_dir, job_id)
+            if status["state"] == "running":
+                status.update(state="failed", error="Training process was interrupted")
+        return status
+
+
+    def wait(self, job_id: str, timeout: float = None, poll_interval: float = 0.5) -> Optional[dict]:
+        """
+        Blocks until the job finishes or the timeout expires; returns its last status
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.get_status(job_id)
+            if status is None or status["state"] in TERMINAL_STATES:
+                return status
+            if deadline is not None and time.monotonic() >= deadline:
+                return status
+            time.sleep(poll_interval)
@@ -0,0 +1,87 @@
+#Tests for the HEAD-based lookups, metadata cache and lazy listing of SimpleStorageService against moto
+
+from collections import Counter
+from itertools import islice
+
+import pytest
+
+moto = pytest.importorskip("moto")
+
+from src.cloud.aws_handler import S3Client
+from src.cloud.aws_storage import SimpleStorageService
+from src.cloud.s3_metadata_cache import S3MetadataCache
+
+BUCKET = "storage-test"
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(S3Client, "s3_client", None)
+    monkeypatch.setattr(S3Client, "s3_resource", None)
+    with moto.mock_aws():
+        storage = SimpleStorageService()
+        storage.metadata_cache.clear()
+        storage.s3_client.create_bucket(Bucket=BUCKET)
+        yield storage
+        storage.metadata_cache.clear()
+
+
+def _count_calls(storage) -> Counter:
+    calls = Counter()
+    storage.s3_client.meta.events.register("before-call.s3.*", lambda model, **kwargs: calls.update([model.name]))
+    return calls
+
+
+def test_exact_key_lookups_are_cached_heads(storage):
+    storage.upload_fileobj(b"model", "model.pkl.bak", BUCKET)
+    calls = _count_calls(storage)
+
+    # Only the exact key counts, not other keys sharing the prefix
+    assert not storage.s3_key_path_available(BUCKET, "model.pkl")
+    assert not storage.s3_key_path_available(BUCKET, "model.pkl")
+    assert calls == Counter({"HeadObject": 1})
+
+    storage.upload_fileobj(b"model", "model.pkl", BUCKET)
+    assert storage.s3_key_path_available(BUCKET, "model.pkl")
+    assert storage.read_object(storage.get_file_object("model.pkl", BUCKET), decode=False) == b"model"
+    assert storage.get_object_metadata("model.pkl", BUCKET)["content_length"] == 5
+    assert calls["HeadObject"] == 2 and "ListObjectsV2" not in calls
+
+    storage.get_object_metadata("model.pkl", BUCKET, max_age=0)
+    assert calls["HeadObject"] == 3
+
+
+def test_stale_cached_metadata_is_detected_on_read(storage):
+    storage.upload_fileobj(b"old model", "model.pkl", BUCKET)
+    file_object = storage.get_file_object("model.pkl", BUCKET)
+    # Replaced by another process: this process's cache still holds the old ETag and size
+    storage.s3_client.put_object(Bucket=BUCKET, Key="model.pkl", Body=b"new")
+    assert storage.read_object(file_object, decode=False) == b"new"
+
+
+def test_listing_is_paginated_and_lazy(storage):
+    for number in range(5):
+        storage.upload_fileobj(b"x" * number, f"registry/{number}.pkl", BUCKET)
+    calls = _count_calls(storage)
+
+    first_three = list(islice(storage.iter_objects(BUCKET, prefix="registry/", page_size=2), 3))
+    assert [item["key"] for item in first_three] == ["registry/0.pkl", "registry/1.pkl", "registry/2.pkl"]
+    assert calls == Counter({"ListObjectsV2": 2})
+
+    assert storage.s3_key_path_available(BUCKET, "registry/")
+    assert storage.get_object_metadata("registry/2.pkl", BUCKET)["content_length"] == 2
+    assert calls == Counter({"ListObjectsV2": 3})
+
+
+def test_metadata_cache_keeps_only_the_most_recently_used_keys():
+    cache = S3MetadataCache(ttl_seconds=60, max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.put(BUCKET, key, None)
+    assert cache.get(BUCKET, "a", fetch=lambda: pytest.fail("a is cached")) is None
+    # One entry per distinct key, negative ones included, up to max_entries: "b" is the least recently used
+    for key in ("d", "e", "f", "g"):
+        cache.get(BUCKET, key, fetch=lambda: None)
+    assert len(cache) == 3
+    assert cache.get(BUCKET, "b", fetch=lambda: {"ETag": "b"}) == {"ETag": "b"}
@@ -0,0 +1,55 @@
+#Tests for data ingestion: the streaming and in-memory modes split the collection identically
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.components import data_ingestion
+from src.components.data_ingestion import DataIngestion
+from src.data.proj_data_handler import GetData
+from src.entities.config_entity import DataIngestionConfig
+from src.utils.helpers import read_data
+
+
+class _FakeGetData:
+    # Documents in _id order, as the real handler returns them; age identifies a row
+    documents = [{"id": i, "full_name": f"user {i}", "age": 18 + i, "gender": ["Male", "Female"][i % 2],
+                  "device_type": "Mobile", "ad_position": "Top", "browsing_history": "Shopping",
+                  "time_of_day": "Morning", "click": i % 3 == 0} for i in range(103)]
+
+    def count_documents(self, collection_name):
+        return len(self.documents)
+
+    def get_collection_and_export_to_df(self, collection_name):
+        return pd.DataFrame(self.documents)
+
+    def iter_collection_batches(self, collection_name, batch_size, columns, exclude_columns=(),
+                                numerical_columns=(), categorical_columns=()):
+        for start in range(0, len(self.documents), batch_size):
+            documents = [{key: value for key, value in document.items() if key not in exclude_columns}
+                         for document in self.documents[start:start + batch_size]]
+            yield GetData._documents_to_df(documents, columns, numerical_columns, categorical_columns)
+
+
+def _ingest(tmp_path, mode):
+    root = str(tmp_path / mode)
+    config = DataIngestionConfig(feature_store_file_path=os.path.join(root, "feature_store", "data.parquet"),
+                                 training_file_path=os.path.join(root, "ingested", "train.parquet"),
+                                 testing_file_path=os.path.join(root, "ingested", "test.parquet"),
+                                 ingestion_mode=mode, batch_size=10)
+    artifact = DataIngestion(config).initiate_data_ingestion()
+    return read_data(artifact.train_file_path), read_data(artifact.test_file_path)
+
+
+def test_streaming_split_matches_the_in_memory_split(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_ingestion, "GetData", _FakeGetData)
+
+    streamed_train, streamed_test = _ingest(tmp_path, "streaming")
+    in_memory_train, in_memory_test = _ingest(tmp_path, "in_memory")
+
+    # Exactly ceil(0.2 * 103) test rows, and the same rows in each split in both modes
+    assert len(streamed_test) == len(in_memory_test) == 21
+    np.testing.assert_array_equal(np.sort(streamed_test["age"]), np.sort(in_memory_test["age"]))
+    np.testing.assert_array_equal(np.sort(streamed_train["age"]), np.sort(in_memory_train["age"]))
+    assert _ingest(tmp_path / "again", "streaming")[1]["age"].tolist() == streamed_test["age"].tolist()
@@ -0,0 +1,118 @@
+#Equivalence test for the fast-path feature encoder against MyModel.predict
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler, MinMaxScaler
+from xgboost import XGBClassifier
+
+from src.constants import TARGET_COLUMN
+from src.entities.estimator_config import MyModel
+from src.entities.model_cache import CachedModel
+from src.entities.native_estimator import NativeModel
+from src.utils.feature_encoder import FeatureEncoder
+from src.utils.helpers import read_yaml_file
+from src.utils.transformation_utils import drop_columns, encode_categorical_features, fill_na_and_knn_impute
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATASET_PATH = os.path.join(ROOT_DIR, "dataset", "ad_click_dataset.csv")
+SCHEMA_PATH = os.path.join(ROOT_DIR, "configs", "schema.yaml")
+
+
+def test_encoder_matches_my_model_predict():
+    schema_config = read_yaml_file(SCHEMA_PATH)
+    df = pd.read_csv(DATASET_PATH)
+    target = df.pop(TARGET_COLUMN)
+
+    # Raw rows as the online path receives them, and the same rows one-hot encoded as in training
+    raw_df = fill_na_and_knn_impute(drop_columns(df, schema_config))
+    encoded_df = encode_categorical_features(raw_df)
+
+    preprocessor = Pipeline(steps=[("Preprocessor", ColumnTransformer(
+        transformers=[("StandardScaler", StandardScaler(), schema_config["num_features"]),
+                      ("MinMaxScaler", MinMaxScaler(), schema_config["mm_columns"])],
+        remainder="passthrough"))])
+    model = XGBClassifier(n_estimators=20, max_depth=4)
+    model.fit(preprocessor.fit_transform(encoded_df), target)
+    my_model = MyModel(preprocessing_object=preprocessor, trained_model_object=model)
+
+    encoder = FeatureEncoder.from_preprocessor(preprocessor, schema_config)
+    raw_df = raw_df.astype(object).where(raw_df.notna(), None)
+    records = raw_df.to_dict(orient="records")
+    # Form posts send every field as a string
+    records[:100] = [{field: None if value is None else str(value) for field, value in record.items()}
+                     for record in records[:100]]
+    features = encoder.encode_records(records)
+
+    expected_features = preprocessor.transform(encoded_df).astype(np.float32)
+    np.testing.assert_array_equal(features, expected_features)
+
+    predictions, probabilities = my_model.predict_encoded(features)
+    np.testing.assert_array_equal(predictions, my_model.predict(encoded_df))
+    np.testing.assert_array_equal(probabilities, model.predict_proba(preprocessor.transform(encoded_df))[:, 1])
+
+
+def test_encoder_matches_fitted_pipeline_on_raw_records():
+    from src.components.data_transformation import DataTransformation
+    from src.entities.config_entity import DataTransformationConfig
+
+    df = pd.read_csv(DATASET_PATH)
+    target = df.pop(TARGET_COLUMN)
+    train_df, test_df = df.iloc[:8000], df.iloc[8000:]
+
+    preprocessor = DataTransformation(data_ingestion_artifact=None, data_transformation_config=DataTransformationConfig(),
+                                      data_validation_artifact=None).get_data_transformer_object()
+    model = XGBClassifier(n_estimators=20, max_depth=4)
+    model.fit(preprocessor.fit_transform(train_df), target.iloc[:8000])
+    my_model = MyModel(preprocessing_object=preprocessor, trained_model_object=model)
+    assert my_model.accepts_raw_features
+
+    # Test rows are imputed against the training donors and encoded with the training columns
+    expected_features = preprocessor.transform(test_df).astype(np.float32)
+    assert expected_features.shape[1] == preprocessor.transform(train_df).shape[1]
+
+    # Rows with a known age need no imputation, so the fast path must match the fitted pipeline exactly
+    known_age = test_df[test_df["age"].notna()]
+    records = known_age.astype(object).where(known_age.notna(), None).to_dict(orient="records")
+    encoder = FeatureEncoder.from_preprocessor(preprocessor, read_yaml_file(SCHEMA_PATH))
+    assert not encoder.has_missing_numbers(records)
+    np.testing.assert_array_equal(encoder.encode_records(records), preprocessor.transform(known_age).astype(np.float32))
+    np.testing.assert_array_equal(my_model.predict_encoded(encoder.encode_records(records))[0], my_model.predict(known_age))
+
+
+def test_native_model_matches_my_model_and_refuses_missing_numbers():
+    from src.components.data_transformation import DataTransformation
+    from src.entities.config_entity import DataTransformationConfig
+
+    df = pd.read_csv(DATASET_PATH)
+    target = df.pop(TARGET_COLUMN)
+    preprocessor = DataTransformation(data_ingestion_artifact=None, data_transformation_config=DataTransformationConfig(),
+                                      data_validation_artifact=None).get_data_transformer_object()
+    model = XGBClassifier(n_estimators=20, max_depth=4)
+    model.fit(preprocessor.fit_transform(df), target)
+    encoder = FeatureEncoder.from_preprocessor(preprocessor, read_yaml_file(SCHEMA_PATH))
+    native_model = NativeModel.from_bytes(model.get_booster().save_raw("ubj"),
+                                          {"encoder": encoder.to_dict(), "classes": [0, 1]})
+
+    def cached(scoring_model):
+        return CachedModel(model=scoring_model, encoder=encoder, version="v1", last_modified="", loaded_at=0.0)
+
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    known_age = [record for record in records if record["age"] is not None][:500]
+    missing_age = [record for record in records if record["age"] is None][:5]
+    assert missing_age
+
+    # Identical when every number is present
+    native_predictions, native_probabilities = cached(native_model).predict_live(known_age)
+    my_predictions, my_probabilities = cached(MyModel(preprocessor, model)).predict_live(known_age)
+    np.testing.assert_array_equal(native_predictions, my_predictions)
+    np.testing.assert_array_equal(native_probabilities, my_probabilities)
+
+    # MyModel KNN-imputes a missing age; the native model has no imputer and refuses the records
+    assert len(cached(MyModel(preprocessor, model)).predict_live(missing_age)[0]) == len(missing_age)
+    with pytest.raises(ValueError, match="missing number"):
+        cached(native_model).predict_live(known_age[:3] + missing_age)
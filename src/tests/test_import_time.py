@@ -0,0 +1,26 @@
+#Test for the cold-start import path of the serving app: no training stack, and within the time budget
+
+import json
+import os
+import subprocess
+import sys
+
+from src.constants import SERVING_DEFERRED_MODULES, SERVING_IMPORT_TIME_BUDGET_SECONDS
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import app
+print(json.dumps({"seconds": time.perf_counter() - start,
+                  "loaded": [name for name in %r if name in sys.modules]}))
+""" % (SERVING_DEFERRED_MODULES,)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_serving_app_imports_lazily_within_budget():
+    runs = [json.loads(subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], check=True, capture_output=True,
+                                      text=True, cwd=ROOT_DIR).stdout.strip().splitlines()[-1])
+            for _ in range(3)]
+    assert runs[0]["loaded"] == []
+    # The fastest of three runs, so a busy machine does not fail the budget
+    assert min(run["seconds"] for run in runs) < SERVING_IMPORT_TIME_BUDGET_SECONDS
@@ -0,0 +1,103 @@
+#Tests for the bounded inference executor and the micro-batcher: scoring off the event loop, load shedding
+#once it is full, and keeping a bad record from failing the rows batched with it
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from src.constants import AD_INPUT_FEATURE_COLUMNS
+from src.exceptions import InferenceOverloadedError, InvalidRecordError
+from src.pipelines.inference_executor import InferenceExecutor
+from src.pipelines.micro_batcher import MicroBatcher
+from src.pipelines.predict_pipeline import validate_record
+
+
+def test_executor_keeps_the_loop_free_and_sheds_load():
+    release = threading.Event()
+
+    def blocking_score(value):
+        release.wait(5)
+        return value * 2
+
+    async def scenario():
+        executor = InferenceExecutor(max_workers=1, max_pending=2, threads_per_worker=1)
+        executor.start()
+        try:
+            pending = [asyncio.create_task(executor.run(blocking_score, value)) for value in (1, 2)]
+            await asyncio.sleep(0.05)
+            # The loop still runs while the pool is busy, and a third call is rejected at once
+            with pytest.raises(InferenceOverloadedError) as overloaded:
+                await executor.run(blocking_score, 3)
+            assert overloaded.value.retry_after_seconds >= 1
+            release.set()
+            assert await asyncio.gather(*pending) == [2, 4]
+            return executor.get_metrics()
+        finally:
+            executor.stop()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["completed"] == 2 and metrics["rejected"] == 1 and metrics["pending"] == 0
+
+
+def test_micro_batcher_scores_on_the_executor_and_rejects_past_its_queue_limit():
+    scoring_threads = set()
+
+    def score_batch(records):
+        scoring_threads.add(threading.current_thread().name)
+        values = np.array([record["age"] for record in records])
+        return values % 2, values / 100, "v1"
+
+    async def scenario():
+        executor = InferenceExecutor(max_workers=2, max_pending=8, threads_per_worker=1)
+        executor.start()
+        batcher = MicroBatcher(score_batch, max_batch_size=8, max_wait_ms=5, executor=executor, max_queue_size=16)
+        await batcher.start()
+        try:
+            results = await asyncio.gather(*(batcher.submit({"age": age}) for age in range(16)))
+            assert [result.prediction for result in results] == [age % 2 for age in range(16)]
+            # Submissions made before the batcher task runs all sit in the queue: the 17th is shed
+            flood = await asyncio.gather(*(batcher.submit({"age": age}) for age in range(17)), return_exceptions=True)
+            assert sum(isinstance(result, InferenceOverloadedError) for result in flood) == 1
+            return batcher.get_metrics()
+        finally:
+            await batcher.stop()
+            executor.stop()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["rows_scored"] == 32 and metrics["rejected"] == 1
+    assert scoring_threads and all(name.startswith("inference") for name in scoring_threads)
+
+
+def test_a_bad_row_only_fails_its_own_submit():
+    def score_batch(records):
+        values = np.array([float(record["age"]) for record in records])
+        return values % 2, values / 100, "v1"
+
+    async def scenario():
+        executor = InferenceExecutor(max_workers=1, max_pending=8, threads_per_worker=1)
+        executor.start()
+        batcher = MicroBatcher(score_batch, max_batch_size=8, max_wait_ms=20, executor=executor)
+        await batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit({"age": age}) for age in (21, "abc", 30)),
+                                        return_exceptions=True)
+        finally:
+            await batcher.stop()
+            executor.stop()
+
+    good, bad, other_good = asyncio.run(scenario())
+    assert good.prediction == 1 and other_good.prediction == 0
+    assert isinstance(bad, ValueError)
+
+
+def test_records_are_validated_before_they_are_batched():
+    record = {field: "Mobile" for field in AD_INPUT_FEATURE_COLUMNS}
+    assert validate_record({**record, "age": " 25 "})["age"] == 25.0
+    assert validate_record({**record, "age": ""})["age"] is None
+    for bad_age in ("abc", "inf", True, [25]):
+        with pytest.raises(InvalidRecordError):
+            validate_record({**record, "age": bad_age})
+    with pytest.raises(InvalidRecordError, match="missing feature"):
+        validate_record({"age": 25})
@@ -0,0 +1,52 @@
+#Tests for the run report of pipeline stage instrumentation
+
+import json
+
+import numpy as np
+import pytest
+
+from src.entities.artifact_entity import DataTransformationArtifact
+from src.utils.instrumentation import RunReport, instrumented
+
+
+class FakeTrainer:
+    def __init__(self, data_transformation_artifact):
+        self.data_transformation_artifact = data_transformation_artifact
+
+    @instrumented
+    def initiate(self, fail: bool = False):
+        if fail:
+            raise ValueError("boom")
+        return np.ones(10_000_000)
+
+
+def test_run_report_records_stages_calls_and_shapes(tmp_path):
+    features_path = str(tmp_path / "train_features.npy")
+    np.save(features_path, np.zeros((50, 4), dtype=np.float32))
+    artifact = DataTransformationArtifact(transformed_object_file_path="", transformed_train_file_path=features_path,
+                                          transformed_test_file_path="", transformed_train_label_file_path="",
+                                          transformed_test_label_file_path="")
+    trainer = FakeTrainer(artifact)
+    # Without an active report the method runs unmeasured
+    assert trainer.initiate().shape == (10_000_000,)
+
+    report_path = tmp_path / "run_report.json"
+    run_report = RunReport(str(report_path), sample_interval=0.01)
+    with pytest.raises(ValueError):
+        with run_report.activate():
+            with run_report.measure("model_trainer", stage=True) as record:
+                record["cached"] = False
+                trainer.initiate()
+            trainer.initiate(fail=True)
+
+    report = json.loads(report_path.read_text())
+    assert report["status"] == "failed"
+    assert [stage["name"] for stage in report["stages"]] == ["model_trainer"]
+    assert report["stages"][0]["cached"] is False and report["stages"][0]["status"] == "completed"
+
+    completed, failed = report["calls"]
+    assert completed["name"] == "FakeTrainer.initiate" and completed["stage"] == "model_trainer"
+    assert completed["inputs"]["data_transformation_artifact"]["transformed_train_file_path"]["shape"] == [50, 4]
+    # The 80MB array allocated by the call shows in its peak memory
+    assert completed["peak_rss_mb"] - completed["start_rss_mb"] >= 70 and completed["wall_seconds"] > 0
+    assert failed["status"] == "failed" and failed["error"] == "boom" and failed["stage"] is None
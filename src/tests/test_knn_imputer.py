@@ -0,0 +1,22 @@
+#Equivalence test for IndexedKNNImputer against sklearn's KNNImputer
+
+import numpy as np
+from sklearn.impute import KNNImputer
+
+from src.utils.knn_imputer import IndexedKNNImputer
+
+
+def test_matches_knn_imputer_without_distance_ties():
+    # Continuous values, so the k nearest donors are unique; several missing-value patterns, including
+    # donors that are missing more than one value
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 5))
+    X[rng.random(X.shape) < 0.15] = np.nan
+    new_X = rng.normal(size=(300, 5))
+    new_X[rng.random(new_X.shape) < 0.3] = np.nan
+
+    expected = KNNImputer(n_neighbors=5).fit(X)
+    imputer = IndexedKNNImputer(n_neighbors=5, chunk_size=100, n_jobs=2).fit(X)
+
+    np.testing.assert_allclose(imputer.transform(X), expected.transform(X), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(imputer.transform(new_X), expected.transform(new_X), rtol=0, atol=1e-12)
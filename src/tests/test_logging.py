@@ -0,0 +1,77 @@
+#Tests for the logging setup: per-module levels, sampled hot-path messages, JSON output and the non-blocking queue
+
+import io
+import json
+import logging
+import os
+import queue
+from logging.handlers import QueueListener
+
+from src.logging import (JsonFormatter, LogSampler, ModuleLevelFilter, NonBlockingQueueHandler, get_module_name,
+                         parse_module_levels, project_root_path)
+
+
+def make_record(name="root", level=logging.INFO, module_path=os.path.join("src", "pipelines", "predict_pipeline.py"),
+                message="message"):
+    return logging.LogRecord(name, level, os.path.join(project_root_path, module_path), 1, message, None, None)
+
+
+def test_module_levels_apply_to_project_modules_and_named_loggers():
+    module_filter = ModuleLevelFilter(logging.INFO, parse_module_levels("src.pipelines=WARNING, botocore=error"))
+
+    assert get_module_name(make_record()) == "src.pipelines.predict_pipeline"
+    assert not module_filter.filter(make_record())
+    assert module_filter.filter(make_record(level=logging.WARNING))
+    assert not module_filter.filter(make_record(name="botocore.client", level=logging.WARNING))
+    # No matching prefix: the default level applies
+    assert module_filter.filter(make_record(module_path=os.path.join("src", "entities", "model_cache.py")))
+    assert not module_filter.filter(make_record(level=logging.DEBUG, module_path="serve.py"))
+
+
+def test_sampler_logs_one_in_rate_messages_from_the_caller():
+    records = []
+    handler = logging.Handler(level=logging.DEBUG)
+    handler.emit = records.append
+    logger = logging.getLogger()
+    previous_level = logger.level
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    try:
+        sampler = LogSampler(rate=10)
+        for row in range(25):
+            sampler.debug("Scored row %d", row)
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(previous_level)
+
+    assert [record.getMessage() for record in records] == ["Scored row 0", "Scored row 10", "Scored row 20"]
+    assert all(record.sample_rate == 10 and record.pathname == __file__ for record in records)
+
+
+def test_queued_records_are_written_as_json_on_the_listener_thread():
+    stream = io.StringIO()
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(JsonFormatter())
+    queue_handler = NonBlockingQueueHandler(queue.Queue(2))
+    logger = logging.getLogger("test_logging.queue")
+    logger.propagate = False
+    logger.addHandler(queue_handler)
+
+    # The queue is full and nothing drains it: the third record is dropped instead of blocking the caller
+    logger.warning("Scored %d rows", 3, extra={"model_version": "v1"})
+    try:
+        raise ValueError("bad record")
+    except ValueError:
+        logger.exception("Prediction failed")
+    logger.warning("Dropped")
+    assert queue_handler.dropped == 1
+
+    listener = QueueListener(queue_handler.queue, stream_handler)
+    listener.start()
+    listener.stop()
+    logger.removeHandler(queue_handler)
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["message"] == "Scored 3 rows" and first["model_version"] == "v1"
+    assert first["level"] == "WARNING" and first["module"] == "test_logging.queue"
+    assert second["message"] == "Prediction failed" and "ValueError: bad record" in second["exception"]
@@ -0,0 +1,98 @@
+#Tests for hot reloading in the model cache: warm-up before the swap, a failed warm-up keeping the old model, and reuse after fork
+
+import numpy as np
+import pytest
+
+from src.cloud.aws_handler import S3Client
+from src.entities.config_entity import AdPredictorConfig
+from src.entities.model_cache import ModelCache
+from src.exceptions import MyException
+from src.utils.feature_encoder import FeatureEncoder
+
+
+class _FakeModel:
+    accepts_raw_features = False
+
+    def __init__(self, name, broken=False):
+        self.name = name
+        self.broken = broken
+        self.scored_batches = []
+
+    def limit_threads(self, n_threads):
+        pass
+
+    def predict_encoded(self, features):
+        self.scored_batches.append(len(features))
+        probabilities = np.full(len(features), np.nan if self.broken else 0.75)
+        return (probabilities > 0.5).astype(int), probabilities
+
+
+class _FakeEstimator:
+    def __init__(self):
+        self.models = {}
+        self.production = None
+
+    def get_model_metadata(self):
+        return {"version": self.production, "last_modified": f"promoted {self.production}"}
+
+    def load_model(self, version=None):
+        return self.models[version]
+
+
+@pytest.fixture
+def model_cache(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(S3Client, "s3_client", None)
+    monkeypatch.setattr(S3Client, "s3_resource", None)
+    encoder = FeatureEncoder(numeric_columns=[(0, "age", [])],
+                             one_hot_columns=[(1, "gender", "Male"), (2, "gender", "Non-Binary")], n_features=3)
+    monkeypatch.setattr(ModelCache, "_build_encoder", lambda self, model: encoder)
+    model_cache = ModelCache(AdPredictorConfig(model_warmup_batch_size=8))
+    model_cache.estimator = _FakeEstimator()
+    return model_cache
+
+
+def test_reload_warms_up_then_swaps_in_the_promoted_version(model_cache):
+    estimator = model_cache.estimator
+    estimator.models = {"v1": _FakeModel("v1"), "v2": _FakeModel("v2")}
+    estimator.production = "v1"
+
+    first = model_cache.get()
+    assert first.version == "v1" and estimator.models["v1"].scored_batches == [8]
+    assert not model_cache.refresh()
+
+    estimator.production = "v2"
+    assert model_cache.refresh()
+    # The new model was warmed up before serving, and a request holding the old model still scores with it
+    assert estimator.models["v2"].scored_batches == [8]
+    predictions, _ = first.predict_records([{"age": 30, "gender": "Male"}])
+    assert predictions.tolist() == [1] and estimator.models["v1"].scored_batches == [8, 1]
+    assert model_cache.get_status()["version"] == "v2"
+
+    assert model_cache.refresh(force=True)
+    assert estimator.models["v2"].scored_batches == [8, 8]
+
+
+def test_model_failing_warm_up_is_not_swapped_in(model_cache):
+    estimator = model_cache.estimator
+    estimator.models = {"v1": _FakeModel("v1"), "v2": _FakeModel("v2", broken=True)}
+    estimator.production = "v1"
+    model_cache.load()
+
+    estimator.production = "v2"
+    with pytest.raises(MyException):
+        model_cache.refresh()
+    assert model_cache.get().version == "v1"
+
+
+def test_after_fork_keeps_the_model_and_recreates_the_s3_clients(model_cache, monkeypatch):
+    estimator = model_cache.estimator
+    estimator.models = {"v1": _FakeModel("v1")}
+    estimator.production = "v1"
+    cached_model = model_cache.load()
+    monkeypatch.setattr(S3Client, "s3_client", object())
+
+    model_cache.after_fork()
+    assert model_cache.get() is cached_model and model_cache.estimator is not estimator
+    assert S3Client.s3_client is not None and model_cache.estimator.s3.s3_client is S3Client.s3_client
@@ -0,0 +1,186 @@
+#Tests for the versioned model registry and its local model cache against moto's in-memory S3
+
+import json
+import os
+import shutil
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+moto = pytest.importorskip("moto")
+
+from src.cloud.aws_handler import S3Client
+from src.cloud.aws_storage import SimpleStorageService
+from src.entities.model_registry import ModelRegistry
+from src.entities.s3_config import CloudModelEstimator
+from src.exceptions import MyException
+from src.utils.helpers import save_object
+
+BUCKET = "registry-test"
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(S3Client, "s3_client", None)
+    monkeypatch.setattr(S3Client, "s3_resource", None)
+    with moto.mock_aws():
+        storage = SimpleStorageService()
+        storage.metadata_cache.clear()
+        storage.s3_client.create_bucket(Bucket=BUCKET)
+        yield storage
+        storage.metadata_cache.clear()
+
+
+def _publish(registry, tmp_path, model, spec=None):
+    model_path = str(tmp_path / "upload" / f"{model['name']}.pkl")
+    save_object(model_path, model)
+    spec_path = str(tmp_path / "upload" / "model_spec.json")
+    with open(spec_path, "w") as spec_file:
+        json.dump(spec or {"name": model["name"]}, spec_file)
+    return registry.publish_version({"model.pkl": model_path, "model_spec.json": spec_path})
+
+
+def test_promote_and_rollback_switch_the_production_version(storage, tmp_path):
+    registry = ModelRegistry(BUCKET, cache_dir=str(tmp_path / "cache"), s3=storage)
+    assert registry.get_production_version() is None
+
+    first = _publish(registry, tmp_path, {"name": "first"})
+    second = _publish(registry, tmp_path, {"name": "second"})
+    assert registry.list_versions() == sorted([first, second])
+    with pytest.raises(MyException):
+        registry.promote("20200101T000000Z-missing")
+
+    registry.promote(first)
+    manifest = registry.promote(second)
+    assert manifest["production"] == second and manifest["history"] == [first]
+
+    manifest = registry.rollback()
+    assert manifest["production"] == first and manifest["history"] == []
+    with pytest.raises(MyException):
+        registry.rollback()
+
+    # Version files are never rewritten by promotion or rollback
+    assert storage.s3_key_path_available(BUCKET, registry.version_key(second, "model.pkl"))
+
+
+def test_concurrent_manifest_update_is_retried_not_lost(storage, tmp_path):
+    registry = ModelRegistry(BUCKET, cache_dir=str(tmp_path / "cache"), s3=storage)
+    first = _publish(registry, tmp_path, {"name": "first"})
+    second = _publish(registry, tmp_path, {"name": "second"})
+    registry.promote(first)
+
+    # Another process promotes `second` between this process's read and write of the manifest
+    get_manifest = registry.get_manifest
+    other = ModelRegistry(BUCKET, cache_dir=str(tmp_path / "other_cache"), s3=storage)
+    interleaved = []
+
+    def racing_get_manifest():
+        manifest = get_manifest()
+        if not interleaved:
+            interleaved.append(other.promote(second))
+        return manifest
+
+    registry.get_manifest = racing_get_manifest
+    manifest = registry.rollback(to_version=first)
+    assert manifest["production"] == first and manifest["history"] == []
+    assert interleaved[0]["production"] == second
+
+
+def test_restart_and_rollback_load_from_the_local_cache(storage, tmp_path):
+    registry = ModelRegistry(BUCKET, cache_dir=str(tmp_path / "upload_cache"), s3=storage)
+    first = _publish(registry, tmp_path, {"name": "first"})
+    second = _publish(registry, tmp_path, {"name": "second"})
+    registry.promote(first)
+
+    cache_dir = str(tmp_path / "serving_cache")
+    estimator = CloudModelEstimator(BUCKET, "model.pkl", cache_dir=cache_dir)
+    assert estimator.load_model()["name"] == "first"
+    registry.promote(second)
+    assert estimator.get_model_metadata()["version"] == second
+    assert estimator.load_model()["name"] == "second"
+    registry.rollback()
+
+    calls = Counter()
+    storage.s3_client.meta.events.register("before-call.s3.*", lambda model, **kwargs: calls.update([model.name]))
+    restarted = CloudModelEstimator(BUCKET, "model.pkl", cache_dir=cache_dir)
+    assert restarted.load_model()["name"] == "first"
+    assert restarted.load_model(version=second)["name"] == "second"
+    # Only the manifest is read; the model files come from disk
+    assert calls == Counter({"GetObject": 1})
+
+
+def test_least_recently_used_versions_are_evicted(storage, tmp_path):
+    registry = ModelRegistry(BUCKET, cache_dir=str(tmp_path / "cache"), max_cached_versions=1, s3=storage)
+    first = _publish(registry, tmp_path, {"name": "first"}, spec={"classes": [0, 1]})
+    second = _publish(registry, tmp_path, {"name": "second"}, spec={"classes": [0, 1]})
+
+    first_paths = registry.fetch_version(first)
+    second_paths = registry.fetch_version(second)
+    assert not os.path.exists(first_paths["model.pkl"])
+    assert os.path.exists(second_paths["model.pkl"])
+    # Identical files are stored once and survive the eviction of the other version
+    assert first_paths["model_spec.json"] == second_paths["model_spec.json"]
+    assert os.path.exists(second_paths["model_spec.json"])
+
+
+def test_workers_sharing_the_cache_fetch_the_same_version_concurrently(storage, tmp_path):
+    version = _publish(ModelRegistry(BUCKET, cache_dir=str(tmp_path / "upload_cache"), s3=storage),
+                       tmp_path, {"name": "shared"})
+    cache_dir = str(tmp_path / "serving_cache")
+    workers = [ModelRegistry(BUCKET, cache_dir=cache_dir, max_cached_versions=1, s3=storage) for _ in range(4)]
+
+    with ThreadPoolExecutor(len(workers)) as executor:
+        fetched = list(executor.map(lambda worker: worker.fetch_version(version), workers))
+    assert all(paths == fetched[0] for paths in fetched)
+    assert all(os.path.exists(path) for path in fetched[0].values())
+    # Only the objects are left behind, no download, part or state files
+    objects = [os.path.join(directory, name) for directory, _, names in os.walk(os.path.join(cache_dir, "objects"))
+               for name in names]
+    assert sorted(objects) == sorted(fetched[0].values())
+
+
+def test_object_written_by_another_worker_during_the_download_is_kept(storage, tmp_path):
+    registry = ModelRegistry(BUCKET, cache_dir=str(tmp_path / "cache"), s3=storage)
+    version = _publish(registry, tmp_path, {"name": "shared"})
+    download_file = storage.download_file
+
+    def download_and_race(key, bucket_name, file_path):
+        # Another worker finishes first: the object exists by the time this download completes
+        download_file(key, bucket_name, file_path)
+        object_path = file_path.rsplit(".", 2)[0]
+        shutil.copyfile(file_path, object_path)
+
+    storage.download_file = download_and_race
+    paths = registry.fetch_version(version)
+    assert all(os.path.exists(path) for path in paths.values())
+    assert not [name for name in os.listdir(os.path.dirname(paths["model.pkl"])) if name.endswith(".download")]
+
+
+def test_model_pushed_before_the_registry_is_migrated_and_promoted(storage, tmp_path):
+    legacy_path = str(tmp_path / "legacy" / "model.pkl")
+    save_object(legacy_path, {"name": "legacy"})
+    storage.upload_file(legacy_path, to_filename="model.pkl", bucket_name=BUCKET, remove=False)
+
+    estimator = CloudModelEstimator(BUCKET, "model.pkl", cache_dir=str(tmp_path / "cache"))
+    assert estimator.is_model_present("model.pkl")
+    assert estimator.load_model()["name"] == "legacy"
+
+    registry = ModelRegistry(BUCKET, cache_dir=str(tmp_path / "registry_cache"), s3=storage)
+    version = registry.get_production_version()
+    assert estimator.get_model_metadata()["version"] == version
+    assert list(registry.get_version_info(version)["files"]) == ["model.pkl"]
+    # Migrated once: later lookups and a newly pushed model keep using the registry
+    assert registry.bootstrap_from_legacy() == version and registry.list_versions() == [version]
+    newer = _publish(registry, tmp_path, {"name": "newer"})
+    assert registry.promote(newer)["history"] == [version]
+    assert estimator.load_model()["name"] == "newer"
+
+
+def test_empty_bucket_has_no_model_to_migrate(storage, tmp_path):
+    estimator = CloudModelEstimator(BUCKET, "model.pkl", cache_dir=str(tmp_path / "cache"))
+    assert not estimator.is_model_present("model.pkl")
+    with pytest.raises(MyException):
+        estimator.get_model_metadata()
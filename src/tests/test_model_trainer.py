@@ -0,0 +1,42 @@
+#Test for the external-memory training mode of the model trainer against in-memory training
+
+import os
+
+import numpy as np
+
+from src.components.model_trainer import ModelTrainer
+from src.entities.artifact_entity import DataTransformationArtifact
+from src.entities.config_entity import ModelTrainerConfig
+
+
+def test_external_memory_training_matches_in_memory(tmp_path, recwarn):
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(6000, 6)).astype(np.float32)
+    labels = (features[:, 0] - features[:, 2] + rng.normal(scale=0.5, size=6000) > 0).astype(np.uint8)
+    paths = {}
+    for name, array in {"train": features[:5000], "train_labels": labels[:5000],
+                        "test": features[5000:], "test_labels": labels[5000:]}.items():
+        paths[name] = str(tmp_path / f"{name}.npy")
+        np.save(paths[name], array)
+    artifact = DataTransformationArtifact(transformed_object_file_path="", transformed_train_file_path=paths["train"],
+                                          transformed_test_file_path=paths["test"],
+                                          transformed_train_label_file_path=paths["train_labels"],
+                                          transformed_test_label_file_path=paths["test_labels"])
+    x_train, y_train = np.load(paths["train"], mmap_mode="r"), np.load(paths["train_labels"], mmap_mode="r")
+    x_test, y_test = np.load(paths["test"], mmap_mode="r"), np.load(paths["test_labels"], mmap_mode="r")
+
+    metrics = {}
+    for training_mode in ("in_memory", "external_memory"):
+        config = ModelTrainerConfig(training_mode=training_mode, shard_rows=1200, predict_chunk_size=300,
+                                    external_memory_cache_dir=str(tmp_path / "xgb_cache"))
+        trainer = ModelTrainer(artifact, config)
+        trainer.model_hyperparameters["hyperparameters"] = {"n_estimators": 30, "max_depth": 4, "learning_rate": 0.3}
+        model, metrics[training_mode] = trainer.get_model_object_and_report(x_train, y_train, x_test, y_test)
+        assert model.classes_.tolist() == [0, 1] and model.predict_proba(x_test[:3]).shape == (3, 2)
+
+    # The shards are sketched separately, so the histogram bins (and the trees) may differ slightly
+    assert abs(metrics["in_memory"].accuracy - metrics["external_memory"].accuracy) < 0.03
+    assert metrics["external_memory"].accuracy > 0.8
+    assert not os.path.exists(tmp_path / "xgb_cache")
+    # XGBoost warns when the cache directory is removed before it could delete its page files
+    assert not [warning for warning in recwarn if "external memory cache file" in str(warning.message)]
@@ -0,0 +1,35 @@
+#Test for the Optuna model tuner: worker processes sharing one journal study and the best parameters artifact
+
+import numpy as np
+
+from src.components.model_tuner import ModelTuner
+from src.entities.artifact_entity import DataTransformationArtifact
+from src.entities.config_entity import ModelTunerConfig
+from src.utils.helpers import read_yaml_file
+
+
+def test_tuner_runs_trials_across_workers_and_writes_best_params(tmp_path):
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(2000, 5)).astype(np.float32)
+    labels = (features[:, 0] + 0.5 * features[:, 1] + rng.normal(scale=0.5, size=2000) > 0)
+    train_file_path, train_label_file_path = str(tmp_path / "train_features.npy"), str(tmp_path / "train_labels.npy")
+    np.save(train_file_path, features)
+    np.save(train_label_file_path, labels.astype(np.uint8))
+
+    config = ModelTunerConfig(model_tuner_dir=str(tmp_path / "tuner"),
+                              study_storage_file_path=str(tmp_path / "tuner" / "study.journal"),
+                              best_params_file_path=str(tmp_path / "tuner" / "best_params.yaml"),
+                              n_trials=8, n_workers=2, timeout_seconds=300, max_estimators=60,
+                              early_stopping_rounds=5, pruner_startup_trials=2, pruner_warmup_steps=5)
+    artifact = DataTransformationArtifact(transformed_object_file_path="", transformed_train_file_path=train_file_path,
+                                          transformed_test_file_path="", transformed_train_label_file_path=train_label_file_path,
+                                          transformed_test_label_file_path="")
+    tuner_artifact = ModelTuner(artifact, config).initiate_model_tuner()
+
+    assert tuner_artifact.n_complete_trials + tuner_artifact.n_pruned_trials >= 8
+    best_params = read_yaml_file(tuner_artifact.best_params_file_path)
+    hyperparameters = best_params["hyperparameters"]
+    assert 1 <= hyperparameters["n_estimators"] <= 60
+    assert set(hyperparameters) == {"n_estimators", "max_depth", "learning_rate", "subsample", "colsample_bytree",
+                                    "min_child_weight", "reg_lambda"}
+    assert best_params["tuning"]["best_value"] == tuner_artifact.best_value < 0.6
@@ -0,0 +1,66 @@
+#Tests for the batch prediction endpoint: record limit, and 400 for bad requests versus 500 for server-side failures
+
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from src.constants import AD_INPUT_FEATURE_COLUMNS
+from src.exceptions import BatchTooLargeError, InvalidRecordError
+from src.pipelines.predict_pipeline import AdBatchData
+
+RECORD = {**{field: "Mobile" for field in AD_INPUT_FEATURE_COLUMNS}, "age": 30}
+
+
+class _FakeModelCache:
+    def __init__(self, error=None):
+        self.error = error
+
+    def check_records(self, records):
+        if self.error is not None:
+            raise self.error
+
+
+class _InlineExecutor:
+    async def run(self, function, *args):
+        return function(*args)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "inference_executor", _InlineExecutor())
+    monkeypatch.setattr(app, "get_model_cache", lambda config: _FakeModelCache())
+    monkeypatch.setattr(app.prediction_config, "batch_max_records", 3)
+    monkeypatch.setattr(app.AdDataClassifier, "predict_records",
+                        lambda self, records: (np.zeros(len(records), dtype=int), np.full(len(records), 0.25), "v1"))
+    return TestClient(app.app)
+
+
+def test_batch_body_is_validated_and_limited():
+    assert AdBatchData.from_request_body(json.dumps({"records": [RECORD]}).encode()).records[0]["age"] == 30.0
+    with pytest.raises(BatchTooLargeError):
+        AdBatchData.from_request_body("\n".join([json.dumps(RECORD)] * 3).encode(), "application/x-ndjson",
+                                      max_records=2)
+    with pytest.raises(InvalidRecordError, match="Record 1"):
+        AdBatchData([RECORD, {**RECORD, "age": "abc"}])
+    for body in (b"{not json", b"\xff", b"{}", b"[]"):
+        with pytest.raises(InvalidRecordError):
+            AdBatchData.from_request_body(body)
+
+
+def test_batch_route_status_codes(client, monkeypatch):
+    response = client.post("/predict/batch", json=[RECORD, RECORD])
+    assert response.status_code == 200 and response.json()["count"] == 2
+    assert response.headers["X-Model-Version"] == "v1"
+
+    assert client.post("/predict/batch", json=[RECORD] * 4).status_code == 413
+    assert client.post("/predict/batch", content=b"{not json").status_code == 400
+    assert client.post("/predict/batch", json=[RECORD, {"age": 30}]).status_code == 400
+
+    # A model that cannot be loaded is the server's fault, not the client's
+    monkeypatch.setattr(app, "get_model_cache",
+                        lambda config: _FakeModelCache(RuntimeError("Model bucket is unreachable")))
+    response = client.post("/predict/batch", json=[RECORD])
+    assert response.status_code == 500 and "unreachable" in response.json()["error"]
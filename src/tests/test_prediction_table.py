@@ -0,0 +1,60 @@
+#Tests for the precomputed prediction table against live scoring of the same model
+
+import numpy as np
+import pytest
+from xgboost import XGBClassifier
+
+from src.entities.estimator_config import MyModel
+from src.entities.model_cache import CachedModel
+from src.exceptions import MyException
+from src.utils.feature_encoder import FeatureEncoder
+from src.utils.prediction_table import PredictionTable
+
+
+@pytest.fixture
+def cached_model():
+    encoder = FeatureEncoder(numeric_columns=[(0, "age", [("multiply", 1 / 46), ("add", -18 / 46)])],
+                             one_hot_columns=[(1, "gender", "Female"), (2, "gender", "Male"),
+                                              (3, "device_type", "Desktop"), (4, "device_type", "Mobile"),
+                                              (5, "device_type", "Tablet")],
+                             n_features=6)
+    rng = np.random.default_rng(0)
+    records = [{"age": int(rng.integers(18, 65)), "gender": rng.choice(["Female", "Male", None]),
+                "device_type": rng.choice(["Desktop", "Mobile", "Tablet", None])} for _ in range(2000)]
+    features = encoder.encode_records(records)
+    labels = ((features[:, 0] > 0.5) ^ (features[:, 2] > 0) ^ (rng.random(2000) < 0.1)).astype(int)
+    model = MyModel(preprocessing_object=None,
+                    trained_model_object=XGBClassifier(n_estimators=20, max_depth=3).fit(features, labels))
+    return CachedModel(model=model, encoder=encoder, version="v1", last_modified="", loaded_at=0.0)
+
+
+def test_table_lookups_match_the_live_model(cached_model):
+    table = PredictionTable.build(cached_model.encoder, cached_model.model.predict_encoded,
+                                  numeric_ranges={"age": (18, 70)}, chunk_size=100)
+    # 53 ages x (2 genders + missing) x (3 devices + missing)
+    assert table.n_entries == 53 * 3 * 4 and table.probabilities.dtype == np.float32
+    assert table.verify(cached_model.predict_live, n_samples=100, random_state=0) == 0.0
+
+    records = [{"age": 30, "gender": "Male", "device_type": "Mobile"},
+               {"age": "41", "gender": None, "device_type": "Watch"},  # unseen category encodes as missing
+               {"age": 70.0, "gender": "Female", "device_type": ""},
+               {"age": 90, "gender": "Male", "device_type": "Tablet"},  # out of range
+               {"age": 30.5, "gender": "Male", "device_type": "Tablet"}]  # not an integer
+    assert table.index_records(records).tolist()[3:] == [-1, -1]
+
+    with_table = CachedModel(**{**cached_model.__dict__, "prediction_table": table})
+    predictions, probabilities = with_table.predict_records(records)
+    live_predictions, live_probabilities = cached_model.predict_live(records)
+    np.testing.assert_array_equal(predictions, live_predictions)
+    np.testing.assert_array_equal(probabilities, live_probabilities)
+
+
+def test_table_disagreeing_with_the_model_fails_verification(cached_model):
+    table = PredictionTable.build(cached_model.encoder, cached_model.model.predict_encoded,
+                                  numeric_ranges={"age": (18, 70)})
+    table.probabilities = np.roll(table.probabilities, 1)
+    with pytest.raises(ValueError):
+        table.verify(cached_model.predict_live, n_samples=100, random_state=0)
+    with pytest.raises(MyException):
+        PredictionTable.build(cached_model.encoder, cached_model.model.predict_encoded,
+                              numeric_ranges={"age": (18, 70)}, max_entries=100)
@@ -0,0 +1,43 @@
+#Tests for the pluggable class rebalancing strategies
+
+import numpy as np
+import pytest
+
+from src.exceptions import MyException
+from src.utils.rebalancing import rebalance
+
+
+@pytest.fixture
+def imbalanced():
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(1000, 4))
+    labels = (rng.random(1000) < 0.2).astype(int)
+    features[labels == 1] += 2.0
+    return features, labels
+
+
+def test_resampling_strategies_balance_the_classes(imbalanced):
+    features, labels = imbalanced
+    n_positive = int(labels.sum())
+
+    smote_features, smote_labels, weight = rebalance(features, labels, "smote", n_jobs=2, random_state=0)
+    assert weight == 1.0 and smote_labels.sum() == (smote_labels == 0).sum() == len(labels) - n_positive
+    # Synthetic rows are appended after the original ones
+    np.testing.assert_array_equal(smote_features[:len(labels)], features)
+
+    _, under_labels, _ = rebalance(features, labels, "undersample", random_state=0)
+    assert under_labels.sum() == (under_labels == 0).sum() == n_positive
+
+    _, smoteenn_labels, _ = rebalance(features, labels, "smoteenn", random_state=0)
+    assert len(smoteenn_labels) <= 2 * (len(labels) - n_positive)
+
+
+def test_weighting_strategies_keep_the_rows(imbalanced):
+    features, labels = imbalanced
+    n_positive = int(labels.sum())
+
+    same_features, same_labels, weight = rebalance(features, labels, "scale_pos_weight")
+    assert same_features is features and weight == pytest.approx((len(labels) - n_positive) / n_positive)
+    assert rebalance(features, labels, "none")[2] == 1.0
+    with pytest.raises(MyException):
+        rebalance(features, labels, "oversample")
@@ -0,0 +1,117 @@
+#Tests for the parallel, resumable S3 transfers against moto's in-memory S3
+
+import io
+import os
+
+import numpy as np
+import pytest
+
+moto = pytest.importorskip("moto")
+import boto3
+
+from src.cloud.s3_transfer import S3TransferManager
+from src.entities.config_entity import S3TransferConfig
+from src.exceptions import MyException
+
+BUCKET = "transfer-test"
+PART_SIZE = 5 * 1024 * 1024  # smallest part S3 accepts
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _manager(s3_client, max_retries=0):
+    return S3TransferManager(s3_client, S3TransferConfig(multipart_threshold=PART_SIZE, multipart_chunk_size=PART_SIZE,
+                                                         max_concurrency=4, max_retries=max_retries))
+
+
+def _payload(size):
+    return np.random.default_rng(0).integers(0, 256, size=size, dtype=np.uint8).tobytes()
+
+
+def test_buffer_and_stream_round_trip(s3_client):
+    transfer = _manager(s3_client)
+    payload = _payload(3 * PART_SIZE + 123)
+
+    transfer.upload_fileobj(payload, BUCKET, "buffer.bin")
+    transfer.upload_fileobj(io.BytesIO(payload), BUCKET, "stream.bin")
+    transfer.upload_fileobj(b"small", BUCKET, "small.bin")
+
+    assert transfer.download_bytes(BUCKET, "buffer.bin") == payload
+    assert transfer.download_bytes(BUCKET, "stream.bin") == payload
+    assert transfer.download_bytes(BUCKET, "small.bin") == b"small"
+    assert s3_client.head_object(Bucket=BUCKET, Key="buffer.bin")["ETag"].endswith('-4"')
+
+
+def test_interrupted_upload_resumes_missing_parts(s3_client, tmp_path):
+    transfer = _manager(s3_client)
+    payload = _payload(3 * PART_SIZE + 123)
+    file_path = str(tmp_path / "model.bin")
+    with open(file_path, "wb") as file:
+        file.write(payload)
+
+    upload_part = s3_client.upload_part
+    uploaded = []
+
+    def failing_upload_part(**kwargs):
+        if kwargs["PartNumber"] == 3:
+            raise ConnectionError("connection reset")
+        uploaded.append(kwargs["PartNumber"])
+        return upload_part(**kwargs)
+
+    s3_client.upload_part = failing_upload_part
+    with pytest.raises(MyException):
+        transfer.upload_file(file_path, BUCKET, "model.bin")
+    assert os.path.exists(file_path + ".s3upload.json")
+
+    def counting_upload_part(**kwargs):
+        uploaded.append(kwargs["PartNumber"])
+        return upload_part(**kwargs)
+
+    first_attempt = sorted(uploaded)
+    uploaded.clear()
+    s3_client.upload_part = counting_upload_part
+    transfer.upload_file(file_path, BUCKET, "model.bin")
+
+    assert sorted(uploaded) == sorted({1, 2, 3, 4} - set(first_attempt))
+    assert not os.path.exists(file_path + ".s3upload.json")
+    assert transfer.download_bytes(BUCKET, "model.bin") == payload
+
+
+def test_interrupted_download_resumes_missing_ranges(s3_client, tmp_path):
+    transfer = _manager(s3_client)
+    payload = _payload(3 * PART_SIZE + 123)
+    s3_client.put_object(Bucket=BUCKET, Key="model.bin", Body=payload)
+    file_path = str(tmp_path / "model.bin")
+
+    get_object = s3_client.get_object
+    requested = []
+
+    def failing_get_object(**kwargs):
+        if kwargs["Range"].startswith(f"bytes={PART_SIZE}-"):
+            raise ConnectionError("connection reset")
+        requested.append(kwargs["Range"])
+        return get_object(**kwargs)
+
+    s3_client.get_object = failing_get_object
+    with pytest.raises(MyException):
+        transfer.download_file(BUCKET, "model.bin", file_path)
+    assert not os.path.exists(file_path)
+
+    first_attempt = set(requested)
+    requested.clear()
+    s3_client.get_object = lambda **kwargs: requested.append(kwargs["Range"]) or get_object(**kwargs)
+    transfer.download_file(BUCKET, "model.bin", file_path)
+
+    assert f"bytes={PART_SIZE}-{2 * PART_SIZE - 1}" in requested
+    assert not first_attempt & set(requested)
+    with open(file_path, "rb") as file:
+        assert file.read() == payload
+    assert not os.path.exists(file_path + ".s3part.json")
@@ -0,0 +1,59 @@
+#Tests for the content-addressed stage cache of TrainPipeline
+
+import os
+from dataclasses import dataclass
+
+from src.pipelines.stage_cache import StageCache
+
+
+@dataclass
+class _Config:
+    output_file_path: str
+    n_neighbours: int
+
+
+@dataclass
+class _Artifact:
+    output_file_path: str
+
+
+def _write(file_path, content):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as file:
+        file.write(content)
+
+
+def test_stage_is_reused_until_an_input_changes(tmp_path):
+    artifact_root = str(tmp_path / "artifact")
+    cache = StageCache(cache_dir=os.path.join(artifact_root, "stage_cache"), artifact_root=artifact_root)
+    input_file = str(tmp_path / "schema.yaml")
+    _write(input_file, "columns: [age]")
+    runs = []
+
+    def run_stage(run_dir):
+        def run():
+            output_file_path = os.path.join(artifact_root, run_dir, "out.txt")
+            _write(output_file_path, run_dir)
+            runs.append(run_dir)
+            return _Artifact(output_file_path=output_file_path)
+        return run
+
+    def fingerprint(run_dir, n_neighbours=5):
+        # The per-run output path is not part of the fingerprint
+        config = _Config(output_file_path=os.path.join(artifact_root, run_dir, "out.txt"), n_neighbours=n_neighbours)
+        return cache.compute_fingerprint("stage", config=config, input_files=[input_file])
+
+    first = cache.run("stage", fingerprint("run_1"), _Artifact, run_stage("run_1"))
+    second = cache.run("stage", fingerprint("run_2"), _Artifact, run_stage("run_2"))
+    assert runs == ["run_1"] and second == first
+
+    cache.run("stage", fingerprint("run_3", n_neighbours=3), _Artifact, run_stage("run_3"))
+    _write(input_file, "columns: [age, gender]")
+    cache.run("stage", fingerprint("run_4"), _Artifact, run_stage("run_4"))
+    assert runs == ["run_1", "run_3", "run_4"]
+
+    # A recorded artifact whose file was overwritten is not reused
+    _write(first.output_file_path, "changed")
+    _write(input_file, "columns: [age]")
+    cache.run("stage", fingerprint("run_5"), _Artifact, run_stage("run_5"))
+    assert runs[-1] == "run_5"
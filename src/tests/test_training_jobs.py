@@ -0,0 +1,74 @@
+#Tests for background training jobs; the fake pipelines run in the spawned training process
+
+import time
+
+from src.pipelines.training_jobs import TrainingJobManager
+
+
+def _fake_pipeline(stage_callback):
+    for stage_name in ("data_ingestion", "data_validation"):
+        stage_callback(stage_name, "running", {})
+        time.sleep(0.5)
+        stage_callback(stage_name, "completed", {"duration_seconds": 0.5, "cached": False})
+    stage_callback("model_pusher", "skipped", {"reason": "model not accepted"})
+    return {"model_accepted": False, "model_version": None}
+
+
+def _tuning_pipeline(stage_callback):
+    for stage_name in ("data_ingestion", "data_validation", "data_transformation", "model_tuner"):
+        stage_callback(stage_name, "running", {})
+        stage_callback(stage_name, "completed", {"duration_seconds": 0.0, "cached": False})
+    return {"model_accepted": False, "model_version": None}
+
+
+def _failing_pipeline(stage_callback):
+    stage_callback("data_ingestion", "running", {})
+    raise ValueError("collection is empty")
+
+
+def test_job_runs_in_background_and_reports_stages(tmp_path):
+    manager = TrainingJobManager(jobs_dir=str(tmp_path), target=_fake_pipeline, niceness=0, model_tuning_enabled=False)
+
+    start = time.perf_counter()
+    job, created = manager.submit()
+    assert created and time.perf_counter() - start < 1.0
+    assert job["state"] == "queued"
+
+    # A second request while the first job is active gets the running job back
+    duplicate, created = manager.submit()
+    assert not created and duplicate["job_id"] == job["job_id"]
+
+    status = manager.wait(job["job_id"], timeout=120, poll_interval=0.1)
+    assert status["state"] == "succeeded", status
+    assert status["result"] == {"model_accepted": False, "model_version": None}
+    stages = {stage["name"]: stage for stage in status["stages"]}
+    assert stages["data_ingestion"]["state"] == "completed" and stages["data_ingestion"]["duration_seconds"] == 0.5
+    assert stages["model_pusher"]["state"] == "skipped"
+    assert stages["model_trainer"]["state"] == "pending"
+    assert status["progress"] == "3/6" and status["duration_seconds"] >= 1.0
+
+    # Another process's manager sees the same job
+    assert TrainingJobManager(jobs_dir=str(tmp_path)).get_status(job["job_id"])["state"] == "succeeded"
+    assert manager.get_status("0" * 32) is None and manager.get_status("../etc") is None
+
+
+def test_failed_job_records_the_error_and_frees_the_slot(tmp_path):
+    manager = TrainingJobManager(jobs_dir=str(tmp_path), target=_failing_pipeline, niceness=0)
+    job, _ = manager.submit()
+    status = manager.wait(job["job_id"], timeout=120, poll_interval=0.1)
+    assert status["state"] == "failed" and "collection is empty" in status["error"]
+
+    next_job, created = manager.submit()
+    assert created and next_job["job_id"] != job["job_id"]
+    manager.wait(next_job["job_id"], timeout=120, poll_interval=0.1)
+
+
+def test_tuning_stage_is_listed_before_the_trainer_from_the_start(tmp_path):
+    manager = TrainingJobManager(jobs_dir=str(tmp_path), target=_tuning_pipeline, niceness=0, model_tuning_enabled=True)
+    job, _ = manager.submit()
+    assert job["progress"] == "0/7"
+    assert [stage["name"] for stage in job["stages"]][3:5] == ["model_tuner", "model_trainer"]
+
+    status = manager.wait(job["job_id"], timeout=120, poll_interval=0.1)
+    assert status["state"] == "succeeded", status
+    assert status["progress"] == "4/7" and len(status["stages"]) == 7
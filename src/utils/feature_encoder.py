@@ -0,0 +1,222 @@
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.exceptions import MyException
+
+
+def _to_float(value) -> float:
+    if value is None or value == "":
+        return np.nan
+    return float(value)
+
+
+def _is_missing(value) -> bool:
+    return value is None or value == "" or (isinstance(value, float) and np.isnan(value))
+
+
+class FeatureEncoder:
+    """
+    Encodes raw ad fields (age, gender, device_type, ...) straight into the model's input matrix.
+
+    The layout and the scaling constants are read once from the fitted ColumnTransformer, so the
+    online path needs neither pandas nor the sklearn transform dispatch. Scaling is done in float64
+    with the same operation order as the sklearn scalers and then cast to float32, which is the
+    precision XGBoost scores in, so results match MyModel.predict exactly.
+
+    The fitted column-dropping and one-hot steps of the preprocessing pipeline are reproduced too.
+    KNN imputation is not: a missing number is passed to XGBoost as NaN, so records with a missing
+    number should go through MyModel when it has the fitted imputer (see has_missing_numbers).
+    """
+
+    def __init__(self, numeric_columns: List[Tuple[int, str, list]], one_hot_columns: List[Tuple[int, str, str]],
+                 n_features: int):
+        """
+        :param numeric_columns: (output index, raw field, scaling steps) for every numeric output column
+        :param one_hot_columns: (output index, raw field, category) for every one-hot output column
+        :param n_features: Number of columns the model expects
+        """
+        self.numeric_columns = numeric_columns
+        self.one_hot_columns = one_hot_columns
+        self.n_features = n_features
+        self.numeric_fields = sorted({field for _, field, _ in numeric_columns})
+        self.categorical_fields = sorted({field for _, field, _ in one_hot_columns})
+
+
+    @staticmethod
+    def _get_column_transformer(preprocessing_object):
+        from sklearn.compose import ColumnTransformer
+        from sklearn.pipeline import Pipeline
+        from src.utils.transformation_utils import DropColumns, EncodeCategoricalFeatures, FillNaAndKNNImpute
+
+        if isinstance(preprocessing_object, Pipeline):
+            transformers = [step for _, step in preprocessing_object.steps if step != "passthrough"]
+            # Steps on raw columns are reproduced by encode_records (imputation excepted, see the class docstring)
+            raw_steps = [step for step in transformers[:-1]
+                         if not isinstance(step, (DropColumns, FillNaAndKNNImpute, EncodeCategoricalFeatures))]
+            if not transformers or raw_steps:
+                raise ValueError("Fast-path encoding needs a pipeline ending in a single ColumnTransformer step")
+            preprocessing_object = transformers[-1]
+        if not isinstance(preprocessing_object, ColumnTransformer):
+            raise ValueError(f"Unsupported preprocessing object: {type(preprocessing_object).__name__}")
+        return preprocessing_object
+
+
+    @staticmethod
+    def _get_column_names(column_transformer, columns) -> List[str]:
+        feature_names_in = list(column_transformer.feature_names_in_)
+        if isinstance(columns, slice):
+            return feature_names_in[columns]
+        columns = list(columns)
+        if columns and isinstance(columns[0], (bool, np.bool_)):
+            return [name for name, keep in zip(feature_names_in, columns) if keep]
+        return [feature_names_in[column] if isinstance(column, (int, np.integer)) else column
+                for column in columns]
+
+
+    @staticmethod
+    def _get_scaling_steps(transformer, index: int) -> list:
+        from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+        if isinstance(transformer, StandardScaler):
+            steps = []
+            if transformer.with_mean:
+                steps.append(("subtract", float(transformer.mean_[index])))
+            if transformer.with_std:
+                steps.append(("divide", float(transformer.scale_[index])))
+            return steps
+        if isinstance(transformer, MinMaxScaler):
+            steps = [("multiply", float(transformer.scale_[index])), ("add", float(transformer.min_[index]))]
+            if transformer.clip:
+                steps.append(("clip", tuple(float(bound) for bound in transformer.feature_range)))
+            return steps
+        raise ValueError(f"Unsupported transformer for fast-path encoding: {type(transformer).__name__}")
+
+
+    @classmethod
+    def from_preprocessor(cls, preprocessing_object, schema_config: dict) -> "FeatureEncoder":
+        """
+        Builds the encoder from the fitted preprocessing object and the schema's categorical columns
+        """
+        from sklearn.preprocessing import FunctionTransformer
+
+        try:
+            column_transformer = cls._get_column_transformer(preprocessing_object)
+            categorical_fields = sorted(schema_config["categorical_columns"], key=len, reverse=True)
+
+            numeric_columns, one_hot_columns = [], []
+            for name, transformer, columns in column_transformer.transformers_:
+                if transformer == "drop":
+                    continue
+                output_slice = column_transformer.output_indices_[name]
+                column_names = cls._get_column_names(column_transformer, columns)
+                is_passthrough = transformer == "passthrough" or (
+                    isinstance(transformer, FunctionTransformer) and transformer.func is None)
+
+                for offset, column in enumerate(column_names):
+                    output_index = output_slice.start + offset
+                    if not is_passthrough:
+                        numeric_columns.append((output_index, column, cls._get_scaling_steps(transformer, offset)))
+                        continue
+                    field = next((field for field in categorical_fields if column.startswith(f"{field}_")), None)
+                    if field is None:
+                        numeric_columns.append((output_index, column, []))
+                    else:
+                        one_hot_columns.append((output_index, field, column[len(field) + 1:]))
+
+            n_features = max(output_slice.stop for output_slice in column_transformer.output_indices_.values())
+            return cls(numeric_columns=numeric_columns, one_hot_columns=one_hot_columns, n_features=n_features)
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def to_dict(self) -> dict:
+        """
+        Returns a JSON-serialisable description of the encoder
+        """
+        return {
+            "n_features": self.n_features,
+            "numeric_columns": [{"index": index, "field": field, "steps": [list(step) for step in steps]}
+                                for index, field, steps in self.numeric_columns],
+            "one_hot_columns": [{"index": index, "field": field, "category": category}
+                                for index, field, category in self.one_hot_columns],
+        }
+
+
+    @classmethod
+    def from_dict(cls, encoder_dict: dict) -> "FeatureEncoder":
+        """
+        Rebuilds the encoder from the output of to_dict, without sklearn
+        """
+        try:
+            return cls(numeric_columns=[(column["index"], column["field"],
+                                         [(step[0], tuple(step[1]) if isinstance(step[1], list) else step[1])
+                                          for step in column["steps"]])
+                                        for column in encoder_dict["numeric_columns"]],
+                       one_hot_columns=[(column["index"], column["field"], column["category"])
+                                        for column in encoder_dict["one_hot_columns"]],
+                       n_features=encoder_dict["n_features"])
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    @staticmethod
+    def _apply_scaling_steps(values: np.ndarray, steps: list) -> np.ndarray:
+        for operation, operand in steps:
+            if operation == "subtract":
+                values -= operand
+            elif operation == "divide":
+                values /= operand
+            elif operation == "multiply":
+                values *= operand
+            elif operation == "add":
+                values += operand
+            else:
+                np.clip(values, operand[0], operand[1], out=values)
+        return values
+
+
+    def has_missing_numbers(self, records: List[Dict]) -> bool:
+        """
+        Returns True if any record lacks a value for a numeric field
+        """
+        return any(_is_missing(record.get(field)) for record in records for field in self.numeric_fields)
+
+
+    def encode_columns(self, numeric_values: Dict[str, np.ndarray], categorical_values: Dict[str, np.ndarray],
+                       n_rows: int) -> np.ndarray:
+        """
+        Encodes columns of raw values into a preallocated (n_rows, n_features) float32 matrix.
+        :param numeric_values: float64 array per numeric field, NaN where missing
+        :param categorical_values: object array per categorical field, None where missing
+        """
+        try:
+            features = np.zeros((n_rows, self.n_features), dtype=np.float32)
+            for output_index, field, steps in self.numeric_columns:
+                features[:, output_index] = self._apply_scaling_steps(numeric_values[field].copy(), steps)
+            for output_index, field, category in self.one_hot_columns:
+                features[:, output_index] = categorical_values[field] == category
+            return features
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def encode_records(self, records: List[Dict]) -> np.ndarray:
+        """
+        Encodes raw records into a preallocated (n_records, n_features) float32 matrix.
+        A missing or unseen category encodes as all zeros, as in training, and a missing number as NaN.
+        """
+        try:
+            numeric_values = {field: np.array([_to_float(record.get(field)) for record in records], dtype=np.float64)
+                              for field in self.numeric_fields}
+            categorical_values = {field: np.array([None if _is_missing(record.get(field)) else str(record.get(field))
+                                                   for record in records], dtype=object)
+                                  for field in self.categorical_fields}
+            return self.encode_columns(numeric_values, categorical_values, len(records))
+
+        except Exception as e:
+            raise MyException(e, sys) from e
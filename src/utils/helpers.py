@@ -1,3 +1,4 @@
+import hashlib
 import os
 import sys
 import pandas as pd
@@ -10,12 +11,105 @@ from pandas import DataFrame
 from src.exceptions import MyException
 from src.logging import logging
 
+FILE_HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def get_data_format(file_path: str) -> str:
+    """
+    Returns the artifact format of a data file from its extension: parquet, feather (Arrow IPC) or csv
+    """
+    extension = os.path.splitext(file_path)[1].lower().lstrip(".")
+    if extension in ("parquet", "pq"):
+        return "parquet"
+    if extension in ("feather", "arrow", "ipc"):
+        return "feather"
+    return "csv"
+
 
 def read_data(file_path) -> pd.DataFrame:
     try:
+        data_format = get_data_format(file_path)
+        if data_format == "parquet":
+            return pd.read_parquet(file_path)
+        if data_format == "feather":
+            return pd.read_feather(file_path)
         return pd.read_csv(file_path)
     except Exception as e:
         raise MyException(e, sys)
+
+
+def write_data(df: pd.DataFrame, file_path: str) -> None:
+    """
+    Writes a DataFrame in the format given by the file extension, keeping dtypes
+    (category columns are stored dictionary-encoded) for parquet and feather
+    file_path: str location of file to write
+    """
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        data_format = get_data_format(file_path)
+        if data_format == "parquet":
+            df.to_parquet(file_path, index=False)
+        elif data_format == "feather":
+            df.reset_index(drop=True).to_feather(file_path)
+        else:
+            df.to_csv(file_path, index=False, header=True)
+    except Exception as e:
+        raise MyException(e, sys) from e
+
+
+class ChunkedDataWriter:
+    """
+    Appends DataFrame chunks to a single data file, so a large table never has to be held in memory.
+    The first chunk fixes the schema; later chunks are cast to it.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.data_format = get_data_format(file_path)
+        self._writer = None
+        self._schema = None
+        self._n_chunks = 0
+
+    def write(self, df: pd.DataFrame) -> None:
+        try:
+            if self.data_format == "csv":
+                if self._n_chunks == 0:
+                    os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+                df.to_csv(self.file_path, mode="w" if self._n_chunks == 0 else "a",
+                          index=False, header=self._n_chunks == 0)
+            else:
+                import pyarrow as pa
+
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if self._writer is None:
+                    os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+                    if self.data_format == "parquet":
+                        import pyarrow.parquet as pq
+                        self._schema = table.schema
+                        self._writer = pq.ParquetWriter(self.file_path, self._schema)
+                    else:
+                        # Arrow IPC files allow one dictionary per column, so chunks store categories as plain values
+                        self._schema = pa.schema([pa.field(field.name, field.type.value_type)
+                                                  if pa.types.is_dictionary(field.type) else field
+                                                  for field in table.schema])
+                        self._writer = pa.ipc.new_file(self.file_path, self._schema)
+                elif not table.schema.equals(self._schema, check_metadata=False):
+                    table = table.cast(self._schema)
+                self._writer.write_table(table)
+            self._n_chunks += 1
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> "ChunkedDataWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
     
 
 def read_yaml_file(file_path: str) -> dict:
@@ -67,13 +161,16 @@ def save_numpy_array_data(file_path: str, array: np.array):
         raise MyException(e, sys) from e
 
 
-def load_numpy_array_data(file_path: str) -> np.array:
+def load_numpy_array_data(file_path: str, mmap_mode: str = None) -> np.array:
     """
     load numpy array data from file
     file_path: str location of file to load
+    mmap_mode: "r" to map the file instead of reading it, so pages are loaded on access
     return: np.array data loaded
     """
     try:
+        if mmap_mode is not None:
+            return np.load(file_path, mmap_mode=mmap_mode)
         with open(file_path, 'rb') as file_obj:
             return np.load(file_obj)
     except Exception as e:
@@ -94,6 +191,18 @@ def save_object(file_path: str, obj: object) -> None:
         raise MyException(e, sys) from e
 
 
+def hash_file(file_path: str) -> str:
+    """
+    Returns the sha256 of a file's content, read in chunks
+    file_path: str location of file to hash
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(FILE_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 # def drop_columns(df: DataFrame, cols: list)-> DataFrame:
 
 #     """
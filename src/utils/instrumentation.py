@@ -0,0 +1,227 @@
+import dataclasses
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+import numpy as np
+import psutil
+
+from src.logging import logging
+from src.utils.helpers import get_data_format
+
+# Report of the running pipeline; instrumented methods only measure while one is active
+_active_report: ContextVar[Optional["RunReport"]] = ContextVar("active_run_report", default=None)
+# Names of the enclosing pipeline stage and instrumented call
+_current_stage: ContextVar[Optional[str]] = ContextVar("current_stage", default=None)
+_current_call: ContextVar[Optional[str]] = ContextVar("current_call", default=None)
+
+
+def describe_file(file_path: str) -> Optional[dict]:
+    """
+    Returns the size and, where the format stores it, the shape of a data file, without reading its data
+    """
+    if not isinstance(file_path, str) or not os.path.isfile(file_path):
+        return None
+    description = {"bytes": os.path.getsize(file_path)}
+    try:
+        if file_path.endswith(".npy"):
+            array = np.load(file_path, mmap_mode="r")
+            description.update(shape=list(array.shape), dtype=str(array.dtype))
+        elif get_data_format(file_path) == "parquet":
+            import pyarrow.parquet as pq
+            metadata = pq.read_metadata(file_path)
+            description.update(rows=metadata.num_rows, columns=metadata.num_columns)
+        elif get_data_format(file_path) == "feather":
+            import pyarrow as pa
+            with pa.memory_map(file_path) as source:
+                reader = pa.ipc.open_file(source)
+                rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+                description.update(rows=rows, columns=len(reader.schema))
+    except Exception:
+        logging.debug(f"Could not read the shape of {file_path}", exc_info=True)
+    return description
+
+
+def describe_artifact(artifact) -> Optional[dict]:
+    """
+    Describes the data files an artifact points to, keyed by field name
+    """
+    if not dataclasses.is_dataclass(artifact) or isinstance(artifact, type):
+        return None
+    files = {}
+    for field in dataclasses.fields(artifact):
+        description = describe_file(getattr(artifact, field.name))
+        if description is not None:
+            files[field.name] = description
+    return files
+
+
+class _PeakRSSSampler:
+    # Samples the resident memory of this process and its children (e.g. tuning workers) in a thread
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = self._rss()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _rss(self) -> int:
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+
+    def __enter__(self) -> "_PeakRSSSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop_event.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+def _cpu_seconds() -> float:
+    # This process's threads plus children that have exited
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class RunReport:
+    """
+    Wall time, CPU time, peak resident memory and the shapes of the input and output artifacts of every
+    stage and instrumented call of a pipeline run, written as JSON to report_path.
+
+    Peak memory is sampled every sample_interval seconds and covers child processes; CPU time includes
+    child processes once they have exited.
+    """
+
+    def __init__(self, report_path: str, sample_interval: float = 0.05):
+        """
+        :param report_path: Where the JSON report is written
+        :param sample_interval: Seconds between two resident memory samples
+        """
+        self.report_path = report_path
+        self.sample_interval = sample_interval
+        self.stages: List[dict] = []
+        self.calls: List[dict] = []
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = _cpu_seconds()
+        self._peak_rss = psutil.Process().memory_info().rss
+
+
+    @contextmanager
+    def activate(self):
+        """
+        Makes this the report instrumented methods record into, and writes it on exit
+        """
+        token = _active_report.set(self)
+        status = "failed"
+        try:
+            yield self
+            status = "succeeded"
+        finally:
+            _active_report.reset(token)
+            self.write(status)
+
+
+    @contextmanager
+    def measure(self, name: str, stage: bool = False, inputs: dict = None):
+        """
+        Measures the block; yields the record, which the block can add fields to (e.g. "outputs" or "status")
+        """
+        context_var = _current_stage if stage else _current_call
+        record = {"name": name}
+        if not stage:
+            record.update(stage=_current_stage.get(), parent=_current_call.get())
+        if inputs:
+            record["inputs"] = inputs
+        token = context_var.set(name)
+        start_wall, start_cpu = time.perf_counter(), _cpu_seconds()
+        sampler = _PeakRSSSampler(self.sample_interval)
+        start_rss = sampler.peak
+        try:
+            with sampler:
+                yield record
+            record.setdefault("status", "completed")
+        except BaseException as e:
+            record.update(status="failed", error=str(e))
+            raise
+        finally:
+            context_var.reset(token)
+            record.update(wall_seconds=time.perf_counter() - start_wall, cpu_seconds=_cpu_seconds() - start_cpu,
+                          start_rss_mb=start_rss / 2 ** 20, peak_rss_mb=sampler.peak / 2 ** 20)
+            self._peak_rss = max(self._peak_rss, sampler.peak)
+            (self.stages if stage else self.calls).append(record)
+
+
+    def to_dict(self, status: str = "running") -> dict:
+        return {"status": status,
+                "started_at": self.started_at,
+                "wall_seconds": time.perf_counter() - self._start_wall,
+                "cpu_seconds": _cpu_seconds() - self._start_cpu,
+                "peak_rss_mb": self._peak_rss / 2 ** 20,
+                "stages": self.stages,
+                "calls": self.calls}
+
+
+    def write(self, status: str = "running") -> None:
+        """
+        Writes the report atomically
+        """
+        try:
+            os.makedirs(os.path.dirname(self.report_path) or ".", exist_ok=True)
+            tmp_path = f"{self.report_path}.tmp"
+            with open(tmp_path, "w") as report_file:
+                json.dump(self.to_dict(status), report_file, indent=4, default=str)
+            os.replace(tmp_path, self.report_path)
+        except Exception:
+            logging.warning(f"Could not write the run report to {self.report_path}", exc_info=True)
+
+
+def get_active_report() -> Optional[RunReport]:
+    """
+    Returns the report of the running pipeline, if any
+    """
+    return _active_report.get()
+
+
+def instrumented(method: Callable) -> Callable:
+    """
+    Records the method in the active run report with the shapes of the artifacts it receives
+    (as arguments or as *_artifact attributes of its instance) and of the artifact it returns
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        report = _active_report.get()
+        if report is None:
+            return method(*args, **kwargs)
+
+        inputs = {}
+        if args and hasattr(args[0], "__dict__"):
+            inputs.update({name: value for name, value in vars(args[0]).items() if name.endswith("_artifact")})
+        inputs.update({name: value for name, value in kwargs.items() if dataclasses.is_dataclass(value)})
+        inputs = {name: describe_artifact(value) for name, value in inputs.items() if describe_artifact(value)}
+
+        with report.measure(method.__qualname__, inputs=inputs) as record:
+            result = method(*args, **kwargs)
+            outputs = describe_artifact(result)
+            if outputs:
+                record["outputs"] = outputs
+            return result
+
+    return wrapper
@@ -0,0 +1,197 @@
+import sys
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.metrics.pairwise import nan_euclidean_distances
+from sklearn.neighbors import KDTree
+
+from src.exceptions import MyException
+from src.logging import logging
+
+
+class IndexedKNNImputer(TransformerMixin, BaseEstimator):
+    """
+    Drop-in replacement for sklearn's KNNImputer (uniform weights, nan_euclidean distance) that
+    scales to millions of rows.
+
+    KNNImputer computes the full receivers x donors distance matrix. Here rows are grouped by their
+    missing-value pattern; for each pattern and each missing column a KDTree is built over the donors
+    that are complete on the pattern's observed columns, and receivers query it in chunks, in parallel.
+    Duplicate donors and duplicate receivers (the norm with categorical codes) are collapsed first, so
+    the work grows with the number of distinct rows rather than with their count.
+    Donors that are themselves missing some of those columns (rare: they need two or more missing
+    values) are compared by brute force with the same nan_euclidean distance and merged with the tree
+    results, so the k nearest donors are the same set KNNImputer would consider.
+
+    Tolerance versus KNNImputer: when the k-th nearest donor distance is unique the imputed value is
+    identical up to float rounding of the mean (max abs difference ~1e-15 on continuous data). When
+    several donors tie at the k-th distance, which is the norm with integer-coded categoricals, both
+    implementations pick an arbitrary subset of the tied donors. On the ad click dataset the imputed
+    age then differs from KNNImputer by 3.8 years on average, the same as KNNImputer differs from
+    itself when the rows are shuffled (3.7 years); see benchmarks/bench_knn_imputer.py. Receivers
+    with fewer than k donors at a finite distance are imputed from the finite ones only (KNNImputer
+    pads with NaN-distance donors).
+    """
+
+    def __init__(self, n_neighbors: int = 5, chunk_size: int = 10_000, n_jobs: Optional[int] = None,
+                 leaf_size: int = 40):
+        """
+        :param n_neighbors: Number of donors averaged for each missing value
+        :param chunk_size: Number of distinct receivers queried per task
+        :param n_jobs: Number of threads used to query chunks (-1 for all cores)
+        :param leaf_size: Leaf size of the KD trees
+        """
+        self.n_neighbors = n_neighbors
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+        self.leaf_size = leaf_size
+
+
+    def fit(self, X, y=None) -> "IndexedKNNImputer":
+        try:
+            self._fit_X = np.array(X, dtype=np.float64)
+            self._mask_fit_X = np.isnan(self._fit_X)
+            observed = ~self._mask_fit_X
+            with np.errstate(invalid="ignore", divide="ignore"):
+                self._column_means = (np.where(observed, self._fit_X, 0.0).sum(axis=0)
+                                      / observed.sum(axis=0))
+            self._trees: Dict[Tuple[tuple, int], tuple] = {}
+            self.n_features_in_ = self._fit_X.shape[1]
+            return self
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    def __getstate__(self):
+        # Trees are rebuilt lazily from the fitted data, so they are not pickled
+        state = self.__dict__.copy()
+        state["_trees"] = {}
+        return state
+
+
+    def _get_donors(self, observed_columns: tuple, column: int) -> tuple:
+        key = (observed_columns, column)
+        if key not in self._trees:
+            has_column = ~self._mask_fit_X[:, column]
+            missing_observed = self._mask_fit_X[:, list(observed_columns)]
+            complete = np.flatnonzero(has_column & ~missing_observed.any(axis=1))
+            # Donors missing only some of the observed columns still have a finite nan_euclidean distance
+            partial = np.flatnonzero(has_column & missing_observed.any(axis=1) & ~missing_observed.all(axis=1))
+
+            # Complete donors are indexed by their distinct coordinates: with categorical codes most donors
+            # are exact duplicates, and a tree over the duplicates would visit every one of them. Each
+            # distinct point keeps its donors' values contiguous, with prefix sums to average any first m.
+            tree = counts = offsets = value_sums = None
+            if len(complete):
+                points, group = np.unique(self._fit_X[np.ix_(complete, list(observed_columns))], axis=0,
+                                          return_inverse=True)
+                group = group.ravel()
+                values = self._fit_X[complete[np.argsort(group, kind="stable")], column]
+                counts = np.bincount(group, minlength=len(points))
+                offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+                value_sums = np.concatenate(([0.0], np.cumsum(values)))
+                tree = KDTree(points, leaf_size=self.leaf_size)
+            self._trees[key] = (tree, counts, offsets, value_sums, partial, int(has_column.sum()))
+        return self._trees[key]
+
+
+    def _impute_chunk(self, points: np.ndarray, observed_columns: tuple, column: int) -> np.ndarray:
+        tree, counts, offsets, value_sums, partial, n_donors = self._get_donors(observed_columns, column)
+        if tree is None and not len(partial):
+            return np.full(len(points), self._column_means[column])
+        n_neighbors = min(self.n_neighbors, n_donors)
+        n_features = self._fit_X.shape[1]
+
+        # Candidates: the nearest distinct complete points (each standing for `count` donors) and the
+        # nearest partial donors, ordered by distance and taken until n_neighbors donors are reached
+        distances, candidate_counts = [], []
+        if tree is not None:
+            tree_distances, tree_groups = tree.query(points, k=min(n_neighbors, len(counts)))
+            # Same scaling as nan_euclidean: sqrt(n_features / n_present * squared distance)
+            distances.append(tree_distances * np.sqrt(n_features / len(observed_columns)))
+            candidate_counts.append(counts[tree_groups])
+        if len(partial):
+            receivers = np.full((len(points), n_features), np.nan)
+            receivers[:, list(observed_columns)] = points
+            partial_distances = nan_euclidean_distances(receivers, self._fit_X[partial])
+            partial_distances = np.where(np.isnan(partial_distances), np.inf, partial_distances)
+            partial_donors = np.broadcast_to(partial, partial_distances.shape)
+            if partial_distances.shape[1] > n_neighbors:
+                nearest = np.argpartition(partial_distances, n_neighbors - 1, axis=1)[:, :n_neighbors]
+                partial_distances = np.take_along_axis(partial_distances, nearest, axis=1)
+                partial_donors = np.take_along_axis(partial_donors, nearest, axis=1)
+            distances.append(partial_distances)
+            candidate_counts.append(np.where(np.isfinite(partial_distances), 1, 0))
+
+        distances, candidate_counts = np.hstack(distances), np.hstack(candidate_counts)
+        order = np.argsort(distances, axis=1, kind="stable")
+        sorted_counts = np.take_along_axis(candidate_counts, order, axis=1)
+        taken_before = np.cumsum(sorted_counts, axis=1) - sorted_counts
+        taken = np.empty_like(sorted_counts)
+        np.put_along_axis(taken, order, np.clip(n_neighbors - taken_before, 0, sorted_counts), axis=1)
+
+        n_tree = 0
+        imputed_sums = np.zeros(len(points))
+        if tree is not None:
+            n_tree = tree_groups.shape[1]
+            starts = offsets[tree_groups]
+            imputed_sums += (value_sums[starts + taken[:, :n_tree]] - value_sums[starts]).sum(axis=1)
+        if len(partial):
+            imputed_sums += (self._fit_X[partial_donors, column] * taken[:, n_tree:]).sum(axis=1)
+
+        n_taken = taken.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            imputed = imputed_sums / n_taken
+        return np.where(n_taken > 0, imputed, self._column_means[column])
+
+
+    def transform(self, X) -> np.ndarray:
+        try:
+            X = np.array(X, dtype=np.float64)
+            mask = np.isnan(X)
+            imputed_X = X.copy()
+            rows_with_missing = np.flatnonzero(mask.any(axis=1))
+            if len(rows_with_missing) == 0:
+                return imputed_X
+
+            patterns, pattern_index = np.unique(mask[rows_with_missing], axis=0, return_inverse=True)
+            pattern_index = pattern_index.ravel()
+            tasks = []
+            receiver_groups = []
+            for pattern_number, pattern in enumerate(patterns):
+                rows = rows_with_missing[pattern_index == pattern_number]
+                observed_columns = tuple(np.flatnonzero(~pattern).tolist())
+                if not observed_columns:
+                    imputed_X[np.ix_(rows, np.flatnonzero(pattern))] = self._column_means[pattern]
+                    continue
+                # Receivers with the same observed values get the same donors, so each is queried once
+                points, point_index = np.unique(X[np.ix_(rows, list(observed_columns))], axis=0,
+                                                return_inverse=True)
+                receiver_groups.append((rows, point_index.ravel(), points, observed_columns, np.flatnonzero(pattern)))
+
+            tasks = []
+            for group_number, (_, _, points, observed_columns, columns) in enumerate(receiver_groups):
+                for column in columns:
+                    self._get_donors(observed_columns, column)
+                    for start in range(0, len(points), self.chunk_size):
+                        tasks.append((group_number, slice(start, start + self.chunk_size), column))
+
+            logging.info(f"Imputing {len(rows_with_missing)} rows in {len(patterns)} missing-value patterns "
+                         f"({len(tasks)} chunks)")
+            results = Parallel(n_jobs=self.n_jobs, prefer="threads")(
+                delayed(self._impute_chunk)(receiver_groups[group_number][2][chunk],
+                                            receiver_groups[group_number][3], column)
+                for group_number, chunk, column in tasks)
+
+            imputed_points = {}
+            for (group_number, chunk, column), values in zip(tasks, results):
+                imputed_points.setdefault((group_number, column), []).append(values)
+            for (group_number, column), values in imputed_points.items():
+                rows, point_index = receiver_groups[group_number][:2]
+                imputed_X[rows, column] = np.concatenate(values)[point_index]
+            return imputed_X
+
+        except Exception as e:
+            raise MyException(e, sys) from e
@@ -0,0 +1,189 @@
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.exceptions import MyException
+from src.logging import logging
+from src.utils.feature_encoder import FeatureEncoder, _is_missing, _to_float
+
+
+def _to_number(value) -> float:
+    # Values that are not numbers are left to the live model, which reports them
+    try:
+        return _to_float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class PredictionTable:
+    """
+    Predictions of a model for every point of its discrete input space, looked up by a mixed-radix index.
+
+    Every numeric field takes the integers of a configured [low, high] range and every categorical field
+    one of the categories the encoder knows, plus one last code for a missing or unseen category (which the
+    encoder turns into all zeros, like the live path does). A record's index is
+        sum(code(field) * stride(field)),  stride(field) = product of the radices of the fields after it
+    so a batch is scored with a few array lookups instead of a model pass. Records with a missing,
+    fractional or out-of-range number have no index and are left to the live model.
+    """
+
+    def __init__(self, numeric_ranges: Dict[str, Tuple[int, int]], categories: Dict[str, List[str]],
+                 classes: np.ndarray, labels: np.ndarray, probabilities: np.ndarray, build_seconds: float = 0.0):
+        """
+        :param numeric_ranges: Inclusive integer range of every numeric field
+        :param categories: Known categories of every categorical field
+        :param classes: Distinct predicted labels; labels index into it
+        :param labels: Index into classes of the predicted label of every table entry
+        :param probabilities: float32 positive-class probability of every table entry
+        """
+        self.numeric_ranges = numeric_ranges
+        self.categories = categories
+        self.classes = classes
+        self.labels = labels
+        self.probabilities = probabilities
+        self.build_seconds = build_seconds
+
+        self.fields = list(numeric_ranges) + list(categories)
+        self.radices = ([high - low + 1 for low, high in numeric_ranges.values()]
+                        + [len(values) + 1 for values in categories.values()])
+        self.strides = [int(np.prod(self.radices[position + 1:], dtype=np.int64)) for position in range(len(self.radices))]
+        self.n_entries = int(np.prod(self.radices, dtype=np.int64))
+        self.category_codes = {field: {category: code for code, category in enumerate(values)}
+                               for field, values in categories.items()}
+
+
+    @staticmethod
+    def get_space(encoder: FeatureEncoder, numeric_ranges: Dict[str, Tuple[int, int]]) -> Tuple[dict, dict]:
+        """
+        Returns the numeric ranges and categories spanning the encoder's input space
+        """
+        missing_ranges = [field for field in encoder.numeric_fields if field not in numeric_ranges]
+        if missing_ranges:
+            raise ValueError(f"No table range configured for the numeric fields {missing_ranges}")
+        categories: Dict[str, List[str]] = {}
+        for _, field, category in encoder.one_hot_columns:
+            categories.setdefault(field, []).append(category)
+        return ({field: tuple(numeric_ranges[field]) for field in encoder.numeric_fields},
+                {field: categories[field] for field in encoder.categorical_fields})
+
+
+    def decode(self, indices: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Returns the code of every field for each table index
+        """
+        return {field: (indices // stride) % radix for field, stride, radix in zip(self.fields, self.strides, self.radices)}
+
+
+    def _raw_columns(self, indices: np.ndarray) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        codes = self.decode(indices)
+        numeric_values = {field: (low + codes[field]).astype(np.float64)
+                          for field, (low, _) in self.numeric_ranges.items()}
+        categorical_values = {field: np.array(values + [None], dtype=object)[codes[field]]
+                              for field, values in self.categories.items()}
+        return numeric_values, categorical_values
+
+
+    @classmethod
+    def build(cls, encoder: FeatureEncoder, score_encoded: Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]],
+              numeric_ranges: Dict[str, Tuple[int, int]], chunk_size: int = 100_000,
+              max_entries: Optional[int] = None) -> "PredictionTable":
+        """
+        Scores every point of the input space in chunks of chunk_size encoded rows
+        :param encoder: Fast-path encoder of the model, giving the categories and the input layout
+        :param score_encoded: The model's predict_encoded
+        :param numeric_ranges: Inclusive integer range of every numeric field
+        :param max_entries: Refuse to build a larger table
+        """
+        try:
+            start = time.perf_counter()
+            table_ranges, categories = cls.get_space(encoder, numeric_ranges)
+            table = cls(table_ranges, categories, classes=np.empty(0), labels=np.empty(0, dtype=np.uint8),
+                        probabilities=np.empty(0, dtype=np.float32))
+            if max_entries is not None and table.n_entries > max_entries:
+                raise ValueError(f"The input space has {table.n_entries} points, more than the {max_entries} allowed")
+
+            predictions = []
+            probabilities = np.empty(table.n_entries, dtype=np.float32)
+            for chunk_start in range(0, table.n_entries, chunk_size):
+                indices = np.arange(chunk_start, min(chunk_start + chunk_size, table.n_entries), dtype=np.int64)
+                numeric_values, categorical_values = table._raw_columns(indices)
+                chunk_predictions, chunk_probabilities = score_encoded(
+                    encoder.encode_columns(numeric_values, categorical_values, len(indices)))
+                predictions.append(np.asarray(chunk_predictions))
+                probabilities[indices] = chunk_probabilities
+
+            classes, labels = np.unique(np.concatenate(predictions), return_inverse=True)
+            table.classes, table.labels = classes, labels.astype(np.min_scalar_type(len(classes)))
+            table.probabilities = probabilities
+            table.build_seconds = time.perf_counter() - start
+            logging.info(f"Built a prediction table of {table.n_entries} entries ({table.nbytes / 2 ** 20:.1f}MB) "
+                         f"in {table.build_seconds:.2f}s")
+            return table
+
+        except Exception as e:
+            raise MyException(e, sys) from e
+
+
+    @property
+    def nbytes(self) -> int:
+        return self.labels.nbytes + self.probabilities.nbytes
+
+
+    def index_records(self, records: List[dict]) -> np.ndarray:
+        """
+        Returns the table index of every record, or -1 for records the table does not cover
+        """
+        indices = np.zeros(len(records), dtype=np.int64)
+        covered = np.ones(len(records), dtype=bool)
+        for field, stride in zip(self.fields, self.strides):
+            if field in self.numeric_ranges:
+                low, high = self.numeric_ranges[field]
+                values = np.array([_to_number(record.get(field)) for record in records], dtype=np.float64)
+                # NaN fails every comparison, so missing numbers are not covered
+                covered &= (values >= low) & (values <= high) & (values == np.floor(values))
+                codes = np.where(covered, values - low, 0).astype(np.int64)
+            else:
+                category_codes, missing_code = self.category_codes[field], len(self.categories[field])
+                codes = np.array([missing_code if _is_missing(record.get(field))
+                                  else category_codes.get(str(record.get(field)), missing_code)
+                                  for record in records], dtype=np.int64)
+            indices += codes * stride
+        return np.where(covered, indices, -1)
+
+
+    def lookup(self, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the predicted labels and positive-class probabilities of table indices
+        """
+        return self.classes[self.labels[indices]], self.probabilities[indices]
+
+
+    def records_at(self, indices: np.ndarray) -> List[dict]:
+        """
+        Returns the raw records the table indices stand for
+        """
+        numeric_values, categorical_values = self._raw_columns(np.asarray(indices, dtype=np.int64))
+        columns = {**{field: values.astype(np.int64).tolist() for field, values in numeric_values.items()},
+                   **{field: values.tolist() for field, values in categorical_values.items()}}
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+    def verify(self, score_records: Callable[[List[dict]], Tuple[np.ndarray, np.ndarray]], n_samples: int,
+               random_state: Optional[int] = None) -> float:
+        """
+        Scores a random sample of table entries (and the first and last entries) with the live model and
+        raises ValueError if a label differs or a probability is off by more than 1e-6.
+        Returns the largest probability difference.
+        """
+        rng = np.random.default_rng(random_state)
+        indices = np.unique(np.concatenate([[0, self.n_entries - 1],
+                                            rng.integers(0, self.n_entries, size=min(n_samples, self.n_entries))]))
+        table_predictions, table_probabilities = self.lookup(indices)
+        live_predictions, live_probabilities = score_records(self.records_at(indices))
+        max_difference = float(np.max(np.abs(table_probabilities - np.asarray(live_probabilities, dtype=np.float32))))
+        if not np.array_equal(table_predictions, np.asarray(live_predictions)) or max_difference > 1e-6:
+            raise ValueError(f"The prediction table disagrees with the live model on {len(indices)} sampled entries "
+                             f"(largest probability difference {max_difference:.2e})")
+        return max_difference
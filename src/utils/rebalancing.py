@@ -0,0 +1,58 @@
+import sys
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.exceptions import MyException
+from src.logging import logging
+
+REBALANCE_STRATEGIES = ("smoteenn", "smote", "undersample", "scale_pos_weight", "none")
+
+
+def rebalance(features: np.ndarray, labels: np.ndarray, strategy: str = "smoteenn", k_neighbors: int = 5,
+              n_jobs: Optional[int] = None, random_state: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Rebalances the training classes with one of REBALANCE_STRATEGIES:
+        smoteenn          SMOTE oversampling of the minority class, then Edited Nearest Neighbours cleaning.
+                          ENN queries the neighbours of every sample, so it grows fastest with the data
+        smote             SMOTE oversampling only; neighbours are searched among the minority samples with a
+                          KD tree queried in n_jobs threads
+        undersample       random undersampling of the majority class
+        scale_pos_weight  rows are kept as they are; the returned weight makes XGBoost weigh the positive
+                          class by negatives / positives
+        none              rows are kept as they are
+    Returns: the features, the labels and the scale_pos_weight to train with (1.0 for the resampling strategies)
+    """
+    try:
+        if strategy not in REBALANCE_STRATEGIES:
+            raise ValueError(f"Unknown rebalancing strategy {strategy!r}, expected one of {REBALANCE_STRATEGIES}")
+        labels = np.asarray(labels)
+
+        if strategy == "none":
+            return features, labels, 1.0
+
+        if strategy == "scale_pos_weight":
+            n_positive = int(np.count_nonzero(labels))
+            scale_pos_weight = (len(labels) - n_positive) / n_positive if n_positive else 1.0
+            logging.info(f"Rebalancing with scale_pos_weight={scale_pos_weight:.3f}")
+            return features, labels, scale_pos_weight
+
+        if strategy == "undersample":
+            from imblearn.under_sampling import RandomUnderSampler
+            sampler = RandomUnderSampler(random_state=random_state)
+        elif strategy == "smote":
+            from imblearn.over_sampling import SMOTE
+            from sklearn.neighbors import NearestNeighbors
+            sampler = SMOTE(sampling_strategy="minority", random_state=random_state,
+                            k_neighbors=NearestNeighbors(n_neighbors=k_neighbors + 1, algorithm="kd_tree",
+                                                         n_jobs=n_jobs))
+        else:
+            from imblearn.combine import SMOTEENN
+            sampler = SMOTEENN(sampling_strategy="minority", random_state=random_state)
+
+        resampled_features, resampled_labels = sampler.fit_resample(features, labels)
+        logging.info(f"Rebalanced {len(labels)} rows to {len(resampled_labels)} with {strategy}")
+        return resampled_features, np.asarray(resampled_labels), 1.0
+
+    except Exception as e:
+        raise MyException(e, sys) from e
@@ -1,8 +1,11 @@
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.impute import KNNImputer
+import numpy as np
 import pandas as pd
 import sys
 from src.logging import logging
 from src.exceptions import MyException
+from src.utils.knn_imputer import IndexedKNNImputer
 
 def drop_columns(df, schema_config):
     """
@@ -57,31 +60,41 @@ def encode_categorical_features(df):
         raise MyException(e, sys)
 
 
-def fill_na_and_knn_impute(df, n_neighbors=5):
+def fill_na_and_knn_impute(df, n_neighbors=5, engine="sklearn", chunk_size=10_000, n_jobs=None):
     """
     Fills missing values using KNN imputation.
 
     Args:
         df (pd.DataFrame): Input DataFrame with missing values.
         n_neighbors (int): Number of neighbors for KNN imputation.
+        engine (str): "sklearn" for the exact KNNImputer, "indexed" for IndexedKNNImputer, which scales
+            to millions of rows (same results up to the choice among equidistant neighbours).
+        chunk_size (int): Rows queried per task by the indexed engine.
+        n_jobs (int): Threads used by the indexed engine.
 
     Returns:
         pd.DataFrame: DataFrame with missing values imputed.
     """
     try:
-        knn_imputer = KNNImputer(n_neighbors=n_neighbors)
+        if engine == "indexed":
+            knn_imputer = IndexedKNNImputer(n_neighbors=n_neighbors, chunk_size=chunk_size, n_jobs=n_jobs)
+        else:
+            knn_imputer = KNNImputer(n_neighbors=n_neighbors)
 
         # Identify categorical columns and encode them
-        categorical_columns = df.select_dtypes(include='object').columns
+        # Columns read from parquet/feather are already 'category'; their categories are rebuilt from the
+        # observed values so the codes (and so the KNN distances) match those of plain object columns
+        categorical_columns = df.select_dtypes(include=['object', 'category']).columns
         category_mappings = {}
 
         df_encoded = df.copy()
         for col in categorical_columns:
-            df_encoded[col] = df_encoded[col].astype('category').cat.codes
-            category_mappings[col] = dict(enumerate(df[col].astype('category').cat.categories))
+            categories = df[col].astype(object).astype('category')
+            df_encoded[col] = categories.cat.codes
+            category_mappings[col] = dict(enumerate(categories.cat.categories))
 
         # Fit the KNN imputer
-        logging.info(f"Fitting KNN imputer with n_neighbors={n_neighbors}")
+        logging.info(f"Fitting {engine} KNN imputer with n_neighbors={n_neighbors}")
         knn_imputer.fit(df_encoded)
 
         # Transform the data
@@ -100,3 +113,115 @@ def fill_na_and_knn_impute(df, n_neighbors=5):
     except Exception as e:
         logging.error("Error occurred during KNN imputation.")
         raise MyException(e, sys)
+
+
+class DropColumns(TransformerMixin, BaseEstimator):
+    """
+    Drops the given columns (the schema's drop_columns) when they are present.
+    """
+
+    def __init__(self, columns=()):
+        self.columns = columns
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        try:
+            return X.drop(columns=[col for col in self.columns if col in X.columns])
+        except Exception as e:
+            raise MyException(e, sys)
+
+
+class FillNaAndKNNImpute(TransformerMixin, BaseEstimator):
+    """
+    Fit-once version of fill_na_and_knn_impute.
+
+    The categorical columns, their categories and the KNN donors are learned from the training frame,
+    so test, evaluation and serving frames are coded and imputed against the training data instead of
+    against themselves. A category never seen in training is coded like a missing one.
+    """
+
+    def __init__(self, n_neighbors=5, engine="sklearn", chunk_size=10_000, n_jobs=None):
+        self.n_neighbors = n_neighbors
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+
+    def _encode(self, X):
+        df_encoded = pd.DataFrame(index=X.index)
+        for col in self.feature_names_in_:
+            if col in self.categories_:
+                df_encoded[col] = pd.Categorical(X[col].astype(object), categories=self.categories_[col]).codes
+            else:
+                df_encoded[col] = pd.to_numeric(X[col], errors="coerce")
+        return df_encoded.to_numpy(dtype=np.float64)
+
+    def fit(self, X, y=None):
+        try:
+            self.feature_names_in_ = list(X.columns)
+            # Same coding as fill_na_and_knn_impute: categories rebuilt from the observed values
+            self.categories_ = {col: X[col].astype(object).astype('category').cat.categories
+                                for col in X.select_dtypes(include=['object', 'category']).columns}
+            if self.engine == "indexed":
+                self.imputer_ = IndexedKNNImputer(n_neighbors=self.n_neighbors, chunk_size=self.chunk_size,
+                                                  n_jobs=self.n_jobs)
+            else:
+                self.imputer_ = KNNImputer(n_neighbors=self.n_neighbors)
+            logging.info(f"Fitting {self.engine} KNN imputer with n_neighbors={self.n_neighbors}")
+            self.imputer_.fit(self._encode(X))
+            return self
+        except Exception as e:
+            logging.error("Error occurred during KNN imputation.")
+            raise MyException(e, sys)
+
+    def transform(self, X):
+        try:
+            df_imputed = pd.DataFrame(self.imputer_.transform(self._encode(X[self.feature_names_in_])),
+                                      columns=self.feature_names_in_, index=X.index)
+            for col, categories in self.categories_.items():
+                codes = df_imputed[col].round().astype(int)
+                df_imputed[col] = pd.Series(np.asarray(categories, dtype=object)[codes.clip(lower=0)],
+                                            index=X.index).where(codes >= 0)
+            return df_imputed
+        except Exception as e:
+            logging.error("Error occurred during KNN imputation.")
+            raise MyException(e, sys)
+
+
+class EncodeCategoricalFeatures(TransformerMixin, BaseEstimator):
+    """
+    Fit-once version of encode_categorical_features: one-hot encodes with the categories seen in
+    training (dropping the first, like pd.get_dummies(drop_first=True)), so every frame gets the
+    training columns in the training order. Missing and unseen categories encode as all zeros.
+    """
+
+    def fit(self, X, y=None):
+        try:
+            categorical_columns = X.select_dtypes(include=['object', 'category']).columns
+            self.categories_ = {col: X[col].astype(object).astype('category').cat.categories
+                                for col in categorical_columns}
+            self.passthrough_columns_ = [col for col in X.columns if col not in self.categories_]
+            self.feature_names_out_ = self.passthrough_columns_ + [f"{col}_{category}"
+                                                                   for col, categories in self.categories_.items()
+                                                                   for category in categories[1:]]
+            logging.info(f"Columns after encoding: {self.feature_names_out_}")
+            return self
+        except Exception as e:
+            logging.error("Error occurred during one-hot encoding.")
+            raise MyException(e, sys)
+
+    def transform(self, X):
+        try:
+            columns = {col: X[col] for col in self.passthrough_columns_}
+            for col, categories in self.categories_.items():
+                codes = pd.Categorical(X[col].astype(object), categories=categories).codes
+                for code, category in enumerate(categories[1:], start=1):
+                    columns[f"{col}_{category}"] = codes == code
+            return pd.DataFrame(columns, index=X.index)
+        except Exception as e:
+            logging.error("Error occurred during one-hot encoding.")
+            raise MyException(e, sys)
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(self.feature_names_out_, dtype=object)